@@ -0,0 +1,283 @@
+"""
+batch story narrator
+
+runs many story inputs through one StoryProcessor in a single process. inputs can be
+yaml files, directories of yaml files, glob patterns or jsonl manifests, and each story
+is isolated so a bad file is reported as a failure instead of aborting the batch.
+"""
+
+import sys
+import glob
+import json
+import time
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from services.llm_client import LLMClient, get_llm_config
+from services.checkpoint import SceneCheckpoint
+from services.output_writer import STREAM_FORMATS, StreamingOutputWriter
+from services.metrics import call_tags
+from services.tracing import span, start_tracing, stop_tracing
+from services.serialization import FORMAT_SUFFIXES, FORMATS, SUFFIX_FORMATS
+from story_processor import StoryProcessor
+
+logger = logging.getLogger("batch_processor")
+
+INPUT_SUFFIXES = tuple(SUFFIX_FORMATS)
+
+
+class StoryJob:
+    """One story of a batch: either a path to a YAML file or an inline config."""
+
+    def __init__(self, name: str, output_file: Path, input_file: Optional[str] = None, config: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.output_file = output_file
+        self.input_file = input_file
+        self.config = config
+
+
+class BatchProcessor:
+    def __init__(
+        self,
+        processor: StoryProcessor = None,
+        concurrency: int = 8,
+        resume: bool = False,
+        stream_format: Optional[str] = None,
+        output_format: str = "yaml",
+    ):
+        if stream_format and output_format != "yaml":
+            raise ValueError(f"streamed output is written as {stream_format}; it cannot be {output_format}")
+        self.processor = processor or StoryProcessor()
+        self.concurrency = concurrency
+        self.resume = resume
+        self.stream_format = stream_format
+        self.output_suffix = FORMAT_SUFFIXES[output_format]
+
+    def collect_jobs(self, sources: List[str], output_dir: str) -> List[StoryJob]:
+        """Expand directories, globs and JSONL manifests into story jobs."""
+        out_dir = Path(output_dir)
+        jobs: List[StoryJob] = []
+
+        for source in sources:
+            path = Path(source)
+            if path.is_dir():
+                files = sorted(p for p in path.iterdir() if p.suffix in INPUT_SUFFIXES)
+                jobs.extend(self._file_job(str(p), out_dir) for p in files)
+            elif path.suffix == ".jsonl":
+                jobs.extend(self._manifest_jobs(path, out_dir))
+            elif path.is_file():
+                jobs.append(self._file_job(source, out_dir))
+            else:
+                matches = sorted(glob.glob(source))
+                if not matches:
+                    logger.warning(f"No story inputs matched {source}")
+                jobs.extend(self._file_job(m, out_dir) for m in matches)
+
+        # Keep output names unique when inputs share a stem
+        seen: Dict[str, int] = {}
+        for job in jobs:
+            count = seen.get(job.name, 0)
+            seen[job.name] = count + 1
+            if count:
+                job.name = f"{job.name}_{count}"
+                job.output_file = out_dir / f"{job.name}{self.output_suffix}"
+
+        return jobs
+
+    def _file_job(self, input_file: str, out_dir: Path) -> StoryJob:
+        name = Path(input_file).stem
+        return StoryJob(name, out_dir / f"{name}{self.output_suffix}", input_file=input_file)
+
+    def _manifest_jobs(self, manifest: Path, out_dir: Path) -> List[StoryJob]:
+        """
+        Each manifest line is either {"input": path, "output": path} or an inline
+        story config (context/characters/scenes) with an optional "id".
+        """
+        jobs = []
+        with open(manifest, "r", encoding="utf-8") as file:
+            for line_no, line in enumerate(file, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                name = f"{manifest.stem}_{line_no}"
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError as e:
+                    # Surface the bad line as a failed job rather than dropping it
+                    logger.error(f"{manifest}:{line_no} is not valid JSON: {e}")
+                    jobs.append(StoryJob(name, out_dir / f"{name}{self.output_suffix}"))
+                    continue
+
+                if "input" in entry:
+                    input_file = str((manifest.parent / entry["input"]))
+                    name = entry.get("id", Path(input_file).stem)
+                    output_file = Path(entry["output"]) if "output" in entry else out_dir / f"{name}{self.output_suffix}"
+                    jobs.append(StoryJob(name, output_file, input_file=input_file))
+                else:
+                    name = str(entry.pop("id", name))
+                    jobs.append(StoryJob(name, out_dir / f"{name}{self.output_suffix}", config=entry))
+        return jobs
+
+    async def process_job(self, job: StoryJob) -> Dict[str, Any]:
+        """Process one story, capturing any failure in the returned result."""
+        started = time.perf_counter()
+        # A streamed output's extension names what the writer produces, manifest paths included
+        if self.stream_format == "jsonl":
+            job.output_file = job.output_file.with_suffix(".jsonl")
+        elif self.stream_format == "yaml" and SUFFIX_FORMATS.get(job.output_file.suffix) != "yaml":
+            job.output_file = job.output_file.with_suffix(".yaml")
+        result: Dict[str, Any] = {"story": job.name, "output_file": str(job.output_file)}
+        writer = None
+        try:
+            if job.input_file:
+                config = self.processor.load_story_config(job.input_file)
+            elif job.config is not None:
+                config = job.config
+            else:
+                raise ValueError("manifest entry could not be parsed")
+
+            story = self.processor.validate_config(config)
+            if story is None:
+                raise ValueError("invalid story configuration")
+
+            job.output_file.parent.mkdir(parents=True, exist_ok=True)
+            checkpoint = SceneCheckpoint.for_output(str(job.output_file))
+            if self.stream_format:
+                writer = StreamingOutputWriter(str(job.output_file), self.stream_format)
+            with call_tags(story=job.name), span("story", story=job.name):
+                output_data = await self.processor.aprocess_story(story, checkpoint, self.resume, writer)
+            if writer is None:
+                self.processor.save_output(output_data, str(job.output_file))
+            checkpoint.remove()
+            result["status"] = "ok"
+        except (Exception, SystemExit) as e:
+            # StoryProcessor exits on bad input; keep that local to this story
+            logger.error(f"Story {job.name} failed: {e!r}")
+            result["status"] = "failed"
+            result["error"] = repr(e)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        return result
+
+    async def arun(self, jobs: List[StoryJob]) -> Dict[str, Any]:
+        """Run all jobs with at most `concurrency` stories in flight."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        calls_before = self.processor.llm_client.call_count
+        started = time.perf_counter()
+
+        async def bounded(job: StoryJob):
+            async with semaphore:
+                return await self.process_job(job)
+
+        try:
+            results = await asyncio.gather(*(bounded(job) for job in jobs))
+        finally:
+            await self.processor.llm_client.aclose()
+
+        elapsed = time.perf_counter() - started
+        summary = self.summarize(results, elapsed, self.processor.llm_client.call_count - calls_before)
+        if self.processor.llm_client.cache is not None:
+            summary["cache"] = self.processor.llm_client.cache.stats()
+        summary["llm_metrics"] = self.processor.llm_client.metrics.summary()["total"]
+        summary["rate_governor"] = self.processor.llm_client.governor.stats()
+        summary["resilience"] = self.processor.llm_client.resilience_stats()
+        return summary
+
+    def run(self, jobs: List[StoryJob]) -> Dict[str, Any]:
+        return asyncio.run(self.arun(jobs))
+
+    def summarize(self, results: List[Dict[str, Any]], elapsed: float, llm_calls: int) -> Dict[str, Any]:
+        """Build the throughput summary for a finished batch."""
+        minutes = elapsed / 60 if elapsed > 0 else 0
+        succeeded = [r for r in results if r["status"] == "ok"]
+        failed = [r for r in results if r["status"] != "ok"]
+        return {
+            "stories": len(results),
+            "succeeded": len(succeeded),
+            "failed": len(failed),
+            "elapsed_seconds": round(elapsed, 3),
+            "stories_per_minute": round(len(succeeded) / minutes, 2) if minutes else 0.0,
+            "llm_calls": llm_calls,
+            "llm_calls_per_minute": round(llm_calls / minutes, 2) if minutes else 0.0,
+            "failures": [{"story": r["story"], "error": r["error"]} for r in failed],
+        }
+
+
+def main():
+    """Command line entry point for batch runs."""
+    parser = argparse.ArgumentParser(description="Process many story inputs concurrently.")
+    parser.add_argument("inputs", nargs="+", help="YAML files, directories, glob patterns or JSONL manifests")
+    parser.add_argument("-o", "--output-dir", default="batch_output", help="directory for generated stories")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="stories processed at once")
+    parser.add_argument("--summary", help="optional path to write the JSON summary")
+    parser.add_argument("--fresh", action="store_true", help="skip LLM response cache lookups")
+    parser.add_argument("--resume", action="store_true", help="continue interrupted stories from their checkpoints")
+    parser.add_argument("--stream", choices=STREAM_FORMATS, help="append scenes to each output as they finish")
+    parser.add_argument("--format", choices=FORMATS, default="yaml", help="output format of generated stories")
+    parser.add_argument("--backend", help='"litellm", "fake", "record:<cassette>" or "replay:<cassette>"')
+    parser.add_argument("--metrics-json", help="write the per-run LLM call summary (by story, scene, character) as JSON")
+    parser.add_argument("--metrics-prom", help="write LLM call metrics as a Prometheus text file")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port during the run")
+    parser.add_argument("--trace", help="write a Chrome trace-event timeline of the batch (open in Perfetto)")
+    args = parser.parse_args()
+    if args.stream and args.format != "yaml":
+        parser.error(f"--stream writes {args.stream}; it cannot be combined with --format {args.format}")
+
+    # Configure logging
+    logging.basicConfig(level=logging.INFO)
+
+    llm_config = get_llm_config()
+    llm_config.cache_bypass = llm_config.cache_bypass or args.fresh
+    if args.backend:
+        llm_config.backend = args.backend
+    batch = BatchProcessor(
+        StoryProcessor(LLMClient(llm_config)),
+        concurrency=args.concurrency,
+        resume=args.resume,
+        stream_format=args.stream,
+        output_format=args.format,
+    )
+    jobs = batch.collect_jobs(args.inputs, args.output_dir)
+    if not jobs:
+        logger.error("No story inputs found")
+        sys.exit(1)
+
+    logger.info(f"Processing {len(jobs)} stories with concurrency {args.concurrency}")
+    metrics = batch.processor.llm_client.metrics
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+    if args.trace:
+        start_tracing()
+    try:
+        summary = batch.run(jobs)
+    finally:
+        stop_tracing(args.trace)
+    if args.metrics_json:
+        metrics.write_summary(args.metrics_json)
+    if args.metrics_prom:
+        metrics.write_prometheus(args.metrics_prom)
+
+    logger.info(
+        f"Batch finished: {summary['succeeded']}/{summary['stories']} stories in "
+        f"{summary['elapsed_seconds']}s ({summary['stories_per_minute']} stories/min, "
+        f"{summary['llm_calls_per_minute']} LLM calls/min, {summary['failed']} failures)"
+    )
+    for failure in summary["failures"]:
+        logger.info(f"  failed: {failure['story']}: {failure['error']}")
+
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as file:
+            json.dump(summary, file, indent=2)
+
+    if summary["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+import-time benchmark
+
+imports each entry point in a fresh interpreter under `python -X importtime` and
+reports the cumulative import time of the module itself, the median of several runs,
+plus the wall time of a `story_processor.py --dry-run`. it fails if any entry point
+pulls in the provider stack (litellm, instructor, httpx, openai) at import time, or,
+with --compare, if an import got slower than the baseline by more than --threshold.
+
+    python src/benchmarks/bench_import.py --out imports.json
+    python src/benchmarks/bench_import.py --compare imports.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from typing import Dict, List, Set, Tuple
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = ("story_processor", "batch_processor", "narrator_server")
+# Only the first real LLM call may import these
+HEAVY_MODULES = ("litellm", "instructor", "httpx", "openai")
+
+
+def import_profile(module: str) -> Tuple[float, Set[str]]:
+    """Cumulative import seconds of `module`, and every top-level package imported with it."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    seconds = 0.0
+    packages = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        packages.add(name.split(".")[0])
+        if name == module:
+            seconds = int(cumulative) / 1e6
+    return seconds, packages
+
+
+def dry_run_seconds(story: str) -> float:
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "story_processor.py", story, "--dry-run"],
+        cwd=SRC_DIR,
+        capture_output=True,
+        check=True,
+    )
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark entry point import times.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per measurement")
+    parser.add_argument("--story", default="story_input.yaml", help="input for the dry-run timing (relative to src/)")
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON from an earlier --out")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    results: Dict[str, float] = {}
+    failures: List[str] = []
+    for module in ENTRY_POINTS:
+        samples = []
+        for _ in range(args.runs):
+            seconds, packages = import_profile(module)
+            samples.append(seconds)
+        heavy = sorted(packages.intersection(HEAVY_MODULES))
+        results[module] = round(statistics.median(samples), 4)
+        print(f"{module:>16}: {results[module] * 1000:8.1f} ms import" + (f"  imports {heavy}!" if heavy else ""))
+        if heavy:
+            failures.append(f"{module} imports {', '.join(heavy)} at import time")
+
+    results["dry_run"] = round(statistics.median(dry_run_seconds(args.story) for _ in range(args.runs)), 4)
+    print(f"{'--dry-run':>16}: {results['dry_run'] * 1000:8.1f} ms wall")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+        for name, seconds in results.items():
+            before = baseline.get(name)
+            if before and seconds > before * (1 + args.threshold):
+                failures.append(f"{name}: {before * 1000:.1f} ms -> {seconds * 1000:.1f} ms")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as file:
+            json.dump({"python": sys.version.split()[0], "results": results}, file, indent=2)
+
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
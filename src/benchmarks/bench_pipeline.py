@@ -0,0 +1,220 @@
+"""
+pipeline benchmark
+
+drives StoryProcessor end to end against the fake LLM backend with synthetic stories
+of varying size, and reports wall time, LLM calls, prompt tokens per call, peak RSS and
+the CPU time spent outside the (simulated) LLM calls. each case runs in a fresh
+subprocess so RSS numbers are not polluted by earlier cases.
+
+    python src/benchmarks/bench_pipeline.py --out bench.json
+    python src/benchmarks/bench_pipeline.py --suite full --compare bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import platform
+import resource
+import subprocess
+from datetime import datetime
+from typing import Any, Dict, List
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIR)
+
+# (scenes, characters, rounds)
+SUITES = {
+    "quick": [(1, 2, 1), (5, 4, 3), (20, 6, 2)],
+    "full": [(1, 2, 1), (5, 4, 3), (20, 6, 2), (50, 8, 5), (100, 12, 3), (200, 2, 10), (200, 12, 10)],
+}
+
+# Lower is better for all of these; a relative increase above the threshold is a regression
+COMPARED_METRICS = ("wall_seconds", "cpu_seconds", "peak_rss_mb", "prompt_tokens_per_call")
+
+
+def make_story(scenes: int, characters: int, rounds: int, round_mode: str = "sequential") -> Dict[str, Any]:
+    """Build a synthetic story config of the requested size."""
+    cast = {
+        f"Character {i}": {
+            "goal": f"Goal {i}: recover the lost relic of the valley before the eclipse.",
+            "backstory": f"Character {i} grew up in the valley and knows its old paths and older secrets.",
+            "traits": {"bravery": round(0.1 * (i % 10), 1), "patience": 0.5},
+            "emotional_state": "determined",
+        }
+        for i in range(characters)
+    }
+    return {
+        "context": "A synthetic benchmark story set in a valley where time moves differently.",
+        "characters": cast,
+        "scenes": [
+            {
+                "scene_no": i,
+                "location": f"Location {i}",
+                "atmosphere": "tense, quiet, expectant",
+                "context": f"Scene {i}: the companions face a new obstacle on their path.",
+                "conflict": "They disagree on whether to press on or turn back.",
+                "possible_outcomes": ["They press on.", "They turn back.", "They split up."],
+            }
+            for i in range(scenes)
+        ],
+        "config": {"conversation_rounds": rounds, "round_mode": round_mode, "output_file": os.devnull},
+    }
+
+
+def run_case(
+    scenes: int, characters: int, rounds: int, latency: float, jitter: float, round_mode: str = "sequential"
+) -> Dict[str, Any]:
+    """Run one benchmark case in this process and return its measurements."""
+    logging.disable(logging.INFO)
+
+    from services.backends import FakeBackend
+    from services.llm_client import LLMClient, get_llm_config
+    from services.tokens import estimate_message_tokens
+    from story_processor import StoryProcessor
+
+    class MeasuredBackend(FakeBackend):
+        """Fake backend that tallies prompt tokens and the time spent inside calls."""
+
+        prompt_tokens = 0
+        llm_seconds = 0.0
+
+        async def acomplete(self, messages, config, n=1):
+            started = time.perf_counter()
+            MeasuredBackend.prompt_tokens += estimate_message_tokens(messages)
+            try:
+                return await super().acomplete(messages, config, n)
+            finally:
+                MeasuredBackend.llm_seconds += time.perf_counter() - started
+
+        async def astructured(self, messages, config, response_model):
+            started = time.perf_counter()
+            MeasuredBackend.prompt_tokens += estimate_message_tokens(messages)
+            try:
+                return await super().astructured(messages, config, response_model)
+            finally:
+                MeasuredBackend.llm_seconds += time.perf_counter() - started
+
+    llm_config = get_llm_config()
+    llm_config.cache_path = None
+    llm_config.backend = "fake"
+    client = LLMClient(llm_config, MeasuredBackend(latency, jitter))
+    processor = StoryProcessor(client)
+    story = make_story(scenes, characters, rounds, round_mode)
+
+    wall_started = time.perf_counter()
+    cpu_started = time.process_time()
+    asyncio.run(processor.aprocess_story(story))
+    cpu_seconds = time.process_time() - cpu_started
+    wall_seconds = time.perf_counter() - wall_started
+
+    calls = client.call_count
+    return {
+        # Sequential keeps the bare name so older baselines still compare
+        "case": f"{scenes}s-{characters}c-{rounds}r" + ("" if round_mode == "sequential" else f"-{round_mode}"),
+        "scenes": scenes,
+        "characters": characters,
+        "rounds": rounds,
+        "wall_seconds": round(wall_seconds, 4),
+        "llm_calls": calls,
+        "prompt_tokens": MeasuredBackend.prompt_tokens,
+        "prompt_tokens_per_call": round(MeasuredBackend.prompt_tokens / calls, 1) if calls else 0,
+        # Fake calls sleep instead of computing, so CPU time is pipeline overhead
+        "cpu_seconds": round(cpu_seconds, 4),
+        "cpu_ms_per_call": round(1000 * cpu_seconds / calls, 3) if calls else 0,
+        "llm_wait_seconds": round(MeasuredBackend.llm_seconds, 4),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def run_suite(cases, latency: float, jitter: float, round_mode: str = "sequential") -> List[Dict[str, Any]]:
+    results = []
+    for scenes, characters, rounds in cases:
+        cmd = [
+            sys.executable, os.path.abspath(__file__), "--run-case",
+            json.dumps([scenes, characters, rounds, latency, jitter, round_mode]),
+        ]
+        completed = subprocess.run(cmd, capture_output=True, text=True, cwd=SRC_DIR)
+        if completed.returncode != 0:
+            raise RuntimeError(f"Benchmark case {scenes}/{characters}/{rounds} failed:\n{completed.stderr}")
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        print(
+            f"{result['case']:>22}: {result['wall_seconds']:8.3f}s wall  {result['llm_calls']:6d} calls  "
+            f"{result['prompt_tokens_per_call']:8.1f} tok/call  {result['cpu_ms_per_call']:7.3f} cpu ms/call  "
+            f"{result['peak_rss_mb']:7.1f} MB"
+        )
+        results.append(result)
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, threshold: float) -> List[str]:
+    """Return a message per metric that got worse than the baseline by more than threshold."""
+    with open(baseline_path, "r", encoding="utf-8") as file:
+        baseline = {r["case"]: r for r in json.load(file)["results"]}
+
+    regressions = []
+    for result in results:
+        previous = baseline.get(result["case"])
+        if previous is None:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = previous.get(metric), result.get(metric)
+            if old and new is not None and (new - old) / old > threshold:
+                regressions.append(f"{result['case']} {metric}: {old} -> {new} (+{100 * (new - old) / old:.1f}%)")
+    return regressions
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=SRC_DIR
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the story pipeline against a simulated LLM.")
+    parser.add_argument("--suite", choices=sorted(SUITES), default="quick")
+    parser.add_argument("--latency", type=float, default=0.01, help="simulated seconds per LLM call")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--round-mode", choices=["sequential", "simultaneous", "batched"], default="sequential")
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed relative slowdown")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(*json.loads(args.run_case))))
+        return
+
+    results = run_suite(SUITES[args.suite], args.latency, args.jitter, args.round_mode)
+    report = {
+        "benchmark": "pipeline",
+        "commit": git_commit(),
+        "created_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "suite": args.suite,
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "round_mode": args.round_mode,
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
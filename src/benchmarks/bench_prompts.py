@@ -0,0 +1,140 @@
+"""
+prompt building benchmark
+
+builds every character prompt of a synthetic scene, plus the scene's formatted
+conversation for the output, twice: the way it was done before the scene buffer
+(get_character_conversation_prompt re-renders the whole history for every turn) and
+through ConversationBuffer (each turn rendered once, shared prefix extended in place).
+reports time per scene and how many times to_rich_format ran, and checks both paths
+produce the same messages.
+
+    python src/benchmarks/bench_prompts.py --characters 10 --rounds 10
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from typing import Any, Callable, Dict, List, Tuple
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIR)
+
+from models.story import Character, ConversationTurn  # noqa: E402
+from prompts.characters import CharacterDialogueManager, ConversationBuffer  # noqa: E402
+
+WORDS = (
+    "the valley crystal moonlight giant mercy memory trust dawn river temple door "
+    "shadow prophecy stone courage patience"
+).split()
+
+
+class CountingDialogueManager(CharacterDialogueManager):
+    """Counts to_rich_format calls."""
+
+    def __init__(self):
+        super().__init__()
+        self.renders = 0
+
+    def to_rich_format(self, turn: ConversationTurn) -> str:
+        self.renders += 1
+        return super().to_rich_format(turn)
+
+
+def make_scene(characters: int, rounds: int, seed: int = 0) -> Tuple[Dict[str, Character], List[ConversationTurn]]:
+    """Characters, and the turns they will speak in order."""
+    rng = random.Random(seed)
+
+    def text(low: int, high: int) -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize() + "."
+
+    cast = {
+        f"Character {i}": Character(
+            goal=text(8, 15),
+            backstory=text(30, 60),
+            traits={"bravery": 0.5, "patience": 0.4},
+            emotional_state="focused",
+        )
+        for i in range(characters)
+    }
+    turns = [
+        ConversationTurn(
+            character=name,
+            dialogue=text(15, 50),
+            emotion="calm",
+            tone="serious",
+            body_language=text(3, 8),
+            inner_thoughts=text(5, 15),
+        )
+        for _ in range(rounds)
+        for name in cast
+    ]
+    return cast, turns
+
+
+def rebuild_each_turn(manager, cast, turns, narration) -> Tuple[List[List[Dict[str, str]]], List[str]]:
+    history: List[ConversationTurn] = []
+    prompts = []
+    for turn in turns:
+        prompts.append(
+            manager.get_character_conversation_prompt(turn.character, cast[turn.character], narration, None, history)
+        )
+        history.append(turn)
+    return prompts, [manager.to_rich_format(turn) for turn in history]
+
+
+def scene_buffer(manager, cast, turns, narration) -> Tuple[List[List[Dict[str, str]]], List[str]]:
+    buffer = ConversationBuffer(manager, narration)
+    history: List[ConversationTurn] = []
+    prompts = []
+    for turn in turns:
+        prompts.append(buffer.prompt(turn.character, cast[turn.character], history))
+        history.append(turn)
+    return prompts, [buffer.rich_text(turn) for turn in history]
+
+
+def measure(build: Callable, cast, turns, narration, repeat: int) -> Dict[str, Any]:
+    manager = CountingDialogueManager()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = build(manager, cast, turns, narration)
+    seconds = time.perf_counter() - started
+    return {
+        "ms_per_scene": round(seconds / repeat * 1000, 3),
+        "renders_per_scene": manager.renders // repeat,
+        "result": result,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-scene prompt building.")
+    parser.add_argument("--characters", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=50, help="scenes built per approach")
+    parser.add_argument("--out", help="write results as JSON")
+    args = parser.parse_args()
+
+    cast, turns = make_scene(args.characters, args.rounds)
+    narration = "The moonlight falls across the valley as the travellers gather at the temple door. " * 8
+
+    results = {}
+    for name, build in (("rebuild each turn", rebuild_each_turn), ("scene buffer", scene_buffer)):
+        results[name] = measure(build, cast, turns, narration, args.repeat)
+        print(
+            f"{name:>18}: {results[name]['ms_per_scene']:8.3f} ms/scene  "
+            f"{results[name]['renders_per_scene']:6d} to_rich_format calls/scene"
+        )
+
+    old, new = results["rebuild each turn"], results["scene buffer"]
+    print(f"speedup: {old['ms_per_scene'] / new['ms_per_scene']:.1f}x")
+    print(f"identical prompts and formatted output: {old.pop('result') == new.pop('result')}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as file:
+            json.dump({"characters": args.characters, "rounds": args.rounds, "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
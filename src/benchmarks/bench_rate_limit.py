@@ -0,0 +1,152 @@
+"""
+rate limit benchmark
+
+fires many concurrent structured calls at the fake backend with simulated account
+limits (RPM/TPM, rejections carry a Retry-After) and compares three clients:
+
+  no governor     : no pacing and no 429 retries (the old behaviour, calls fail)
+  retries only    : AIMD concurrency and Retry-After pauses, limits unknown to the client
+  paced           : the same plus RPM/TPM buckets set to the account limits
+
+reports completed calls, failures, provider rejections, achieved RPM and how steady the
+per-second throughput was (coefficient of variation after the first seconds). the
+provider side also measures the RPM/TPM of the requests it accepted; the script exits
+non-zero if the paced client goes over the configured limits.
+
+    python src/benchmarks/bench_rate_limit.py --rpm 2400 --requests 400
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import statistics
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIR)
+
+from services.backends import FakeBackend  # noqa: E402
+from services.llm_client import LLMCallError, LLMClient, get_llm_config  # noqa: E402
+from services.rate_limit import RateGovernor  # noqa: E402
+
+
+class MeteredBackend(FakeBackend):
+    """Fake backend that notes when each request it accepted arrived, and its prompt tokens."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.accepted: List[Tuple[float, int]] = []
+
+    def _admit(self, messages):
+        super()._admit(messages)
+        self.accepted.append((time.perf_counter(), sum(len(m.get("content", "")) for m in messages) // 4))
+
+    def sent_rates(self) -> Tuple[float, float]:
+        """Requests and tokens per minute between the first and the last accepted request."""
+        if len(self.accepted) < 2:
+            return 0.0, 0.0
+        minutes = (self.accepted[-1][0] - self.accepted[0][0]) / 60
+        # The first request opens the interval; the rest arrived within it
+        return (len(self.accepted) - 1) / minutes, sum(tokens for _, tokens in self.accepted[1:]) / minutes
+
+
+async def run_scenario(name: str, args) -> Dict[str, Any]:
+    backend = MeteredBackend(args.latency, args.jitter, rpm_limit=args.rpm, tpm_limit=args.tpm)
+    config = get_llm_config().model_copy(
+        update=dict(
+            backend="fake",
+            cache_path=None,
+            max_concurrency=args.concurrency,
+            rpm_limit=args.rpm if name == "paced" else None,
+            tpm_limit=args.tpm if name == "paced" else None,
+            rate_limit_retries=0 if name == "no governor" else 20,
+        )
+    )
+    governor = RateGovernor.from_config(config)
+    if name == "no governor":
+        # Nothing but the fixed concurrency cap: throttles do not pause or shrink anything
+        governor.throttled = lambda retry_after=None: 0.0
+    client = LLMClient(config, backend=backend, governor=governor)
+
+    finished: Counter = Counter()
+    started = time.perf_counter()
+
+    async def one(i: int):
+        messages = [
+            {"role": "system", "content": "You are roleplaying as Bench. Keep it short."},
+            {"role": "user", "content": f"Request {i}: " + "word " * args.prompt_words},
+        ]
+        try:
+            await client.aexecute_character_dialogue(messages)
+        except LLMCallError:
+            return False
+        finished[int(time.perf_counter() - started)] += 1
+        return True
+
+    try:
+        results = await asyncio.gather(*(one(i) for i in range(args.requests)))
+    finally:
+        await client.aclose()
+    wall = time.perf_counter() - started
+
+    ok = sum(results)
+    sent_rpm, sent_tpm = backend.sent_rates()
+    seconds = [finished.get(s, 0) for s in range(int(wall))][2:]  # skip the initial burst
+    cv = statistics.pstdev(seconds) / statistics.mean(seconds) if len(seconds) > 1 and statistics.mean(seconds) else 0.0
+    return {
+        "scenario": name,
+        "wall_seconds": round(wall, 2),
+        "completed": ok,
+        "failed": len(results) - ok,
+        "provider_rejections": backend.rejected,
+        "achieved_rpm": round(ok / wall * 60, 1),
+        "sent_rpm": round(sent_rpm, 1),
+        "sent_tpm": round(sent_tpm),
+        "throughput_cv": round(cv, 3),
+        "governor": governor.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark client-side rate governing against simulated limits.")
+    parser.add_argument("--rpm", type=int, default=2400, help="simulated account requests per minute")
+    parser.add_argument("--tpm", type=int, default=2_000_000, help="simulated account tokens per minute")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=64, help="client max_concurrency")
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--prompt-words", type=int, default=200)
+    parser.add_argument("--out", help="write results as JSON")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    results = []
+    for name in ("no governor", "retries only", "paced"):
+        result = asyncio.run(run_scenario(name, args))
+        results.append(result)
+        print(
+            f"{name:>13}: {result['wall_seconds']:6.2f}s  {result['completed']:4d} ok  {result['failed']:4d} failed  "
+            f"{result['provider_rejections']:5d} rejected  {result['achieved_rpm']:8.1f} rpm "
+            f"(limit {args.rpm}, sent at {result['sent_rpm']:.1f})  cv {result['throughput_cv']:.2f}"
+        )
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as file:
+            json.dump({"rpm": args.rpm, "tpm": args.tpm, "results": results}, file, indent=2)
+
+    paced = results[-1]
+    if paced["sent_rpm"] > args.rpm or paced["sent_tpm"] > args.tpm:
+        print(
+            f"paced client exceeded the limits: {paced['sent_rpm']:.1f} rpm (limit {args.rpm}), "
+            f"{paced['sent_tpm']} tpm (limit {args.tpm})"
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+resilience benchmark
+
+runs synthetic scenes (each `--turns` sequential structured calls, `--scenes` of them
+concurrently) against the fake backend with a heavy latency tail: a `--slow-rate`
+fraction of requests take `--slow-factor` times the normal latency. compares
+
+  plain           : no hedging
+  hedged          : calls slower than the learned p95 get a duplicate request
+
+then simulates an outage where every request to the primary model fails after
+`--failure-latency` seconds, with a fallback model configured:
+
+  no breaker      : every call waits for the primary to fail, then falls back
+  breaker         : after 5 failures the circuit opens and calls go straight to the fallback
+
+reports per-call and per-scene latency percentiles and the requests sent. the hedger
+only hedges once it has seen a few calls, so slow calls at the very start are never
+hedged; with few turns per scene they alone can set the call p99.
+
+    python src/benchmarks/bench_resilience.py --scenes 20 --turns 12
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import statistics
+from typing import Any, Dict, List
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIR)
+
+from services.backends import FakeBackend  # noqa: E402
+from services.llm_client import LLMCallError, LLMClient, get_llm_config  # noqa: E402
+
+PRIMARY = "primary-model"
+FALLBACK = "fallback-model"
+
+
+class TailBackend(FakeBackend):
+    """Fake backend with a latency tail and, optionally, a primary model that always fails."""
+
+    def __init__(self, latency: float, slow_rate: float, slow_factor: float, failure_latency: float, outage: bool):
+        super().__init__(latency)
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.failure_latency = failure_latency
+        self.outage = outage
+        self.rng = random.Random(1)
+        self.requests: Dict[str, int] = {}
+
+    async def astructured(self, messages, config, response_model):
+        self.requests[config.model] = self.requests.get(config.model, 0) + 1
+        if self.outage and config.model == PRIMARY:
+            await asyncio.sleep(self.failure_latency)
+            raise ConnectionError("primary model unavailable (simulated)")
+        slow = self.rng.random() < self.slow_rate
+        await asyncio.sleep(self.latency * (self.slow_factor if slow else 1.0))
+        return self._structured(messages, response_model)
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+async def run_scenario(name: str, args) -> Dict[str, Any]:
+    outage = name in ("no breaker", "breaker")
+    backend = TailBackend(args.latency, args.slow_rate, args.slow_factor, args.failure_latency, outage)
+    config = get_llm_config().model_copy(
+        update=dict(
+            model=PRIMARY,
+            backend="fake",
+            cache_path=None,
+            max_concurrency=args.scenes * 2,
+            fallback_model=FALLBACK if outage else None,
+            hedge_percentile=0.95 if name == "hedged" else None,
+            breaker_failures=5 if name == "breaker" else 10**9,
+        )
+    )
+    client = LLMClient(config, backend=backend)
+    call_seconds: List[float] = []
+    failed = 0
+
+    async def scene(s: int) -> float:
+        nonlocal failed
+        started = time.perf_counter()
+        for t in range(args.turns):
+            messages = [
+                {"role": "system", "content": "You are roleplaying as Bench. Keep it short."},
+                {"role": "user", "content": f"Scene {s}, turn {t}."},
+            ]
+            call_started = time.perf_counter()
+            try:
+                await client.aexecute_character_dialogue(messages)
+            except LLMCallError:
+                failed += 1
+            call_seconds.append(time.perf_counter() - call_started)
+        return time.perf_counter() - started
+
+    try:
+        started = time.perf_counter()
+        scene_seconds = await asyncio.gather(*(scene(s) for s in range(args.scenes)))
+        wall = time.perf_counter() - started
+    finally:
+        await client.aclose()
+
+    return {
+        "scenario": name,
+        "wall_seconds": round(wall, 3),
+        "failed": failed,
+        "call_p50": round(percentile(call_seconds, 0.5), 3),
+        "call_p99": round(percentile(call_seconds, 0.99), 3),
+        "scene_p50": round(statistics.median(scene_seconds), 3),
+        "scene_p99": round(percentile(scene_seconds, 0.99), 3),
+        "requests": dict(backend.requests),
+        "resilience": client.resilience_stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hedged requests and the circuit breaker.")
+    parser.add_argument("--scenes", type=int, default=20, help="scenes running concurrently")
+    parser.add_argument("--turns", type=int, default=12, help="sequential calls per scene")
+    parser.add_argument("--latency", type=float, default=0.05, help="normal seconds per call")
+    parser.add_argument("--slow-rate", type=float, default=0.03, help="fraction of requests in the tail")
+    parser.add_argument("--slow-factor", type=float, default=20.0, help="how much slower tail requests are")
+    parser.add_argument("--failure-latency", type=float, default=0.5, help="seconds before a failing call errors")
+    parser.add_argument("--out", help="write results as JSON")
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    results = []
+    for name in ("plain", "hedged", "no breaker", "breaker"):
+        result = asyncio.run(run_scenario(name, args))
+        results.append(result)
+        print(
+            f"{name:>10}: {result['wall_seconds']:6.2f}s  call p50 {result['call_p50']:.3f}s p99 "
+            f"{result['call_p99']:.3f}s  scene p50 {result['scene_p50']:.3f}s p99 {result['scene_p99']:.3f}s  "
+            f"{result['failed']} failed  requests {result['requests']}"
+        )
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as file:
+            json.dump({"args": vars(args), "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
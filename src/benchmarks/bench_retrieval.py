@@ -0,0 +1,88 @@
+"""
+retrieval benchmark
+
+grows a synthetic story scene by scene (a narration plus `--turns` turns each) and, at
+every checkpoint size, compares what a narrator prompt would carry as past context:
+the whole story so far versus the passages StoryIndex recalls within its budget. also
+reports the time to index a scene and to run a recall query.
+
+    python src/benchmarks/bench_retrieval.py --scenes 10 100 500
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIR)
+
+from models.story import ConversationTurn, Scene  # noqa: E402
+from services.retrieval import StoryIndex  # noqa: E402
+from services.tokens import estimate_tokens  # noqa: E402
+
+WORDS = (
+    "crystal harmony valley temple door moon giant stone river oath prophecy shadow lantern bridge "
+    "forest ember whisper storm archive key mirror tower island wolf compass relic silver tide ash "
+    "garden bell crown thorn vault spire mask ferry glacier orchard beacon harbor labyrinth"
+).split()
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark past-scene recall against pasting the whole story.")
+    parser.add_argument("--scenes", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--turns", type=int, default=8, help="turns per scene")
+    parser.add_argument("--top-k", type=int, default=6)
+    parser.add_argument("--budget", type=int, default=400, help="recall token budget")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    index = StoryIndex(args.top_k, args.budget)
+    full_tokens = 0
+    add_seconds = []
+
+    for scene_no in range(max(args.scenes)):
+        narration = " ".join(sentence(rng, 14) for _ in range(4))
+        turns = [
+            ConversationTurn(
+                character=f"Character {t % 3}",
+                dialogue=sentence(rng, 12),
+                emotion="calm",
+                tone="serious",
+                body_language="still",
+                inner_thoughts="",
+            )
+            for t in range(args.turns)
+        ]
+        started = time.perf_counter()
+        index.add_scene(scene_no, narration, turns)
+        add_seconds.append(time.perf_counter() - started)
+        full_tokens += estimate_tokens(narration) + sum(estimate_tokens(f'{t.character}: "{t.dialogue}"') for t in turns)
+
+        if scene_no + 1 not in args.scenes:
+            continue
+        queries = [Scene(scene_no=scene_no + 1 + i, context=sentence(rng, 20), conflict=sentence(rng, 8)) for i in range(20)]
+        recalled_tokens = []
+        search_seconds = []
+        for scene in queries:
+            started = time.perf_counter()
+            passages = index.recall_for_scene(scene)
+            search_seconds.append(time.perf_counter() - started)
+            recalled_tokens.append(estimate_tokens(StoryIndex.render(passages) or ""))
+        print(
+            f"{scene_no + 1:5d} scenes ({len(index):6d} passages): whole story {full_tokens:8d} tokens, "
+            f"recalled {statistics.mean(recalled_tokens):6.1f} tokens, "
+            f"recall {statistics.median(search_seconds) * 1000:6.2f} ms, "
+            f"index a scene {statistics.median(add_seconds) * 1000:5.3f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
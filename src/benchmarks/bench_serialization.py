@@ -0,0 +1,159 @@
+"""
+serialization benchmark
+
+dumps and loads a large synthetic story output with every available serializer and
+reports time, file size and peak Python memory (tracemalloc, measured in a separate
+pass so it does not skew the timings). also checks that the pure-Python YAML fallback
+writes the same bytes as libyaml.
+
+    python src/benchmarks/bench_serialization.py --scenes 200 --characters 12 --rounds 10
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+import yaml
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIR)
+
+from services.serialization import (  # noqa: E402
+    LIBYAML,
+    YAML_DUMP_OPTIONS,
+    LibyamlCompatibleDumper,
+    dump_document,
+    load_document,
+)
+
+WORDS = (
+    "the valley crystal moonlight giant mercy memory trust dawn river temple door "
+    "shadow prophecy stone courage patience “quoted” naïve café — 🙂"
+).split()
+
+
+def make_output(scenes: int, characters: int, rounds: int, seed: int = 0) -> Dict[str, Any]:
+    """Build a story output shaped like StoryProcessor's."""
+    rng = random.Random(seed)
+
+    def text(low: int, high: int) -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize() + "."
+
+    names = [f"Character {i}" for i in range(characters)]
+    output = {
+        "story_info": {"context": text(20, 40), "total_scenes": scenes, "characters": names, "seed": seed},
+        "scenes": [],
+    }
+    for scene_no in range(scenes):
+        turns = [
+            {
+                "character": name,
+                "dialogue": text(15, 50),
+                "emotional_state": rng.choice(["calm", "tense", "hopeful"]),
+                "action": text(3, 10),
+            }
+            for _ in range(rounds)
+            for name in names
+        ]
+        output["scenes"].append(
+            {
+                "scene_no": scene_no,
+                "context": text(10, 30),
+                "narration": text(50, 120),
+                "conversations": turns,
+                "conversations_formatted": [f"{t['character']}: {t['dialogue']}" for t in turns],
+            }
+        )
+    return output
+
+
+def yaml_pure_dump(data, path):
+    with open(path, "w", encoding="utf-8") as file:
+        yaml.dump(data, file, Dumper=LibyamlCompatibleDumper, **YAML_DUMP_OPTIONS)
+
+
+def yaml_pure_load(path):
+    with open(path, "r", encoding="utf-8") as file:
+        return yaml.load(file, Loader=yaml.SafeLoader)
+
+
+def serializers() -> List[Tuple[str, str, Callable, Callable]]:
+    """(name, suffix, dump, load) for every serializer available here."""
+    available = [("yaml (pure python)", ".yaml", yaml_pure_dump, yaml_pure_load)]
+    if LIBYAML:
+        available.append(("yaml (libyaml)", ".yaml", dump_document, load_document))
+    available.append(("json", ".json", dump_document, load_document))
+    try:
+        import msgpack  # noqa: F401
+
+        available.append(("msgpack", ".msgpack", dump_document, load_document))
+    except ImportError:
+        print("msgpack not installed, skipping it")
+    return available
+
+
+def measure(fn: Callable, *args) -> Tuple[float, float]:
+    """Wall seconds of one call, and its peak traced memory in MB from a second call."""
+    started = time.perf_counter()
+    fn(*args)
+    seconds = time.perf_counter() - started
+
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark story output serializers.")
+    parser.add_argument("--scenes", type=int, default=100)
+    parser.add_argument("--characters", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--out", help="write results as JSON")
+    args = parser.parse_args()
+
+    data = make_output(args.scenes, args.characters, args.rounds)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, suffix, dump, load in serializers():
+            path = os.path.join(tmp, f"story{suffix}")
+            dump_seconds, dump_mb = measure(dump, data, path)
+            load_seconds, load_mb = measure(load, path)
+            size_mb = os.path.getsize(path) / 2**20
+            print(
+                f"{name:>20}: dump {dump_seconds:7.3f}s ({dump_mb:6.1f} MB peak)  "
+                f"load {load_seconds:7.3f}s ({load_mb:6.1f} MB peak)  {size_mb:6.2f} MB on disk"
+            )
+            results.append(
+                {
+                    "serializer": name,
+                    "dump_seconds": round(dump_seconds, 4),
+                    "load_seconds": round(load_seconds, 4),
+                    "dump_peak_mb": round(dump_mb, 2),
+                    "load_peak_mb": round(load_mb, 2),
+                    "size_mb": round(size_mb, 3),
+                }
+            )
+
+        if LIBYAML:
+            pure_path, c_path = os.path.join(tmp, "pure.yaml"), os.path.join(tmp, "c.yaml")
+            yaml_pure_dump(data, pure_path)
+            dump_document(data, c_path)
+            with open(pure_path, "rb") as pure, open(c_path, "rb") as c:
+                identical = pure.read() == c.read()
+            print(f"pure-Python and libyaml YAML output byte-identical: {identical}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as file:
+            json.dump({"scenes": args.scenes, "characters": args.characters, "rounds": args.rounds, "results": results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,11 @@
-from typing import Dict, List, Optional, Union
-from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+
+# Story inputs are validated once and then shared read-only across the pipeline
+FROZEN = ConfigDict(frozen=True)
 
 class Character(BaseModel):
+    model_config = FROZEN
     goal: str
     backstory: str
     traits: Optional[Dict[str, float]] = None  # e.g., {"bravery": 0.7, "patience": 0.4}
@@ -10,6 +14,7 @@ class Character(BaseModel):
     relationships: Optional[Dict[str, str]] = None # ties to other characters
 
 class Scene(BaseModel):
+    model_config = FROZEN
     scene_no: int
     location: Optional[str] = None
     atmosphere: Optional[str] = None
@@ -20,21 +25,54 @@ class Scene(BaseModel):
     themes: Optional[List[str]] = None
     max_conversations: Optional[int] = None
     description: Optional[str] = None  # extra narrative details
+    depends_on: Optional[List[int]] = None  # scene_nos this scene follows; [] starts an independent chain
+    thread: Optional[str] = None  # subplot label; scenes of a thread run in order
 
 class Config(BaseModel):
-    conversation_rounds: int
-    output_file: str
+    model_config = FROZEN
+    conversation_rounds: int = 2
+    output_file: Optional[str] = None
     randomness: Optional[float] = None
-    branching_factor: Optional[int] = None
+    branching_factor: Optional[int] = None  # candidates sampled per narration/turn
+    save_alternatives: Optional[bool] = None  # keep the rejected branches in the output
     memory_tracking: Optional[bool] = None
+    memory_window: Optional[int] = None  # verbatim turns kept when memory_tracking is on
+    retrieval: Optional[bool] = None  # recall relevant passages of earlier scenes into prompts
+    retrieval_top_k: Optional[int] = None  # passages recalled per prompt (default 6)
+    retrieval_token_budget: Optional[int] = None  # token cap on recalled passages per prompt (default 400)
     narrative_style: Optional[str] = None
+    round_mode: Optional[str] = None  # "sequential" (default), "simultaneous" or "batched"
+    early_stopping: Optional[bool] = None  # end a scene's conversation once it resolves or stalls
+    early_stopping_threshold: Optional[float] = None  # progress (0-1) that counts as resolved (default 0.6)
+    min_rounds: Optional[int] = None  # rounds always run before early stopping may end a scene (default 1)
+    seed: Optional[int] = None  # sampling seed sent with every LLM call; recorded in the output and checkpoint
+    conversations_formatted: bool = True  # also write each turn as rich text next to the raw turns
 
 class StoryInput(BaseModel):
+    model_config = FROZEN
     context: str
     characters: Dict[str, Character]
     scenes: List[Scene]
     config: Optional[Config] = None
-    initial_conversation: Optional[List[Dict[str, Union[str, int]]]] = None
+    initial_conversation: Optional[List["ConversationTurn"]] = None
+
+    @model_validator(mode="after")
+    def _check_scene_dependencies(self):
+        """
+        Scene numbers must be unique (scenes, checkpoints and metrics are keyed by them),
+        and dependencies must name scenes listed earlier, which also rules out cycles.
+        """
+        seen = set()
+        for scene in self.scenes:
+            if scene.scene_no in seen:
+                raise ValueError(f"scene_no {scene.scene_no} is not unique")
+            for dependency in scene.depends_on or []:
+                if dependency not in seen:
+                    raise ValueError(
+                        f"scene {scene.scene_no} depends on scene {dependency}, which is not listed before it"
+                    )
+            seen.add(scene.scene_no)
+        return self
 
 class StoryOutput(BaseModel):
     dialogues: Dict[str, List[str]]  # character name to list of dialogues
@@ -45,6 +83,7 @@ class StoryOutput(BaseModel):
     next_steps: Optional[List[str]] = None
 
 class ConversationTurn(BaseModel):
+    model_config = FROZEN
     character: str = Field(description="character's name")
     dialogue: str = Field(description="character's spoken dialogue")
     emotion: str = Field(description="character's emotional tone. e.g. 'sad', 'angry'")
@@ -52,10 +91,16 @@ class ConversationTurn(BaseModel):
     body_language: str = Field(description="character's body language e.g. 'stepping forward with measured grace', 'armor gleaming softly', 'posture commanding yet approachable'")
     inner_thoughts: str = Field(description="character's internal thoughts or motivations. e.g. 'I must protect them at all costs', 'This is my moment to shine'")
 
+class RoundTurns(BaseModel):
+    model_config = FROZEN
+    turns: List[ConversationTurn] = Field(description="one turn per character, in the order the characters are listed")
+
 class SceneConversation(BaseModel):
     scene_no: int
     turns: List[ConversationTurn]
     summary: Optional[str] = None  # brief summary of the conversation
     revelations: Optional[List[str]] = None  # key secrets or info revealed
     unresolved_tensions: Optional[List[str]] = None  # ongoing conflicts
-    directors_rewarks: Optional[int] = -1 # 0-10 scale of how well the conversation met goals
\ No newline at end of file
+    directors_rewarks: Optional[int] = -1 # 0-10 scale of how well the conversation met goals
+
+StoryInput.model_rebuild()
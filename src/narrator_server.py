@@ -0,0 +1,501 @@
+"""
+narrator service
+
+long-running HTTP front end for the story pipeline. one warm StoryProcessor (and its
+LLMClient, pooled HTTP session and response cache) serves every request from an
+asyncio loop on a background thread; HTTP requests are handled on stdlib server
+threads. submitted stories wait in a queue with one FIFO per tenant, and workers take
+jobs round-robin across tenants that are below their concurrency limit.
+
+    POST   /stories              submit a story (JSON or YAML body); X-Tenant header picks the tenant
+    GET    /stories/<id>         job status
+    GET    /stories/<id>/events  NDJSON stream of job events, replayed from the start then live
+    GET    /stories/<id>/output  the finished story output
+    DELETE /stories/<id>         cancel a queued or running job
+    GET    /health               queue and worker state
+    GET    /metrics              LLM call metrics in Prometheus text format
+
+    python src/narrator_server.py --port 8080 --backend fake
+"""
+
+import json
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+import threading
+from collections import OrderedDict, defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+import yaml
+from pydantic import ValidationError
+
+from models.story import StoryInput
+from services.llm_client import LLMClient, get_llm_config
+from services.metrics import call_tags
+from services.serialization import load_yaml
+from services.streaming import aiter_events
+from story_processor import StoryProcessor
+
+logger = logging.getLogger("narrator_server")
+
+FINAL_STATUSES = ("done", "failed", "cancelled")
+# Streaming events superseded by the finished "narration" / "turn" events that follow them
+PARTIAL_EVENTS = ("narration_delta", "turn_partial")
+DEFAULT_TENANT = "default"
+
+
+class QueueFull(Exception):
+    """Raised when a tenant already has its maximum number of jobs waiting."""
+
+
+class ServerJob:
+    """One submitted story: its status, its event log and, once done, its output."""
+
+    def __init__(self, tenant: str, story: StoryInput):
+        self.id = uuid.uuid4().hex[:12]
+        self.tenant = tenant
+        self.story = story
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.output: Optional[Dict[str, Any]] = None
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self.events: List[Dict[str, Any]] = []
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINAL_STATUSES
+
+    def publish(self, event: Dict[str, Any]):
+        with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    def start(self) -> bool:
+        """Move a queued job to running; False if it was cancelled first."""
+        with self._changed:
+            if self.status != "queued":
+                return False
+            self.status = "running"
+            self.started_at = time.time()
+        self.publish({"event": "started", "job": self.id})
+        return True
+
+    def finish(self, status: str, error: Optional[str] = None) -> bool:
+        """
+        Record the final status, unless the job already has one. The partial streaming
+        events are dropped from the log then: the finished events carry the same text.
+        """
+        with self._changed:
+            if self.finished:
+                return False
+            self.finished_at = time.time()
+            self.error = error
+            self.status = status
+            events = [event for event in self.events if event.get("event") not in PARTIAL_EVENTS]
+            events.append({"event": status, "job": self.id, **({"error": error} if error else {})})
+            self.events = events  # a new list, so follow() can tell it was compacted
+            self._changed.notify_all()
+        return True
+
+    def follow(self, poll: float = 15.0) -> Iterator[Optional[Dict[str, Any]]]:
+        """
+        Every event from the first on, blocking for new ones until the job finishes.
+        Yields None after `poll` seconds without events so callers can send keep-alives.
+        """
+        index = 0
+        seen: List[Dict[str, Any]] = self.events
+        while True:
+            with self._changed:
+                if index >= len(self.events) and not self.finished:
+                    self._changed.wait(poll)
+                if self.events is not seen:
+                    # Compacted by finish(): find our place among the events that were kept
+                    index = sum(1 for event in seen[:index] if event.get("event") not in PARTIAL_EVENTS)
+                    seen = self.events
+                batch = self.events[index:]
+                done = self.finished
+            index += len(batch)
+            if not batch and not done:
+                yield None
+            yield from batch
+            if done and index >= len(self.events):
+                return
+
+    def to_dict(self) -> Dict[str, Any]:
+        info = {
+            "job": self.id,
+            "tenant": self.tenant,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "events": len(self.events),
+        }
+        if self.error:
+            info["error"] = self.error
+        return info
+
+
+class TenantQueue:
+    """
+    Job queue with one FIFO per tenant. get() hands out the oldest job of the next
+    tenant (round-robin) that has fewer than its limit of jobs running, so one busy
+    tenant cannot starve the others. Only used from the service's event loop.
+    """
+
+    def __init__(self, default_limit: int, limits: Optional[Dict[str, int]] = None, max_pending: int = 100):
+        self.default_limit = default_limit
+        self.limits = limits or {}
+        self.max_pending = max_pending
+        self._pending: Dict[str, Deque[ServerJob]] = {}
+        self._rotation: Deque[str] = deque()  # tenants with pending jobs
+        self.running: Dict[str, int] = defaultdict(int)
+        self._changed: Optional[asyncio.Condition] = None
+
+    def limit(self, tenant: str) -> int:
+        return self.limits.get(tenant, self.default_limit)
+
+    def _condition(self) -> asyncio.Condition:
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        return self._changed
+
+    async def put(self, job: ServerJob):
+        async with self._condition():
+            pending = self._pending.get(job.tenant)
+            if pending is None:
+                pending = self._pending[job.tenant] = deque()
+                self._rotation.append(job.tenant)
+            if len(pending) >= self.max_pending:
+                raise QueueFull(f"tenant {job.tenant!r} already has {len(pending)} stories queued")
+            pending.append(job)
+            self._changed.notify_all()
+
+    def _next(self) -> Optional[ServerJob]:
+        for _ in range(len(self._rotation)):
+            tenant = self._rotation[0]
+            self._rotation.rotate(-1)
+            if self.running[tenant] >= self.limit(tenant):
+                continue
+            pending = self._pending[tenant]
+            job = pending.popleft()
+            if not pending:
+                del self._pending[tenant]
+                self._rotation.remove(tenant)
+            return job
+        return None
+
+    async def get(self) -> ServerJob:
+        async with self._condition():
+            while True:
+                job = self._next()
+                if job is not None:
+                    self.running[job.tenant] += 1
+                    return job
+                await self._changed.wait()
+
+    async def release(self, job: ServerJob):
+        async with self._condition():
+            self.running[job.tenant] -= 1
+            self._changed.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        tenants = set(self._pending) | {t for t, n in self.running.items() if n}
+        return {
+            tenant: {
+                "queued": len(self._pending.get(tenant, ())),
+                "running": self.running[tenant],
+                "limit": self.limit(tenant),
+            }
+            for tenant in sorted(tenants)
+        }
+
+
+class NarratorService:
+    """Warm StoryProcessor, worker pool and job registry behind the HTTP API."""
+
+    def __init__(
+        self,
+        processor: StoryProcessor,
+        workers: int = 8,
+        tenant_limit: int = 2,
+        tenant_limits: Optional[Dict[str, int]] = None,
+        max_pending: int = 100,
+        keep_finished: int = 200,
+    ):
+        self.processor = processor
+        self.workers = workers
+        self.queue = TenantQueue(tenant_limit, tenant_limits, max_pending)
+        self.keep_finished = keep_finished
+        self.jobs: "OrderedDict[str, ServerJob]" = OrderedDict()
+        self._jobs_lock = threading.Lock()
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="narrator-loop", daemon=True)
+        self._workers: List[asyncio.Future] = []
+
+    def start(self):
+        self._thread.start()
+        for i in range(self.workers):
+            self._workers.append(asyncio.run_coroutine_threadsafe(self._worker(i), self.loop))
+        logger.info(f"Narrator service started with {self.workers} workers")
+
+    def stop(self):
+        """Cancel outstanding work, close the LLM client's session and stop the loop."""
+
+        async def shutdown():
+            tasks = [job.task for job in list(self.jobs.values()) if job.task is not None and not job.task.done()]
+            for task in tasks:
+                task.cancel()
+            for worker in self._workers:
+                worker.cancel()
+            # Let the cancelled stories unwind on this loop before it stops
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.processor.llm_client.aclose()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(timeout=30)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=30)
+
+    def submit(self, tenant: str, config: Dict[str, Any]) -> ServerJob:
+        """Validate a story and queue it; raises ValidationError or QueueFull."""
+        job = ServerJob(tenant, StoryInput.model_validate(config))
+        job.publish({"event": "queued", "job": job.id, "tenant": tenant})
+        asyncio.run_coroutine_threadsafe(self.queue.put(job), self.loop).result()
+        with self._jobs_lock:
+            self.jobs[job.id] = job
+            self._forget_finished()
+        logger.info(f"Queued story {job.id} for tenant {tenant}")
+        return job
+
+    def _forget_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[: max(0, len(finished) - self.keep_finished)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[ServerJob]:
+        with self._jobs_lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job: ServerJob):
+        # Still queued: the worker that picks it up will skip it. start() and this finish()
+        # take the job's lock, so exactly one of them wins.
+        if job.status == "queued" and job.finish("cancelled"):
+            return
+        self.loop.call_soon_threadsafe(self._cancel_task, job)
+
+    @staticmethod
+    def _cancel_task(job: ServerJob):
+        # On the loop, where start() and setting job.task happen in one step
+        if job.task is not None and not job.task.done():
+            job.task.cancel()
+
+    def health(self) -> Dict[str, Any]:
+        with self._jobs_lock:
+            statuses = defaultdict(int)
+            for job in self.jobs.values():
+                statuses[job.status] += 1
+
+        async def queue_stats():
+            return self.queue.stats()
+
+        tenants = asyncio.run_coroutine_threadsafe(queue_stats(), self.loop).result()
+        return {
+            "workers": self.workers,
+            "jobs": dict(statuses),
+            "tenants": tenants,
+            "rate_governor": self.processor.llm_client.governor.stats(),
+            "resilience": self.processor.llm_client.resilience_stats(),
+        }
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self.queue.get()
+            try:
+                if job.start():
+                    job.task = asyncio.ensure_future(self._run(job))
+                    await asyncio.wait([job.task])
+                    # A task cancelled before it first ran never reached _run's handlers
+                    job.finish("cancelled" if job.task.cancelled() else "failed")
+            finally:
+                await self.queue.release(job)
+
+    async def _run(self, job: ServerJob):
+        async def process():
+            with call_tags(story=job.id):
+                job.output = await self.processor.aprocess_story(job.story)
+
+        try:
+            async for event in aiter_events(process):
+                job.publish(event.to_dict())
+        except asyncio.CancelledError:
+            job.finish("cancelled")
+            raise
+        except Exception as e:
+            logger.error(f"Story {job.id} failed: {e!r}")
+            job.finish("failed", repr(e))
+        else:
+            job.finish("done")
+        finally:
+            # The job id is a one-off tag; keep the totals, not a group per job
+            self.processor.llm_client.metrics.forget_story(job.id)
+
+
+def _handler(service: NarratorService):
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, body: Any):
+            data = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _route(self):
+            parts = [p for p in self.path.split("?")[0].split("/") if p]
+            if len(parts) < 2 or parts[0] != "stories":
+                return parts, None
+            job = service.get(parts[1])
+            if job is None:
+                self._send_json(404, {"error": f"unknown story {parts[1]}"})
+            return parts, job
+
+        def _read_body(self) -> Any:
+            raw = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8")
+            if "json" in (self.headers.get("Content-Type") or ""):
+                return json.loads(raw)
+            return load_yaml(raw)  # YAML is a superset of JSON
+
+        def do_POST(self):
+            if self.path.split("?")[0].rstrip("/") != "/stories":
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                config = self._read_body()
+                job = service.submit(self.headers.get("X-Tenant") or DEFAULT_TENANT, config)
+            except (ValueError, yaml.YAMLError) as e:
+                # pydantic's ValidationError and json's JSONDecodeError are ValueErrors
+                detail = e.errors(include_url=False) if isinstance(e, ValidationError) else str(e)
+                self._send_json(400, {"error": "invalid story", "detail": detail})
+                return
+            except QueueFull as e:
+                self._send_json(429, {"error": str(e)})
+                return
+            self._send_json(202, job.to_dict())
+
+        def do_GET(self):
+            path = self.path.split("?")[0].rstrip("/")
+            if path == "/health":
+                self._send_json(200, service.health())
+                return
+            if path == "/metrics":
+                data = service.processor.llm_client.metrics.prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return
+
+            parts, job = self._route()
+            if job is None:
+                if not parts or parts[0] != "stories":
+                    self._send_json(404, {"error": "not found"})
+                return
+            if len(parts) == 2:
+                self._send_json(200, job.to_dict())
+            elif parts[2:] == ["output"]:
+                if job.status != "done":
+                    self._send_json(409, {"error": f"story is {job.status}", **job.to_dict()})
+                else:
+                    self._send_json(200, job.output)
+            elif parts[2:] == ["events"]:
+                self._stream_events(job)
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def _stream_events(self, job: ServerJob):
+            # HTTP/1.0 without Content-Length: the body ends when the connection closes
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            try:
+                for event in job.follow():
+                    line = "\n" if event is None else json.dumps(event, ensure_ascii=False, default=str) + "\n"
+                    self.wfile.write(line.encode("utf-8"))
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                logger.debug(f"Event stream client for {job.id} went away")
+
+        def do_DELETE(self):
+            parts, job = self._route()
+            if job is None:
+                if not parts or parts[0] != "stories":
+                    self._send_json(404, {"error": "not found"})
+                return
+            service.cancel(job)
+            self._send_json(202, job.to_dict())
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return Handler
+
+
+def _tenant_limits(specs: List[str]) -> Dict[str, int]:
+    limits = {}
+    for spec in specs:
+        tenant, _, limit = spec.partition("=")
+        limits[tenant] = int(limit)
+    return limits
+
+
+def main():
+    """Command line entry point for the service."""
+    parser = argparse.ArgumentParser(description="Serve the story narrator over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("-w", "--workers", type=int, default=8, help="stories processed at once across all tenants")
+    parser.add_argument("--tenant-limit", type=int, default=2, help="stories one tenant may have running at once")
+    parser.add_argument("--tenant", action="append", default=[], metavar="NAME=LIMIT", help="per-tenant limit override")
+    parser.add_argument("--max-queued", type=int, default=100, help="stories one tenant may have waiting")
+    parser.add_argument("--fresh", action="store_true", help="skip LLM response cache lookups")
+    parser.add_argument("--backend", help='"litellm", "fake", "record:<cassette>" or "replay:<cassette>"')
+    args = parser.parse_args()
+
+    # Configure logging
+    logging.basicConfig(level=logging.INFO)
+
+    llm_config = get_llm_config()
+    llm_config.cache_bypass = llm_config.cache_bypass or args.fresh
+    if args.backend:
+        llm_config.backend = args.backend
+    service = NarratorService(
+        StoryProcessor(LLMClient(llm_config)),
+        workers=args.workers,
+        tenant_limit=args.tenant_limit,
+        tenant_limits=_tenant_limits(args.tenant),
+        max_pending=args.max_queued,
+    )
+    service.start()
+
+    server = ThreadingHTTPServer((args.host, args.port), _handler(service))
+    logger.info(f"Narrator service listening on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down")
+    finally:
+        server.server_close()
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,62 @@
-import textwrap
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from models.story import Character, Scene
 from models.story import ConversationTurn
+from prompts.templates import (
+    CHARACTER_SYSTEM_PROMPT,
+    CHARACTER_TEMPLATE,
+    MEMORY_SUMMARY_TEMPLATE,
+    ROUND_CHARACTER_TEMPLATE,
+    ROUND_TEMPLATE,
+    SCENE_NARRATION_TEMPLATE,
+)
+
+
+def _head_messages(narration: str, recalled: Optional[str] = None) -> List[Dict[str, str]]:
+    """System prompt, scene narration and any recalled earlier events: shared by the whole scene."""
+    head = [
+        {"role": "system", "content": CHARACTER_SYSTEM_PROMPT},
+        {"role": "system", "content": SCENE_NARRATION_TEMPLATE.format(narration=narration)},
+    ]
+    if recalled:
+        head.append({"role": "system", "content": recalled})
+    return head
 
 
 class CharacterDialogueManager:
     def __init__(self):
-        pass
+        # name -> (character, rendered block); reused while the same Character object is passed
+        self._character_blocks: Dict[str, Tuple[Character, str]] = {}
+
+    def character_block(self, name: str, character: Character) -> str:
+        """Render the character-specific prompt block, once per character."""
+        cached = self._character_blocks.get(name)
+        if cached is not None and cached[0] is character:
+            return cached[1]
+
+        block = CHARACTER_TEMPLATE.format(
+            name=name,
+            goal=character.goal,
+            backstory=character.backstory,
+            traits=character.traits,
+            emotional_state=character.emotional_state,
+        )
+        self._character_blocks[name] = (character, block)
+        return block
+
+    def round_block(self, characters: Dict[str, Character]) -> str:
+        """The closing prompt block of a batched round: every character, in speaking order."""
+        return ROUND_TEMPLATE.format(
+            characters="\n\n".join(
+                ROUND_CHARACTER_TEMPLATE.format(
+                    name=name,
+                    goal=character.goal,
+                    backstory=character.backstory,
+                    traits=character.traits,
+                    emotional_state=character.emotional_state,
+                )
+                for name, character in characters.items()
+            )
+        )
 
     def to_rich_format(self, turn: ConversationTurn) -> str:
         parts = []
@@ -35,52 +85,103 @@ class CharacterDialogueManager:
         scene: Optional[Scene] = None,
         conversation_history: Optional[List[ConversationTurn]] = None,
         current_conversation_vs_max: Optional[str] = None,
+        memory_summary: Optional[str] = None,
+        recalled: Optional[str] = None,
     ) -> List[Dict[str, str]]:
 
-        message = []
-
-        system_propmt = f"""
-        You are an AI language model designed to roleplay as fictional characters in a story.
-        Your task is to generate dialogue for a specific character based on their personality, goals, backstory,
-        and the current scene narration provided by the narrator/director.
+        message = _head_messages(narration, recalled)
 
-        Current Scene Narration (from narrator/director):
-        {narration}
-
-        Instructions:
-        - You should respond in a way that is consistent with the character's traits and emotional state.
-        - React naturally to the narrator's description of the scene.
-        - If there is previous conversation, respond appropriately.
-        - Keep responses concise, ideally 2 sentences, and avoid narrating actions unless specified.
-        """
-        message.append(
-            {"role": "system", "content": textwrap.dedent(system_propmt).strip()}
-        )
+        if memory_summary:
+            # Older turns folded out of the conversation window
+            message.append(
+                {
+                    "role": "system",
+                    "content": MEMORY_SUMMARY_TEMPLATE.format(summary=memory_summary),
+                }
+            )
 
         for entry in conversation_history or []:
             message.append(
                 {"role": "assistant", "content": self.to_rich_format(entry)}
             )
 
-        print(character)
-        
-        character_prompt = f"""
-        You are roleplaying as {name}.
-
-        Character Details:
-        - Goal: {character.goal}
-        - Backstory: {character.backstory}
-        - Traits: {character.traits}
-        - Emotional State: {character.emotional_state}
-
-        {name}'s Response:
-        """
-
+        # The character block changes between callers, so it always goes last
         message.append(
             {
                 "role": "user",
-                "content": textwrap.dedent(character_prompt).strip(),
+                "content": self.character_block(name, character),
             }
         )
 
         return message
+
+
+class ConversationBuffer:
+    """
+    Per-scene prompt state for character turns.
+
+    Every turn is rendered to rich text once, and the messages all character prompts of
+    the scene share (system prompt, narration, recalled earlier events, the turns so far)
+    are kept and extended as turns are appended, instead of being rebuilt for every
+    prompt. The messages are identical to
+    CharacterDialogueManager.get_character_conversation_prompt.
+    """
+
+    def __init__(self, dialogue_manager: CharacterDialogueManager, narration: str, recalled: Optional[str] = None):
+        self.dialogue_manager = dialogue_manager
+        self._head = _head_messages(narration, recalled)
+        # The shared prefix: head plus one assistant message per turn in self._turns
+        self._turns: List[ConversationTurn] = []
+        self._prefix: List[Dict[str, str]] = list(self._head)
+        # id(turn) -> (turn, message); holding the turn keeps its id from being reused
+        self._messages: Dict[int, Tuple[ConversationTurn, Dict[str, str]]] = {}
+
+    def turn_message(self, turn: ConversationTurn) -> Dict[str, str]:
+        cached = self._messages.get(id(turn))
+        if cached is None:
+            message = {"role": "assistant", "content": self.dialogue_manager.to_rich_format(turn)}
+            cached = self._messages[id(turn)] = (turn, message)
+        return cached[1]
+
+    def rich_text(self, turn: ConversationTurn) -> str:
+        return self.turn_message(turn)["content"]
+
+    def prompt(
+        self,
+        name: str,
+        character: Character,
+        conversation_history: Optional[List[ConversationTurn]] = None,
+        memory_summary: Optional[str] = None,
+    ) -> List[Dict[str, str]]:
+        block = {"role": "user", "content": self.dialogue_manager.character_block(name, character)}
+        return [*self._history_messages(conversation_history or [], memory_summary), block]
+
+    def round_prompt(
+        self,
+        characters: Dict[str, Character],
+        conversation_history: Optional[List[ConversationTurn]] = None,
+        memory_summary: Optional[str] = None,
+    ) -> List[Dict[str, str]]:
+        """One prompt for a whole round: the shared messages, then every character's block."""
+        block = {"role": "user", "content": self.dialogue_manager.round_block(characters)}
+        return [*self._history_messages(conversation_history or [], memory_summary), block]
+
+    def _history_messages(
+        self, history: List[ConversationTurn], memory_summary: Optional[str]
+    ) -> List[Dict[str, str]]:
+        if memory_summary:
+            # A windowed history does not extend the shared prefix; reuse the rendered turns only
+            summary = {"role": "system", "content": MEMORY_SUMMARY_TEMPLATE.format(summary=memory_summary)}
+            return [*self._head, summary, *(self.turn_message(t) for t in history)]
+
+        known = len(self._turns)
+        if len(history) < known or (known and history[known - 1] is not self._turns[-1]):
+            # Not an extension of what we have (e.g. a new history list); start over
+            self._turns = []
+            self._prefix = list(self._head)
+            known = 0
+        for turn in history[known:]:
+            self._turns.append(turn)
+            self._prefix.append(self.turn_message(turn))
+        return self._prefix
+
@@ -0,0 +1,136 @@
+"""
+Prompt templates, dedented once at import time.
+
+Layout matters for provider-side prompt caching, which reuses the longest prefix a
+request shares with earlier ones. Character prompts therefore go from most to least
+stable: the fixed roleplay instructions (shared by every call), the scene narration
+(shared by every call in a scene), the append-only conversation history, and only
+then the character-specific block. The narrator prompt likewise keeps its fixed
+instructions and the story context ahead of anything scene-specific.
+"""
+
+import textwrap
+
+
+def _compile(template: str) -> str:
+    return textwrap.dedent(template).strip()
+
+
+CHARACTER_SYSTEM_PROMPT = _compile(
+    """
+    You are an AI language model designed to roleplay as fictional characters in a story.
+    Your task is to generate dialogue for a specific character based on their personality, goals, backstory,
+    and the current scene narration provided by the narrator/director.
+
+    Instructions:
+    - You should respond in a way that is consistent with the character's traits and emotional state.
+    - React naturally to the narrator's description of the scene.
+    - If there is previous conversation, respond appropriately.
+    - Keep responses concise, ideally 2 sentences, and avoid narrating actions unless specified.
+    """
+)
+
+SCENE_NARRATION_TEMPLATE = _compile(
+    """
+    Current Scene Narration (from narrator/director):
+    {narration}
+    """
+)
+
+MEMORY_SUMMARY_TEMPLATE = _compile(
+    """
+    Summary of the earlier conversation:
+    {summary}
+    """
+)
+
+MEMORY_FOLD_TEMPLATE = _compile(
+    """
+    You keep a running summary of a conversation between story characters.
+
+    Summary so far:
+    {summary}
+
+    New dialogue to fold in:
+    {new_turns}
+
+    Rewrite the summary to include the new dialogue. Keep who said what, decisions,
+    revelations and unresolved tensions. Be concise, at most 6 sentences.
+    """
+)
+
+RECALL_TEMPLATE = _compile(
+    """
+    Relevant Earlier Events (recalled from previous scenes):
+    {passages}
+    """
+)
+
+CHARACTER_TEMPLATE = _compile(
+    """
+    You are roleplaying as {name}.
+
+    Character Details:
+    - Goal: {goal}
+    - Backstory: {backstory}
+    - Traits: {traits}
+    - Emotional State: {emotional_state}
+
+    {name}'s Response:
+    """
+)
+
+ROUND_CHARACTER_TEMPLATE = _compile(
+    """
+    Character: {name}
+    - Goal: {goal}
+    - Backstory: {backstory}
+    - Traits: {traits}
+    - Emotional State: {emotional_state}
+    """
+)
+
+ROUND_TEMPLATE = _compile(
+    """
+    You are roleplaying as every character below, writing one full round of the conversation.
+
+    {characters}
+
+    Write exactly one turn for each character above, in the listed order. Each turn reacts to
+    everything said before it, including the earlier turns of this round. Set each turn's
+    character to the name exactly as written after "Character:".
+    """
+)
+
+NARRATOR_TEMPLATE = _compile(
+    """
+    You are a skilled narrator tasked with bringing scenes to life in an engaging and immersive manner, you are the director of th show.
+
+    Objective:
+    - Given the story context, the current scene, and past developments, narrate the scene in a captivating way.
+    - Ensure narration flows naturally from prior events and conversations.
+    - Use vivid descriptions, sensory details, and emotional cues to enhance the storytelling.
+    - Keep narration concise yet evocative, ideally 3-4 sentences.
+
+    Story Context:
+    {context}
+
+    ------------------------------------------------------------------
+    Current Scene:
+    {scene_context}
+
+    Scene Details:
+    - Location: {location}
+    - Atmosphere: {atmosphere}
+    - Conflict: {conflict}
+    - Possible Outcomes: {possible_outcomes}
+
+    {recalled}Previous Narration (if any):
+    {previous_narration}
+
+    Previous Conversation (if any):
+    {previous_conversation}
+
+    Narrator's Response:
+    """
+)
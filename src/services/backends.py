@@ -0,0 +1,635 @@
+"""
+Provider backends behind LLMClient.
+
+LLMClient owns caching and concurrency; a backend only turns one request into one
+response. `LiteLLMBackend` talks to real providers, `FakeBackend` answers locally
+with schema-valid output and simulated latency, and `RecordingBackend` /
+`ReplayBackend` capture real exchanges to a JSONL cassette and serve them back.
+"""
+
+import asyncio
+import email.utils
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+import typing
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Type, Union
+
+from pydantic import BaseModel
+
+from services.metrics import mark_attempt, mark_first_byte
+from services.rate_limit import TokenBucket
+
+logger = logging.getLogger("backends")
+
+
+class RateLimitedError(Exception):
+    """The provider rejected a request for exceeding a rate limit (HTTP 429)."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after  # seconds, from the Retry-After header if there was one
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds from a provider error's retry-after-ms / Retry-After headers."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or getattr(
+        error, "litellm_response_headers", None
+    )
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class BackendResult:
+    """A backend response plus the usage reported for it."""
+
+    def __init__(
+        self,
+        value: Any,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        cost: float = 0.0,
+    ):
+        self.value = value  # List[str] for completions, a model instance for structured calls
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.cost = cost
+        self.model: Optional[str] = None  # the model that answered, set by LLMClient
+
+
+class LLMBackend:
+    """Interface every backend implements; `n` asks for that many alternative completions."""
+
+    name = "base"
+    # Whether LLMClient's response cache should sit in front of this backend
+    cacheable = True
+
+    def complete(self, messages: List[Dict[str, str]], config, n: int = 1) -> BackendResult:
+        raise NotImplementedError
+
+    async def acomplete(self, messages: List[Dict[str, str]], config, n: int = 1) -> BackendResult:
+        raise NotImplementedError
+
+    def structured(self, messages: List[Dict[str, str]], config, response_model: Type[BaseModel]) -> BackendResult:
+        raise NotImplementedError
+
+    async def astructured(self, messages: List[Dict[str, str]], config, response_model: Type[BaseModel]) -> BackendResult:
+        raise NotImplementedError
+
+    async def astream_complete(
+        self, messages: List[Dict[str, str]], config
+    ) -> AsyncIterator[Union[str, BackendResult]]:
+        """
+        Yield text deltas as they arrive, then the BackendResult for the whole response.
+        Backends that cannot stream yield only the result.
+        """
+        yield await self.acomplete(messages, config)
+
+    async def astream_structured(
+        self, messages: List[Dict[str, str]], config, response_model: Type[BaseModel]
+    ) -> AsyncIterator[Union[Dict[str, Any], BackendResult]]:
+        """
+        Yield the fields received so far each time they grow, then the BackendResult
+        with the validated model. Backends that cannot stream yield only the result.
+        """
+        yield await self.astructured(messages, config, response_model)
+
+    def bind_loop(self, config):
+        """Prepare per-event-loop resources; called from inside the running loop."""
+
+    async def aclose(self):
+        """Release per-event-loop resources."""
+
+
+class LiteLLMBackend(LLMBackend):
+    """Real provider calls through litellm, with instructor for structured output."""
+
+    name = "litellm"
+
+    def __init__(self, config):
+        self.config = config
+        self._litellm = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._session = None
+
+    def _load(self):
+        """Import and configure litellm and instructor on first use; they take seconds to import."""
+        if self._litellm is not None:
+            return
+        import instructor
+        import litellm
+
+        # Configure litellm with custom base URL
+        litellm.api_base = self.config.base_url
+        litellm.api_key = self.config.api_key
+        litellm.enable_json_schema_validation = True
+        self.client = instructor.from_litellm(litellm.completion)
+        self.aclient = instructor.from_litellm(litellm.acompletion)
+        # Instructor re-asks on validation errors; count every attempt so retries show in the metrics
+        self.client.on("completion:kwargs", self._on_attempt)
+        self.aclient.on("completion:kwargs", self._on_attempt)
+        self._litellm = litellm
+
+    def bind_loop(self, config):
+        """Create the pooled HTTP session for the running loop."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._load()
+        self._loop = loop
+        import httpx
+
+        self._session = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=config.max_concurrency,
+                max_keepalive_connections=config.max_concurrency,
+            ),
+            timeout=httpx.Timeout(config.request_timeout, connect=10.0),
+            # Response hooks fire once headers arrive, before the body is read
+            event_hooks={"response": [self._on_response]},
+        )
+        # litellm hands this session to every async provider client
+        self._litellm.aclient_session = self._session
+
+    @staticmethod
+    def _on_attempt(*args, **kwargs):
+        mark_attempt()
+
+    @contextmanager
+    def _rate_limits(self):
+        """Re-raise provider 429s, also when wrapped by instructor, as RateLimitedError."""
+        try:
+            yield
+        except Exception as e:
+            cause: Optional[BaseException] = e
+            while cause is not None:
+                if isinstance(cause, self._litellm.RateLimitError) or getattr(cause, "status_code", None) == 429:
+                    raise RateLimitedError(str(cause), _retry_after(cause)) from e
+                cause = cause.__cause__ or cause.__context__
+            raise
+
+    @staticmethod
+    async def _on_response(response):
+        mark_first_byte()
+
+    async def aclose(self):
+        if self._session is not None:
+            if self._litellm.aclient_session is self._session:
+                self._litellm.aclient_session = None
+            await self._session.aclose()
+        self._loop = None
+        self._session = None
+
+    def _params(self, messages, config, n):
+        params = dict(
+            model=config.model,
+            messages=messages,
+            max_tokens=config.max_tokens,
+            temperature=config.temperature,
+        )
+        if n > 1:
+            params["n"] = n
+        if config.seed is not None:
+            params["seed"] = config.seed
+        return params
+
+    def _result(self, value, response) -> BackendResult:
+        usage = getattr(response, "usage", None)
+        try:
+            cost = self._litellm.completion_cost(completion_response=response)
+        except Exception:
+            cost = 0.0
+        return BackendResult(
+            value,
+            prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+            cost=cost or 0.0,
+        )
+
+    def complete(self, messages, config, n=1):
+        self._load()
+        with self._rate_limits():
+            response = self._litellm.completion(**self._params(messages, config, n))
+        return self._result([c.message.content.strip() for c in response.choices], response)
+
+    async def acomplete(self, messages, config, n=1):
+        self._load()
+        with self._rate_limits():
+            response = await self._litellm.acompletion(**self._params(messages, config, n))
+        return self._result([c.message.content.strip() for c in response.choices], response)
+
+    def structured(self, messages, config, response_model):
+        self._load()
+        with self._rate_limits():
+            model, response = self.client.chat.completions.create_with_completion(
+                response_model=response_model, max_retries=3, **self._params(messages, config, 1)
+            )
+        return self._result(model, response)
+
+    async def astructured(self, messages, config, response_model):
+        self._load()
+        with self._rate_limits():
+            model, response = await self.aclient.chat.completions.create_with_completion(
+                response_model=response_model, max_retries=3, **self._params(messages, config, 1)
+            )
+        return self._result(model, response)
+
+    async def astream_complete(self, messages, config):
+        self._load()
+        with self._rate_limits():
+            response = await self._litellm.acompletion(
+                stream=True, stream_options={"include_usage": True}, **self._params(messages, config, 1)
+            )
+            chunks = []
+            async for chunk in response:
+                chunks.append(chunk)
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    mark_first_byte()
+                    yield delta
+        full = self._litellm.stream_chunk_builder(chunks, messages=messages)
+        yield self._result([full.choices[0].message.content.strip()], full)
+
+    async def astream_structured(self, messages, config, response_model):
+        self._load()
+        # instructor's partial streaming fills the model in as the JSON arrives
+        partials = self.aclient.chat.completions.create_partial(
+            response_model=response_model, max_retries=3, **self._params(messages, config, 1)
+        )
+        fields: Dict[str, Any] = {}
+        with self._rate_limits():
+            async for partial in partials:
+                current = partial.model_dump(exclude_none=True)
+                if current != fields:
+                    mark_first_byte()
+                    fields = current
+                    yield fields
+        model = response_model.model_validate(fields)
+        yield self._estimated_result(model, messages, config)
+
+    def _estimated_result(self, model: BaseModel, messages, config) -> BackendResult:
+        """Partial streams carry no usage block; count the tokens locally instead."""
+        litellm = self._litellm
+        try:
+            prompt_tokens = litellm.token_counter(model=config.model, messages=messages)
+            completion_tokens = litellm.token_counter(model=config.model, text=model.model_dump_json())
+        except Exception:
+            return BackendResult(model)
+        try:
+            prompt_cost, completion_cost = litellm.cost_per_token(
+                model=config.model, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens
+            )
+            cost = prompt_cost + completion_cost
+        except Exception:
+            cost = 0.0
+        return BackendResult(model, prompt_tokens, completion_tokens, cost)
+
+
+_ROLEPLAY_NAME = re.compile(r"You are roleplaying as (.+?)\.\s")
+_ROUND_NAMES = re.compile(r"^Character: (.+)$", re.MULTILINE)
+_WORDS = re.compile(r"[A-Za-z]{4,}")
+
+
+class FakeBackend(LLMBackend):
+    """
+    Deterministic offline backend.
+
+    Responses are derived from a hash of the request and its seed, so identical prompts
+    always get identical answers, and every call sleeps `latency` ± `jitter` seconds to simulate
+    the provider round trip. Structured calls return instances of the requested model
+    with every field filled in. With `rpm_limit` / `tpm_limit` it also enforces account
+    limits the way a provider does, rejecting excess requests with a Retry-After.
+    """
+
+    name = "fake"
+    cacheable = False
+    # Seconds of budget the simulated provider lets through in one burst
+    LIMIT_BURST_SECONDS = 2.0
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rpm_limit: Optional[int] = None,
+        tpm_limit: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self._jitter_rng = random.Random(0)
+        self._requests = TokenBucket(rpm_limit, self.LIMIT_BURST_SECONDS) if rpm_limit else None
+        self._tokens = TokenBucket(tpm_limit, self.LIMIT_BURST_SECONDS) if tpm_limit else None
+        self._limits_lock = threading.Lock()
+        self.rejected = 0
+
+    def _admit(self, messages):
+        """Charge the simulated account limits, or reject like a provider would."""
+        if self._requests is None and self._tokens is None:
+            return
+        tokens = sum(len(m.get("content", "")) for m in messages) // 4
+        with self._limits_lock:
+            now = time.monotonic()
+            wait = max(
+                self._requests.wait_time(1, now) if self._requests else 0.0,
+                self._tokens.wait_time(tokens, now) if self._tokens else 0.0,
+            )
+            if wait > 0:
+                self.rejected += 1
+                raise RateLimitedError("Rate limit reached (simulated)", retry_after=round(wait, 3))
+            if self._requests:
+                self._requests.take(1)
+            if self._tokens:
+                self._tokens.take(tokens)
+
+    def _delay(self) -> float:
+        if not self.latency and not self.jitter:
+            return 0.0
+        return max(0.0, self.latency + self._jitter_rng.uniform(-self.jitter, self.jitter))
+
+    @staticmethod
+    def _rng(messages, salt: str = "", seed: Optional[int] = None) -> random.Random:
+        if seed is not None:
+            salt += f"/seed={seed}"
+        digest = hashlib.sha256((json.dumps(messages, sort_keys=True) + salt).encode("utf-8")).hexdigest()
+        return random.Random(int(digest[:16], 16))
+
+    def _text(self, messages, index: int, seed: Optional[int] = None) -> str:
+        rng = self._rng(messages, str(index), seed)
+        words = _WORDS.findall(messages[-1].get("content", "")) or ["scene"]
+        sentences = []
+        for _ in range(3):
+            picked = [rng.choice(words).lower() for _ in range(rng.randint(8, 14))]
+            sentences.append(" ".join(picked).capitalize() + ".")
+        return " ".join(sentences)
+
+    def _complete(self, messages, n, seed: Optional[int] = None) -> BackendResult:
+        texts = [self._text(messages, i, seed) for i in range(max(1, n))]
+        return BackendResult(
+            texts,
+            prompt_tokens=sum(len(m.get("content", "")) for m in messages) // 4,
+            completion_tokens=sum(len(t) for t in texts) // 4,
+        )
+
+    def _structured(self, messages, response_model, seed: Optional[int] = None) -> BackendResult:
+        rng = self._rng(messages, response_model.__name__, seed)
+        prompt = "\n".join(m.get("content", "") for m in messages)
+        match = _ROLEPLAY_NAME.search(prompt + " ")
+        context = {
+            "character": match.group(1) if match else "Narrator",
+            # A batched round prompt lists its speakers; lists of turns get one turn each
+            "characters": _ROUND_NAMES.findall(messages[-1].get("content", "")),
+            "words": _WORDS.findall(prompt) or ["scene"],
+        }
+        value = _fake_model(response_model, rng, context)
+        return BackendResult(
+            value,
+            prompt_tokens=len(prompt) // 4,
+            completion_tokens=len(value.model_dump_json()) // 4,
+        )
+
+    def complete(self, messages, config, n=1):
+        self._admit(messages)
+        time.sleep(self._delay())
+        mark_first_byte()
+        return self._complete(messages, n, config.seed)
+
+    async def acomplete(self, messages, config, n=1):
+        self._admit(messages)
+        await asyncio.sleep(self._delay())
+        mark_first_byte()
+        return self._complete(messages, n, config.seed)
+
+    def structured(self, messages, config, response_model):
+        self._admit(messages)
+        time.sleep(self._delay())
+        mark_first_byte()
+        return self._structured(messages, response_model, config.seed)
+
+    async def astructured(self, messages, config, response_model):
+        self._admit(messages)
+        await asyncio.sleep(self._delay())
+        mark_first_byte()
+        return self._structured(messages, response_model, config.seed)
+
+    # Streams take as long as the plain calls: the simulated latency is spread over the chunks
+
+    async def astream_complete(self, messages, config):
+        self._admit(messages)
+        result = self._complete(messages, 1, config.seed)
+        words = result.value[0].split(" ")
+        pause = self._delay() / len(words)
+        for i, word in enumerate(words):
+            await asyncio.sleep(pause)
+            mark_first_byte()
+            yield word if i == 0 else " " + word
+        yield result
+
+    async def astream_structured(self, messages, config, response_model):
+        self._admit(messages)
+        result = self._structured(messages, response_model, config.seed)
+        steps = []
+        fields: Dict[str, Any] = {}
+        for name, value in result.value.model_dump().items():
+            if isinstance(value, str):
+                words = value.split(" ")
+                steps += [(name, " ".join(words[: i + 1])) for i in range(len(words))]
+            else:
+                steps.append((name, value))
+        pause = self._delay() / len(steps)
+        for name, value in steps:
+            await asyncio.sleep(pause)
+            mark_first_byte()
+            fields[name] = value
+            yield dict(fields)
+        yield result
+
+
+def _fake_value(annotation, field_name: str, rng: random.Random, context: Dict[str, Any]):
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if origin is typing.Union:
+        return _fake_value(next(a for a in args if a is not type(None)), field_name, rng, context)
+    if origin in (list, List):
+        if context.get("characters") and "character" in getattr(args[0], "model_fields", {}):
+            return [_fake_model(args[0], rng, {**context, "character": name}) for name in context["characters"]]
+        return [_fake_value(args[0], field_name, rng, context) for _ in range(rng.randint(1, 3))]
+    if origin in (dict, Dict):
+        return {}
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return _fake_model(annotation, rng, context)
+    if annotation is bool:
+        return rng.random() < 0.5
+    if annotation is int:
+        return rng.randint(0, 10)
+    if annotation is float:
+        return round(rng.random(), 3)
+    if field_name == "character":
+        return context["character"]
+    words = [rng.choice(context["words"]).lower() for _ in range(rng.randint(4, 12))]
+    return " ".join(words).capitalize() + "."
+
+
+def _fake_model(model: Type[BaseModel], rng: random.Random, context: Dict[str, Any]) -> BaseModel:
+    return model(
+        **{
+            name: _fake_value(field.annotation, name, rng, context)
+            for name, field in model.model_fields.items()
+        }
+    )
+
+
+def _cassette_key(messages, config, kind: str, n: int = 1) -> str:
+    payload = json.dumps(
+        {"kind": kind, "model": config.model, "messages": messages, "n": n},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RecordingBackend(LLMBackend):
+    """Passes calls to `inner` and appends every exchange to a JSONL cassette."""
+
+    name = "record"
+    # A cached answer would never reach the cassette, and replaying it would miss
+    cacheable = False
+
+    def __init__(self, inner: LLMBackend, cassette_path: str):
+        self.inner = inner
+        self.cassette_path = cassette_path
+        self._lock = threading.Lock()
+
+    def _record(self, key: str, kind: str, messages, result: BackendResult):
+        value = result.value
+        if isinstance(value, BaseModel):
+            value = value.model_dump()
+        entry = {
+            "key": key,
+            "kind": kind,
+            "messages": messages,
+            "value": value,
+            "prompt_tokens": result.prompt_tokens,
+            "completion_tokens": result.completion_tokens,
+            "cost": result.cost,
+        }
+        with self._lock, open(self.cassette_path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def bind_loop(self, config):
+        self.inner.bind_loop(config)
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+    def complete(self, messages, config, n=1):
+        result = self.inner.complete(messages, config, n)
+        self._record(_cassette_key(messages, config, "text", n), "text", messages, result)
+        return result
+
+    async def acomplete(self, messages, config, n=1):
+        result = await self.inner.acomplete(messages, config, n)
+        self._record(_cassette_key(messages, config, "text", n), "text", messages, result)
+        return result
+
+    def structured(self, messages, config, response_model):
+        result = self.inner.structured(messages, config, response_model)
+        key = _cassette_key(messages, config, response_model.__name__)
+        self._record(key, response_model.__name__, messages, result)
+        return result
+
+    async def astructured(self, messages, config, response_model):
+        result = await self.inner.astructured(messages, config, response_model)
+        key = _cassette_key(messages, config, response_model.__name__)
+        self._record(key, response_model.__name__, messages, result)
+        return result
+
+
+class CassetteMissError(LookupError):
+    """Raised when a replayed run sends a request that was never recorded."""
+
+
+class ReplayBackend(LLMBackend):
+    """
+    Serves responses from a cassette written by RecordingBackend.
+
+    Identical requests recorded several times are replayed in recording order, and
+    the last one is repeated once they run out.
+    """
+
+    name = "replay"
+    cacheable = False
+
+    def __init__(self, cassette_path: str, latency: float = 0.0):
+        self.cassette_path = cassette_path
+        self.latency = latency
+        self._entries: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        with open(cassette_path, "r", encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry["key"]].append(entry)
+        logger.info(f"Loaded {sum(len(q) for q in self._entries.values())} recorded exchanges from {cassette_path}")
+
+    def _take(self, key: str) -> Dict[str, Any]:
+        queue = self._entries.get(key)
+        if not queue:
+            raise CassetteMissError(f"No recorded response for request {key[:12]} in {self.cassette_path}")
+        return queue.popleft() if len(queue) > 1 else queue[0]
+
+    @staticmethod
+    def _result(entry, value) -> BackendResult:
+        return BackendResult(value, entry.get("prompt_tokens", 0), entry.get("completion_tokens", 0), entry.get("cost", 0.0))
+
+    def complete(self, messages, config, n=1):
+        time.sleep(self.latency)
+        entry = self._take(_cassette_key(messages, config, "text", n))
+        return self._result(entry, entry["value"])
+
+    async def acomplete(self, messages, config, n=1):
+        await asyncio.sleep(self.latency)
+        entry = self._take(_cassette_key(messages, config, "text", n))
+        return self._result(entry, entry["value"])
+
+    def structured(self, messages, config, response_model):
+        time.sleep(self.latency)
+        entry = self._take(_cassette_key(messages, config, response_model.__name__))
+        return self._result(entry, response_model.model_validate(entry["value"]))
+
+    async def astructured(self, messages, config, response_model):
+        await asyncio.sleep(self.latency)
+        entry = self._take(_cassette_key(messages, config, response_model.__name__))
+        return self._result(entry, response_model.model_validate(entry["value"]))
+
+
+def create_backend(config) -> LLMBackend:
+    """
+    Build the backend named by `config.backend`:
+    "litellm", "fake", "record:<cassette.jsonl>" or "replay:<cassette.jsonl>".
+    """
+    kind, _, path = config.backend.partition(":")
+    if kind == "litellm":
+        return LiteLLMBackend(config)
+    if kind == "fake":
+        return FakeBackend(config.fake_latency, config.fake_jitter, config.fake_rpm_limit, config.fake_tpm_limit)
+    if kind == "record":
+        return RecordingBackend(LiteLLMBackend(config), path or "llm_cassette.jsonl")
+    if kind == "replay":
+        return ReplayBackend(path or "llm_cassette.jsonl", config.fake_latency)
+    raise ValueError(f"Unknown LLM backend {config.backend!r}")
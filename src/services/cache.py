@@ -0,0 +1,165 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("cache")
+
+
+class ResponseCache:
+    """
+    Content-addressed LLM response cache stored in a single SQLite file.
+
+    Entries are keyed by a hash of everything that shapes a response (model, sampling
+    parameters, messages and response schema) and evicted least-recently-used once the
+    cache grows past `max_entries` / `max_bytes`, or when older than `max_age_seconds`.
+    """
+
+    EVICT_EVERY = 64  # puts between size checks
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 100_000,
+        max_bytes: int = 512 * 1024 * 1024,
+        max_age_seconds: float = 30 * 24 * 3600,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+        )
+        self._conn.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        messages: List[Dict[str, str]],
+        schema: Optional[Dict[str, Any]] = None,
+        n: int = 1,
+        seed: Optional[int] = None,
+    ) -> str:
+        """Hash the request fields that determine the response."""
+        fields = {
+            "model": model,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "messages": messages,
+            "schema": schema,
+        }
+        if n != 1:
+            # Candidate sets are cached separately from single responses
+            fields["n"] = n
+        if seed is not None:
+            # Unseeded keys stay as they were, so existing caches keep their entries
+            fields["seed"] = seed
+        payload = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value for key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str):
+        """Store a response, evicting old entries every few writes."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now),
+            )
+            self._conn.commit()
+            self._puts += 1
+            should_evict = self._puts % self.EVICT_EVERY == 0
+        if should_evict:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least-recently-used ones until within limits."""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?",
+                (time.time() - self.max_age_seconds,),
+            )
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            if count > self.max_entries or total > self.max_bytes:
+                removed = 0
+                rows = self._conn.execute(
+                    "SELECT key, size FROM responses ORDER BY last_access ASC"
+                )
+                stale = []
+                for key, size in rows:
+                    if count - removed <= self.max_entries and total <= self.max_bytes:
+                        break
+                    stale.append((key,))
+                    removed += 1
+                    total -= size
+                self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+                logger.info(f"Evicted {removed} cached responses")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters plus the current size of the cache."""
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": count,
+            "bytes": total,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
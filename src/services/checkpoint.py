@@ -0,0 +1,115 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from models.story import ConversationTurn
+
+logger = logging.getLogger("checkpoint")
+
+
+def story_fingerprint(config: Dict[str, Any]) -> str:
+    """Hash of the story input, so a checkpoint is only resumed for the same story."""
+    payload = json.dumps(config, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SceneRecord:
+    """A finished scene plus the state the following scene needs."""
+
+    def __init__(self, scene_no: int, scene_output: Dict[str, Any], narration: str, conversation: List[ConversationTurn]):
+        self.scene_no = scene_no
+        self.scene_output = scene_output
+        self.narration = narration
+        self.conversation = conversation
+
+
+class SceneCheckpoint:
+    """
+    Append-only JSONL checkpoint of finished scenes.
+
+    The first line is a header with the story fingerprint and seed; every later line is
+    one completed scene. Each line is flushed and fsynced before the next scene starts,
+    so at most the scene in progress is lost when a run dies.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.seed: Optional[int] = None
+
+    @classmethod
+    def for_output(cls, output_file: str) -> "SceneCheckpoint":
+        return cls(f"{output_file}.checkpoint.jsonl")
+
+    def load(self, fingerprint: str) -> Dict[int, SceneRecord]:
+        """Return completed scenes by scene_no, or nothing if the checkpoint is for another story."""
+        if not os.path.exists(self.path):
+            return {}
+
+        records: Dict[int, SceneRecord] = {}
+        with open(self.path, "r", encoding="utf-8") as file:
+            header_line = file.readline()
+            try:
+                header = json.loads(header_line)
+            except json.JSONDecodeError:
+                logger.warning(f"Ignoring unreadable checkpoint {self.path}")
+                return {}
+            if header.get("fingerprint") != fingerprint:
+                logger.warning(f"Checkpoint {self.path} belongs to a different story input; starting over")
+                return {}
+            self.seed = header.get("seed")
+
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-write; everything before it is intact
+                    break
+                conversation = [ConversationTurn.model_validate(t) for t in entry["conversation"]]
+                # The scene's turns are stored once, under "conversation"
+                scene_output = {**entry["scene_output"], "conversations": conversation}
+                records[entry["scene_no"]] = SceneRecord(
+                    scene_no=entry["scene_no"],
+                    scene_output=scene_output,
+                    narration=entry["narration"],
+                    conversation=conversation,
+                )
+
+        logger.info(f"Resuming from {self.path}: {len(records)} scenes already completed")
+        return records
+
+    def start(self, fingerprint: str, seed: Optional[int], records: Dict[int, SceneRecord]):
+        """(Re)write the checkpoint with its header and any scenes being carried over."""
+        self.seed = seed
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write(json.dumps({"fingerprint": fingerprint, "seed": seed}) + "\n")
+            for record in records.values():
+                file.write(self._encode(record))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+
+    def record(self, record: SceneRecord):
+        """Durably append one finished scene."""
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(self._encode(record))
+            file.flush()
+            os.fsync(file.fileno())
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    @staticmethod
+    def _encode(record: SceneRecord) -> str:
+        return json.dumps(
+            {
+                "scene_no": record.scene_no,
+                "scene_output": {k: v for k, v in record.scene_output.items() if k != "conversations"},
+                "narration": record.narration,
+                "conversation": [turn.model_dump() for turn in record.conversation],
+            },
+            ensure_ascii=False,
+        ) + "\n"
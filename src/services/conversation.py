@@ -1,12 +1,28 @@
+import asyncio
 import textwrap
-from typing import TYPE_CHECKING, List, Dict, Any, Optional
+from typing import TYPE_CHECKING, AsyncIterator, List, Dict, Any, Optional
 from models.story import Character, ConversationTurn, Scene
 import logging
 
-from prompts.characters import CharacterDialogueManager
+from prompts.characters import CharacterDialogueManager, ConversationBuffer
+from services.llm_client import LLMCallError
+from services.memory import ConversationMemory
+from services.prefix_cache import PrefixCacheReport
+from services.director import BranchSelector, RoundController
+from services.metrics import call_tags
+from services.tracing import span
+from services.streaming import StoryEvent, aiter_events, emit, streamed
 
 logger = logging.getLogger("conversation")
 
+ROUND_MODES = ("sequential", "simultaneous", "batched")
+
+
+def _same_speaker(speaker: str, name: str) -> bool:
+    """Whether a turn's `character` names `name` (models often shorten or re-case names)."""
+    speaker, name = speaker.strip().casefold(), name.casefold()
+    return bool(speaker) and (speaker in name or name in speaker)
+
 
 class ConversationManager:
     def __init__(self, llm_client):
@@ -52,6 +68,49 @@ class ConversationManager:
         # model = ConversationTurn.model_validate(response.message.content)
         return response
 
+    async def agenerate_character_response(
+        self,
+        name: str,
+        character: Character,
+        narration: str,
+        scene: Optional[Scene] = None,
+        conversation_history: Optional[List[ConversationTurn]] = None,
+        current_conversation_vs_max: Optional[str] = None,
+        memory_summary: Optional[str] = None,
+        prefix_report: Optional[PrefixCacheReport] = None,
+        branches: Optional[BranchSelector] = None,
+        buffer: Optional[ConversationBuffer] = None,
+    ) -> ConversationTurn:
+        """
+        Async variant of generate_character_response.
+
+        With a branch selector, several candidate turns are sampled concurrently and
+        the best-scoring one is returned. With a scene buffer, the prompt is built from
+        its already rendered turns.
+        """
+        if buffer is not None:
+            character_message = buffer.prompt(name, character, conversation_history, memory_summary)
+        else:
+            character_message = self.dialogueManager.get_character_conversation_prompt(
+                name,
+                character,
+                narration,
+                scene,
+                conversation_history,
+                current_conversation_vs_max,
+                memory_summary,
+            )
+        if prefix_report is not None:
+            prefix_report.observe(character_message)
+        if branches is not None and branches.n > 1:
+            candidates = await self.llm_client.aexecute_character_dialogue_candidates(
+                character_message, branches.n
+            )
+            return branches.pick_turn(
+                candidates, name, narration, scene, conversation_history or []
+            )
+        return await self.llm_client.aexecute_character_dialogue(character_message)
+
     def conduct_scene_conversation(
         self,
         characters: Dict[str, Character],
@@ -75,9 +134,9 @@ class ConversationManager:
 
             for character_name in character_names:
                 print(characters[character_name])
-                # If it's already a Character instance, use it directly
-                character = characters[character_name] if isinstance(characters[character_name], Character) else Character(**characters[character_name])
+                character = self._as_character(characters[character_name])
 
+                # An LLMCallError fails the scene: a scene with missing turns is never recorded
                 response: ConversationTurn = self.generate_character_response(
                     name=character_name,
                     character=character,
@@ -98,6 +157,191 @@ class ConversationManager:
 
         return conversation_history
 
+    async def aconduct_scene_conversation(
+        self,
+        characters: Dict[str, Character],
+        narration: str,
+        scene: Optional[Scene] = None,
+        conversation_rounds: int = 2,
+        init_conversation: List[ConversationTurn] = None,
+        memory: Optional[ConversationMemory] = None,
+        prefix_report: Optional[PrefixCacheReport] = None,
+        round_mode: str = "sequential",
+        branches: Optional[BranchSelector] = None,
+        buffer: Optional[ConversationBuffer] = None,
+        controller: Optional[RoundController] = None,
+    ) -> List[ConversationTurn]:
+        """
+        Async variant of conduct_scene_conversation.
+
+        In "sequential" rounds every character answers the one before it. In
+        "simultaneous" rounds every character answers the history as it stood at the
+        start of the round, all requests run concurrently, and the turns are appended
+        in character order. With a memory, prompts carry only its window of recent
+        turns plus a summary. Prompts are built through `buffer` (a new one for the
+        scene if not given), so every turn is rendered once. With a round controller,
+        the conversation ends early once it reports the scene resolved or stalled.
+
+        In "batched" rounds one structured call writes the whole round, as in
+        "sequential"; characters the reply misses or misnames (and every character
+        when branching) get their own calls.
+        """
+        if round_mode not in ROUND_MODES:
+            raise ValueError(f"Unknown round mode {round_mode!r}, expected one of {ROUND_MODES}")
+
+        conversation_history = list(init_conversation or [])
+        if buffer is None:
+            buffer = ConversationBuffer(self.dialogueManager, narration)
+
+        for round_num in range(conversation_rounds):
+            logger.info(f"Starting conversation round {round_num + 1}")
+            progress = f"{round_num + 1}/{conversation_rounds}"
+            scene_no = scene.scene_no if scene is not None else None
+            round_start = len(conversation_history)
+
+            with call_tags(scene=scene_no, round=round_num + 1), span(f"round {round_num + 1}", mode=round_mode):
+                batch: List[ConversationTurn] = []
+                if round_mode == "batched" and (branches is None or branches.n <= 1):
+                    if memory is not None:
+                        await memory.aupdate(conversation_history)
+                    batch = await self._agenerate_round(
+                        characters, conversation_history, memory, prefix_report, buffer
+                    )
+                    conversation_history.extend(batch)
+
+                if round_mode == "simultaneous":
+                    if memory is not None:
+                        await memory.aupdate(conversation_history)
+                    snapshot = list(conversation_history)
+                    responses = await asyncio.gather(
+                        *(
+                            self._agenerate_turn(
+                                name, character_data, narration, scene, snapshot,
+                                progress, memory, prefix_report, branches, buffer,
+                            )
+                            for name, character_data in characters.items()
+                        )
+                    )
+                    conversation_history.extend(responses)
+                else:
+                    # In batched rounds, only the characters the batch did not cover
+                    for character_name, character_data in list(characters.items())[len(batch):]:
+                        if memory is not None:
+                            await memory.aupdate(conversation_history)
+                        response = await self._agenerate_turn(
+                            character_name, character_data, narration, scene,
+                            conversation_history, progress, memory, prefix_report, branches, buffer,
+                        )
+                        conversation_history.append(response)
+
+            if controller is not None and controller.observe_round(conversation_history[round_start:]):
+                logger.info(
+                    f"Scene {scene_no} {controller.stop_reason} after round {round_num + 1}/{conversation_rounds}; "
+                    f"skipping {controller.calls_saved} calls"
+                )
+                break
+
+        return conversation_history
+
+    async def _agenerate_turn(
+        self,
+        name: str,
+        character_data,
+        narration: str,
+        scene: Optional[Scene],
+        history: List[ConversationTurn],
+        progress: str,
+        memory: Optional[ConversationMemory],
+        prefix_report: Optional[PrefixCacheReport],
+        branches: Optional[BranchSelector] = None,
+        buffer: Optional[ConversationBuffer] = None,
+    ) -> ConversationTurn:
+        """
+        One character turn against `history`, windowed through the memory if any.
+        Raises LLMCallError if the call failed: the scene fails rather than being
+        recorded (and checkpointed) with a turn missing.
+        """
+        prompt_history = history
+        memory_summary = None
+        if memory is not None:
+            prompt_history = memory.visible_turns(history)
+            memory_summary = memory.summary
+
+        with call_tags(character=name), span(f"turn {name}"), streamed("turn"):
+            turn = await self.agenerate_character_response(
+                name=name,
+                character=self._as_character(character_data),
+                narration=narration,
+                scene=scene,
+                conversation_history=prompt_history,
+                current_conversation_vs_max=progress,
+                memory_summary=memory_summary,
+                prefix_report=prefix_report,
+                branches=branches,
+                buffer=buffer,
+            )
+            emit("turn", turn=turn)
+            return turn
+
+    async def _agenerate_round(
+        self,
+        characters: Dict[str, Any],
+        history: List[ConversationTurn],
+        memory: Optional[ConversationMemory],
+        prefix_report: Optional[PrefixCacheReport],
+        buffer: ConversationBuffer,
+    ) -> List[ConversationTurn]:
+        """
+        One structured call for a whole round. Returns the leading turns whose speakers
+        match the characters in order; the caller generates the rest one by one.
+        """
+        prompt_history = history
+        memory_summary = None
+        if memory is not None:
+            prompt_history = memory.visible_turns(history)
+            memory_summary = memory.summary
+        cast = {name: self._as_character(data) for name, data in characters.items()}
+        messages = buffer.round_prompt(cast, prompt_history, memory_summary)
+        if prefix_report is not None:
+            prefix_report.observe(messages)
+
+        with span("round batch", characters=len(cast)):
+            try:
+                turns = (await self.llm_client.aexecute_round_dialogue(messages)).turns
+            except LLMCallError as e:
+                # Not lost: the caller generates every turn the batch did not cover
+                logger.warning(f"Batched round failed, generating its turns one by one: {e}")
+                turns = []
+
+        accepted: List[ConversationTurn] = []
+        for name, turn in zip(cast, turns):
+            if not _same_speaker(turn.character, name):
+                break
+            if turn.character != name:
+                turn = turn.model_copy(update={"character": name})
+            accepted.append(turn)
+            with call_tags(character=name):
+                emit("turn", turn=turn)
+        if len(accepted) < len(cast):
+            logger.warning(
+                f"Batched round covered {len(accepted)}/{len(cast)} characters; generating the rest one by one"
+            )
+        return accepted
+
+    def astream_scene_conversation(self, *args, **kwargs) -> AsyncIterator[StoryEvent]:
+        """
+        Run aconduct_scene_conversation (same arguments) and yield its events: partial
+        turn fields as they stream in, then each finished turn.
+        """
+        return aiter_events(lambda: self.aconduct_scene_conversation(*args, **kwargs))
+
+    @staticmethod
+    def _as_character(character_data) -> Character:
+        # If it's already a Character instance, use it directly
+        if isinstance(character_data, Character):
+            return character_data
+        return Character(**character_data)
+
     def reset_conversation_history(self):
         """Reset the conversation history."""
         self.conversation_history = []
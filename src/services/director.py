@@ -0,0 +1,230 @@
+import logging
+import re
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+from models.story import ConversationTurn, Scene
+
+logger = logging.getLogger("director")
+
+_WORD = re.compile(r"[a-z']+")
+_STOPWORDS = {
+    "the", "a", "an", "and", "or", "but", "of", "to", "in", "on", "at", "for", "with",
+    "is", "are", "was", "were", "be", "it", "its", "this", "that", "as", "by", "from",
+    "they", "their", "them", "he", "she", "his", "her", "you", "your", "i", "we", "our",
+    "my", "me", "not", "no", "so", "if", "then", "than", "there", "each", "either",
+}
+
+
+def content_words(text: Optional[str]) -> Set[str]:
+    if not text:
+        return set()
+    return {w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS and len(w) > 2}
+
+
+def _overlap(words: Set[str], reference: Set[str]) -> float:
+    if not words or not reference:
+        return 0.0
+    return len(words & reference) / len(reference)
+
+
+def _length_fit(text: str, low: int, high: int) -> float:
+    """1.0 inside [low, high] words, falling off linearly outside it."""
+    count = len(text.split())
+    if low <= count <= high:
+        return 1.0
+    if count < low:
+        return count / low
+    return max(0.0, 1.0 - (count - high) / high)
+
+
+def scene_words(scene: Optional[Scene]) -> Set[str]:
+    if scene is None:
+        return set()
+    words = content_words(scene.context) | content_words(scene.conflict) | content_words(scene.atmosphere)
+    for outcome in scene.possible_outcomes or []:
+        words |= content_words(outcome)
+    return words
+
+
+class Director:
+    """
+    Cheap local scorer for generated narration and turns.
+
+    Scores are in [0, 1]: relevance to the scene, a length that matches the prompt's
+    instructions and, for turns, novelty relative to what was already said. Empty
+    generations score -1 so any real candidate beats them.
+    """
+
+    def score_narration(self, narration: str, scene: Optional[Scene]) -> float:
+        if not isinstance(narration, str) or not narration.strip():
+            return -1.0
+        relevance = min(1.0, 3 * _overlap(content_words(narration), scene_words(scene)))
+        # The narrator is asked for 3-4 sentences
+        return round(0.6 * relevance + 0.4 * _length_fit(narration, 40, 120), 4)
+
+    def score_turn(
+        self,
+        turn: ConversationTurn,
+        name: str,
+        narration: str,
+        scene: Optional[Scene],
+        history: Sequence[ConversationTurn],
+    ) -> float:
+        if not isinstance(turn, ConversationTurn):
+            return -1.0
+        words = content_words(turn.dialogue)
+        relevance = min(1.0, 4 * _overlap(words, scene_words(scene) | content_words(narration)))
+
+        recent: Set[str] = set()
+        for previous in history[-4:]:
+            recent |= content_words(previous.dialogue)
+        novelty = 1.0 - (len(words & recent) / len(words) if words else 1.0)
+
+        speaker = turn.character.strip().lower()
+        in_character = 1.0 if speaker and (speaker in name.lower() or name.lower() in speaker) else 0.5
+        # Characters are asked for about two sentences
+        length = _length_fit(turn.dialogue, 8, 50)
+        return round((0.35 * relevance + 0.35 * novelty + 0.3 * length) * in_character, 4)
+
+
+class BranchSelector:
+    """
+    Picks the best of `branching_factor` candidates per narration or turn and keeps
+    per-scene bookkeeping: chosen scores (for `directors_rewarks`) and, optionally,
+    the rejected alternatives.
+    """
+
+    def __init__(self, branching_factor: int, director: Director = None, keep_alternatives: bool = False):
+        self.n = max(1, branching_factor)
+        self.director = director or Director()
+        self.keep_alternatives = keep_alternatives
+        self.chosen_scores: List[float] = []
+        self.alternatives: Dict[str, Any] = {"narration": [], "turns": []}
+
+    def pick_narration(self, candidates: List[str], scene: Optional[Scene]) -> str:
+        scores = [self.director.score_narration(c, scene) for c in candidates]
+        best = max(range(len(candidates)), key=lambda i: scores[i])
+        if self.keep_alternatives:
+            self.alternatives["narration"] = [
+                {"narration": c, "score": s}
+                for i, (c, s) in enumerate(zip(candidates, scores))
+                if i != best
+            ]
+        return candidates[best]
+
+    def pick_turn(
+        self,
+        candidates: List[ConversationTurn],
+        name: str,
+        narration: str,
+        scene: Optional[Scene],
+        history: Sequence[ConversationTurn],
+    ) -> ConversationTurn:
+        scores = [self.director.score_turn(c, name, narration, scene, history) for c in candidates]
+        best = max(range(len(candidates)), key=lambda i: scores[i])
+        if scores[best] >= 0:
+            self.chosen_scores.append(scores[best])
+        if self.keep_alternatives:
+            self.alternatives["turns"].append(
+                {
+                    "character": name,
+                    "alternatives": [
+                        {**c.model_dump(), "score": s}
+                        for i, (c, s) in enumerate(zip(candidates, scores))
+                        if i != best and isinstance(c, ConversationTurn)
+                    ],
+                }
+            )
+        return candidates[best]
+
+    def directors_rewarks(self) -> int:
+        """0-10 rating of the scene from the chosen turns' scores, -1 if nothing was scored."""
+        if not self.chosen_scores:
+            return -1
+        return round(10 * sum(self.chosen_scores) / len(self.chosen_scores))
+
+
+class RoundController:
+    """
+    Early stopping for a scene's conversation.
+
+    After each round the dialogue so far is scored for progress: how much of the scene's
+    conflict and of its best-matching possible outcome it has addressed, in [0, 1]. The
+    scene ends once progress reaches `threshold`, or when the dialogue stalls: STALL_ROUNDS
+    rounds in a row that add less than STALL_NOVELTY new words and, if the scene has a
+    conflict or outcomes to measure progress against, do not move progress either.
+    """
+
+    STALL_NOVELTY = 0.25
+    STALL_ROUNDS = 2
+
+    def __init__(
+        self,
+        scene: Optional[Scene],
+        planned_rounds: int,
+        calls_per_round: int,
+        threshold: float = 0.6,
+        min_rounds: int = 1,
+    ):
+        self.planned_rounds = planned_rounds
+        self.calls_per_round = calls_per_round
+        self.threshold = threshold
+        self.min_rounds = max(1, min_rounds)
+        self.conflict = content_words(scene.conflict) if scene is not None else set()
+        outcomes = scene.possible_outcomes if scene is not None else None
+        self.outcomes = [words for words in map(content_words, outcomes or []) if words]
+        self.said: Set[str] = set()
+        self.rounds = 0
+        self.scores: List[float] = []
+        self.stop_reason: Optional[str] = None
+        self._stalled = 0
+
+    def progress(self) -> float:
+        parts = []
+        if self.conflict:
+            parts.append(_overlap(self.said, self.conflict))
+        if self.outcomes:
+            parts.append(max(_overlap(self.said, outcome) for outcome in self.outcomes))
+        return round(sum(parts) / len(parts), 4) if parts else 0.0
+
+    def observe_round(self, turns: Sequence[ConversationTurn]) -> bool:
+        """Score a finished round; True when the conversation should end here."""
+        words: Set[str] = set()
+        for turn in turns:
+            if isinstance(turn, ConversationTurn):
+                words |= content_words(turn.dialogue)
+        novelty = len(words - self.said) / len(words) if words else 0.0
+        self.said |= words
+        self.rounds += 1
+        previous = self.scores[-1] if self.scores else 0.0
+        self.scores.append(self.progress())
+        stalled = novelty < self.STALL_NOVELTY
+        if self.conflict or self.outcomes:
+            # Without goal words progress is always 0, so a plateau says nothing
+            stalled = stalled and self.scores[-1] <= previous
+        self._stalled = self._stalled + 1 if stalled else 0
+
+        if self.rounds < self.min_rounds or self.rounds >= self.planned_rounds:
+            return False
+        if self.scores[-1] >= self.threshold:
+            self.stop_reason = "resolved"
+        elif self._stalled >= self.STALL_ROUNDS:
+            self.stop_reason = "stalled"
+        return self.stop_reason is not None
+
+    @property
+    def calls_saved(self) -> int:
+        return (self.planned_rounds - self.rounds) * self.calls_per_round
+
+    def directors_rewarks(self) -> int:
+        """0-10 rating of how far the conversation got toward the scene's goals."""
+        return round(10 * self.scores[-1]) if self.scores else -1
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "rounds_planned": self.planned_rounds,
+            "rounds_run": self.rounds,
+            "stopped": self.stop_reason,
+            "progress": self.scores,
+            "calls_saved": self.calls_saved,
+        }
@@ -1,22 +1,42 @@
+import asyncio
+import json
 import logging
 import os
-from typing import Dict, List
-from models.story import ConversationTurn
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from models.story import ConversationTurn, RoundTurns
 from pydantic import BaseModel
-import litellm
-from litellm import completion
-from dotenv import load_dotenv
-import instructor
+from services.cache import ResponseCache
+from services.backends import BackendResult, LLMBackend, RateLimitedError, create_backend
+from services.metrics import CallProbe, CallRecord, MetricsRegistry, current_tags, mark_sent, probe_call
+from services.tracing import record_span, span
+from services.streaming import emit, stream_kind
+from services.rate_limit import RateGovernor
+from services.resilience import CircuitBreaker, CircuitOpenError, Hedger
+from services.tokens import estimate_message_tokens
 
-# Load environment variables from .env file
-load_dotenv()
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("llm_client")
-litellm.enable_json_schema_validation=True
 
 
+class LLMCallError(Exception):
+    """An LLM call failed on every endpoint it could go to; the last error is its __cause__."""
+
+
+# Sampling seed of the story being processed; overrides LLMConfig.seed (see seeded())
+_call_seed: ContextVar[Optional[int]] = ContextVar("llm_call_seed", default=None)
+
+
+@contextmanager
+def seeded(seed: Optional[int]):
+    """Send every LLM call made inside the block (and tasks started from it) with `seed`."""
+    token = _call_seed.set(seed)
+    try:
+        yield
+    finally:
+        _call_seed.reset(token)
+
 
 class LLMConfig(BaseModel):
     model: str
@@ -24,61 +44,518 @@ class LLMConfig(BaseModel):
     max_tokens: int
     api_key: str
     base_url: str
+    max_concurrency: int = 16  # in-flight requests allowed by the async client
+    request_timeout: float = 600.0
+    cache_path: Optional[str] = None  # SQLite response cache; None disables caching
+    cache_bypass: bool = False  # skip cache lookups (fresh sampling) but still store results
+    backend: str = "litellm"  # "litellm", "fake", "record:<cassette>" or "replay:<cassette>"
+    fake_latency: float = 0.0  # simulated seconds per call for the fake/replay backends
+    fake_jitter: float = 0.0
+    rpm_limit: Optional[int] = None  # account requests per minute; paced client-side when set
+    tpm_limit: Optional[int] = None  # account (prompt) tokens per minute
+    latency_target: Optional[float] = None  # seconds; concurrency backs off while calls are slower
+    rate_limit_retries: int = 6  # retries of a request the provider rejected with 429
+    fake_rpm_limit: Optional[int] = None  # simulated provider limits for the fake backend
+    fake_tpm_limit: Optional[int] = None
+    fallback_model: Optional[str] = None  # takes calls the primary model fails or its open circuit rejects
+    hedge_percentile: Optional[float] = None  # e.g. 0.95: duplicate calls slower than this; None disables
+    hedge_budget: float = 0.1  # at most this many hedges per call
+    breaker_failures: int = 5  # consecutive failures that open a model's circuit
+    breaker_cooldown: float = 30.0  # seconds an open circuit fails fast before a trial call
+    seed: Optional[int] = None  # sampling seed sent with every request; None leaves sampling to the provider
 
 
 def get_llm_config() -> LLMConfig:
+    """Provider settings from the environment, after loading any .env file."""
+    from dotenv import load_dotenv
+
+    load_dotenv()
     return LLMConfig(
         model="gpt-5-nano",
         temperature=1,
         max_tokens=10024,
         api_key=os.environ.get("OPENAI_API_KEY", ""),
         base_url=os.environ.get("OPENAI_BASE_URL", ""),
+        max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", "16")),
+        request_timeout=float(os.environ.get("LLM_REQUEST_TIMEOUT", "600")),
+        cache_path=os.environ.get("LLM_CACHE_PATH", ".llm_cache.sqlite") or None,
+        cache_bypass=os.environ.get("LLM_CACHE_BYPASS", "") not in ("", "0", "false"),
+        backend=os.environ.get("LLM_BACKEND", "litellm"),
+        fake_latency=float(os.environ.get("LLM_FAKE_LATENCY", "0")),
+        fake_jitter=float(os.environ.get("LLM_FAKE_JITTER", "0")),
+        rpm_limit=_optional(os.environ.get("LLM_RPM_LIMIT"), int),
+        tpm_limit=_optional(os.environ.get("LLM_TPM_LIMIT"), int),
+        latency_target=_optional(os.environ.get("LLM_LATENCY_TARGET"), float),
+        rate_limit_retries=int(os.environ.get("LLM_RATE_LIMIT_RETRIES", "6")),
+        fake_rpm_limit=_optional(os.environ.get("LLM_FAKE_RPM_LIMIT"), int),
+        fake_tpm_limit=_optional(os.environ.get("LLM_FAKE_TPM_LIMIT"), int),
+        fallback_model=os.environ.get("LLM_FALLBACK_MODEL") or None,
+        hedge_percentile=_optional(os.environ.get("LLM_HEDGE_PERCENTILE"), float),
+        hedge_budget=float(os.environ.get("LLM_HEDGE_BUDGET", "0.1")),
+        breaker_failures=int(os.environ.get("LLM_BREAKER_FAILURES", "5")),
+        breaker_cooldown=float(os.environ.get("LLM_BREAKER_COOLDOWN", "30")),
+        seed=_optional(os.environ.get("LLM_SEED"), int),
     )
 
 
+def _optional(value: Optional[str], kind):
+    return kind(value) if value else None
+
+
 class LLMClient:
-    def __init__(self, config: LLMConfig = None):
+    def __init__(
+        self,
+        config: LLMConfig = None,
+        backend: LLMBackend = None,
+        metrics: MetricsRegistry = None,
+        governor: RateGovernor = None,
+    ):
         self.config = config or get_llm_config()
-        # Configure litellm with custom base URL
-        litellm.api_base = self.config.base_url
-        litellm.api_key = self.config.api_key
-        self.client = instructor.from_litellm(completion)
-        print(self.config.base_url)
+        self.backend = backend or create_backend(self.config)
+        self.metrics = metrics or MetricsRegistry()
+        # Pass one governor to several clients to make them share the account's limits
+        self.governor = governor or RateGovernor.from_config(self.config)
+        self.breaker = CircuitBreaker.from_config(self.config)
+        self.hedger = Hedger.from_config(self.config)
+        self._fallback_config: Optional[LLMConfig] = None
+        self.fallbacks = 0  # calls answered by the fallback model
+        # Async state is bound to the event loop it was created on
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.call_count = 0  # provider requests issued by this client
+        self.cache = None
+        if self.config.cache_path and self.backend.cacheable:
+            self.cache = ResponseCache(self.config.cache_path)
+
+    def _cache_key(self, messages: List[Dict[str, str]], response_model=None, n: int = 1) -> Optional[str]:
+        if self.cache is None:
+            return None
+        schema = response_model.model_json_schema() if response_model else None
+        return ResponseCache.make_key(
+            self.config.model,
+            self.config.temperature,
+            self.config.max_tokens,
+            messages,
+            schema,
+            n,
+            self._seed(),
+        )
+
+    def _seed(self) -> Optional[int]:
+        seed = _call_seed.get()
+        return self.config.seed if seed is None else seed
+
+    def _seeded(self, config: LLMConfig) -> LLMConfig:
+        """`config` with the seed of the story being processed, if it has its own."""
+        seed = self._seed()
+        return config if seed == config.seed else config.model_copy(update={"seed": seed})
+
+    def _cache_get(self, key: Optional[str], kind: str) -> Optional[str]:
+        if key is None or self.config.cache_bypass:
+            return None
+        started = time.perf_counter()
+        value = self.cache.get(key)
+        if value is not None:
+            self.metrics.record(
+                CallRecord(kind, self.config.model, time.perf_counter() - started, cache_hit=True, tags=current_tags())
+            )
+        return value
+
+    def _observe(self, kind: str, probe: CallProbe, result: Optional[BackendResult] = None):
+        """Record one provider request; a missing result means it failed."""
+        starts = probe.attempt_starts
+        if len(starts) > 1:
+            # Show instructor's re-asks as child spans of the call
+            ends = starts[1:] + [time.perf_counter()]
+            for i, (start, end) in enumerate(zip(starts, ends)):
+                record_span("validation retry" if i else "attempt", start, end, attempt=i + 1)
+        self.metrics.record(
+            CallRecord(
+                kind,
+                result.model if result is not None and result.model else self.config.model,
+                time.perf_counter() - probe.started,
+                ttfb=probe.ttfb,
+                prompt_tokens=result.prompt_tokens if result else 0,
+                completion_tokens=result.completion_tokens if result else 0,
+                retries=probe.retries,
+                cost=result.cost if result else 0.0,
+                error=result is None,
+                tags=current_tags(),
+            )
+        )
+
+    def _cache_put(self, key: Optional[str], value: str):
+        if key is not None:
+            self.cache.put(key, value)
+
+    def _async_limiter(self) -> asyncio.Semaphore:
+        """Return the concurrency limiter, binding the backend's pooled session to the running loop."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.config.max_concurrency)
+            self.backend.bind_loop(self.config)
+        return self._semaphore
+
+    async def aclose(self):
+        """Close the pooled HTTP session used by the async methods."""
+        await self.backend.aclose()
+        self._loop = None
+        self._semaphore = None
+
+    def _governed(self, request: Callable[[], BackendResult], messages: List[Dict[str, str]]) -> BackendResult:
+        """Send one request through the rate governor, retrying 429s after the pause it sets."""
+        tokens = estimate_message_tokens(messages)
+        for attempt in range(self.config.rate_limit_retries + 1):
+            self.governor.acquire_sync(tokens)
+            mark_sent()
+            started = time.perf_counter()
+            try:
+                result = request()
+            except RateLimitedError as e:
+                self.governor.throttled(e.retry_after)
+                if attempt == self.config.rate_limit_retries:
+                    raise
+                continue
+            finally:
+                self.governor.release_sync()
+            self.governor.completed(time.perf_counter() - started)
+            return result
+
+    async def _agoverned(
+        self,
+        request: Callable[[], Awaitable[BackendResult]],
+        messages: List[Dict[str, str]],
+        on_sent: Optional[Callable[[], None]] = None,
+    ) -> BackendResult:
+        """
+        Async variant of _governed; also bound by the governor's adaptive concurrency.
+        `on_sent` is called each time the governor lets the request out.
+        """
+        tokens = estimate_message_tokens(messages)
+        for attempt in range(self.config.rate_limit_retries + 1):
+            await self.governor.acquire(tokens)
+            mark_sent()
+            if on_sent is not None:
+                on_sent()
+            started = time.perf_counter()
+            try:
+                result = await request()
+            except RateLimitedError as e:
+                self.governor.throttled(e.retry_after)
+                if attempt == self.config.rate_limit_retries:
+                    raise
+                continue
+            finally:
+                await self.governor.release()
+            self.governor.completed(time.perf_counter() - started)
+            return result
+
+    def _endpoints(self) -> List[LLMConfig]:
+        """The primary model's settings, then the fallback model's if one is configured."""
+        if not self.config.fallback_model or self.config.fallback_model == self.config.model:
+            return [self.config]
+        if self._fallback_config is None or self._fallback_config.model != self.config.fallback_model:
+            self._fallback_config = self.config.model_copy(update={"model": self.config.fallback_model})
+        return [self.config, self._fallback_config]
+
+    def _send(self, make_request: Callable[[LLMConfig], BackendResult], messages: List[Dict[str, str]]) -> BackendResult:
+        """
+        Send one request to the primary model, or to the fallback model when the primary
+        fails or its circuit is open. Raises LLMCallError when no endpoint answered.
+        """
+        error: Optional[Exception] = None
+        for config in self._endpoints():
+            if not self.breaker.allow(config.model):
+                error = error or CircuitOpenError(f"Circuit for {config.model} is open")
+                continue
+            self.call_count += 1
+            settled = False
+            try:
+                result = self._governed(lambda: make_request(self._seeded(config)), messages)
+            except Exception as e:
+                # Rate limits are the governor's to handle; they say nothing about the endpoint's health
+                if not isinstance(e, RateLimitedError):
+                    self.breaker.failure(config.model)
+                    settled = True
+                logger.error(f"Error calling LLM ({config.model}): {e}")
+                error = e
+                continue
+            else:
+                settled = True
+                return self._served(result, config)
+            finally:
+                if not settled:
+                    self.breaker.abandon(config.model)
+        raise LLMCallError(f"LLM call failed: {error}") from error
+
+    async def _asend(
+        self,
+        make_request: Callable[[LLMConfig], Awaitable[BackendResult]],
+        messages: List[Dict[str, str]],
+        label: str,
+        hedge: bool = True,
+    ) -> BackendResult:
+        """
+        Async variant of _send. With hedging configured (and `hedge`), a request still
+        running past the learned latency percentile for its model and `label` is sent
+        once more and the first answer wins.
+        """
+        error: Optional[Exception] = None
+        for config in self._endpoints():
+            if not self.breaker.allow(config.model):
+                error = error or CircuitOpenError(f"Circuit for {config.model} is open")
+                continue
+
+            async def attempt(on_sent=None, config: LLMConfig = config) -> BackendResult:
+                self.call_count += 1
+                return await self._agoverned(lambda: make_request(self._seeded(config)), messages, on_sent)
+
+            settled = False
+            try:
+                if hedge and self.hedger is not None:
+                    result = await self.hedger.arun((config.model, label), attempt)
+                else:
+                    result = await attempt()
+            except Exception as e:
+                # Rate limits are the governor's to handle; they say nothing about the endpoint's health
+                if not isinstance(e, RateLimitedError):
+                    self.breaker.failure(config.model)
+                    settled = True
+                logger.error(f"Error calling LLM ({config.model}): {e}")
+                error = e
+                continue
+            else:
+                settled = True
+                return self._served(result, config)
+            finally:
+                # Rate limited or cancelled: no verdict, so a half-open circuit goes back to open
+                if not settled:
+                    self.breaker.abandon(config.model)
+        raise LLMCallError(f"LLM call failed: {error}") from error
+
+    def _served(self, result: BackendResult, config: LLMConfig) -> BackendResult:
+        self.breaker.success(config.model)
+        if config is not self.config:
+            self.fallbacks += 1
+            logger.debug(f"Served by fallback model {config.model}")
+        result.model = config.model
+        return result
+
+    def _cache_result(self, key: Optional[str], result: BackendResult, value: str):
+        # Cache keys name the primary model; a fallback's answer is not stored under them
+        if result.model == self.config.model:
+            self._cache_put(key, value)
+
+    def resilience_stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {"fallbacks": self.fallbacks, **self.breaker.stats()}
+        if self.hedger is not None:
+            stats.update(self.hedger.stats())
+        return stats
 
     def call_llm(self, prompt: str) -> str:
-        """Call the LLM with the given prompt and return the response."""
+        """Call the LLM with the given prompt and return the response; raises LLMCallError on failure."""
+        messages = [{"role": "user", "content": prompt}]
+        key = self._cache_key(messages)
+        cached = self._cache_get(key, "completion")
+        if cached is not None:
+            return cached
+
+        with probe_call() as probe, span("llm completion", model=self.config.model):
+            try:
+                result = self._send(lambda config: self.backend.complete(messages, config), messages)
+            except LLMCallError:
+                self._observe("completion", probe)
+                raise
+            self._observe("completion", probe, result)
+        content = result.value[0]
+        self._cache_result(key, result, content)
+        return content
+
+    async def acall_llm(self, prompt: str) -> str:
+        """
+        Async variant of call_llm, bounded by the client's concurrency limit.
+
+        Inside a streamed() block with an event listener, the response is streamed
+        and its text deltas emitted as it arrives (a cached response as one delta).
+        """
+        messages = [{"role": "user", "content": prompt}]
+        key = self._cache_key(messages)
+        cached = self._cache_get(key, "completion")
+        if cached is not None:
+            kind = stream_kind()
+            if kind:
+                emit(f"{kind}_delta", text=cached)
+            return cached
+
+        result = await self._atext_request(messages, stream=True)
+        self._cache_result(key, result, result.value[0])
+        return result.value[0]
+
+    async def acall_llm_candidates(self, prompt: str, n: int) -> List[str]:
+        """
+        Sample `n` alternative responses to one prompt.
+
+        Uses a single request with the `n` parameter; providers that reject it, or
+        return fewer choices, are topped up with concurrent single requests. Raises
+        LLMCallError only if no candidate could be generated.
+        """
+        if n <= 1:
+            return [await self.acall_llm(prompt)]
+
+        messages = [{"role": "user", "content": prompt}]
+        key = self._cache_key(messages, n=n)
+        cached = self._cache_get(key, "completion")
+        if cached is not None:
+            return json.loads(cached)
+
         try:
-            response = litellm.completion(
-                model=self.config.model,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=self.config.max_tokens,
-                temperature=self.config.temperature,
+            results = [await self._atext_request(messages, n=n)]
+            contents = list(results[0].value)
+        except LLMCallError as e:
+            logger.warning(f"Batched sampling with n={n} failed, using single requests: {e}")
+            results, contents = [], []
+        missing = n - len(contents)
+        if missing > 0:
+            extra = await asyncio.gather(
+                *(self._atext_request(messages) for _ in range(missing)), return_exceptions=True
             )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            logger.error(f"Error calling LLM: {e}")
-            return "Error generating response."
+            extra = [r for r in extra if isinstance(r, BackendResult)]
+            if not contents and not extra:
+                raise LLMCallError(f"All {n} candidate requests failed")
+            results += extra
+            contents += [r.value[0] for r in extra]
+        if all(r.model == self.config.model for r in results):
+            self._cache_put(key, json.dumps(contents))
+        return contents
+
+    async def _atext_request(
+        self, messages: List[Dict[str, str]], n: int = 1, stream: bool = False
+    ) -> BackendResult:
+        """
+        One uncached completion request; its value is the choices' text. Raises LLMCallError.
+        With `stream`, a single-choice request streams when someone is listening.
+        """
+        kind = stream_kind() if stream and n == 1 else None
+        async with self._async_limiter():
+            with probe_call() as probe, span("llm completion", model=self.config.model, n=n):
+                if kind:
+                    make_request = lambda config: self._astream(
+                        self.backend.astream_complete(messages, config), f"{kind}_delta", "text"
+                    )
+                else:
+                    make_request = lambda config: self.backend.acomplete(messages, config, n)
+                try:
+                    # A duplicate of a streamed request would emit every delta twice
+                    result = await self._asend(make_request, messages, f"completion/{n}", hedge=not kind)
+                except LLMCallError:
+                    self._observe("completion", probe)
+                    raise
+                self._observe("completion", probe, result)
+                return result
 
     def execute_character_dialogue(self, messages: List[Dict[str, str]]) -> ConversationTurn:
-        """Generate a character's dialogue based on their name and input dialogue."""
-        try:
-            # response = litellm.completion(
-            #     model=self.config.model,
-            #     messages=messages,
-            #     # messages_format="pydantic",
-            #     max_tokens=self.config.max_tokens,
-            #     temperature=self.config.temperature,
-            #     response_format=ConversationTurn,
-            # )
-            return self.client.chat.completions.create(
-                model=self.config.model,
-                max_tokens=self.config.max_tokens,
-                temperature=self.config.temperature,
-                response_model=ConversationTurn,
-                messages=messages,
-                max_retries=3,
-            )
-            # return response
-        except Exception as e:
-            logger.error(f"Error calling LLM: {e}")
-            return "Error generating response."
+        """Generate a character's turn for the prompt; raises LLMCallError on failure."""
+        key = self._cache_key(messages, ConversationTurn)
+        cached = self._cache_get(key, "structured")
+        if cached is not None:
+            return ConversationTurn.model_validate_json(cached)
+
+        with probe_call() as probe, span("llm structured", model=self.config.model):
+            try:
+                result = self._send(
+                    lambda config: self.backend.structured(messages, config, ConversationTurn), messages
+                )
+            except LLMCallError:
+                self._observe("structured", probe)
+                raise
+            self._observe("structured", probe, result)
+        turn = result.value
+        self._cache_result(key, result, turn.model_dump_json())
+        return turn
+
+    async def aexecute_character_dialogue(self, messages: List[Dict[str, str]]) -> ConversationTurn:
+        """Async variant of execute_character_dialogue, bounded by the client's concurrency limit."""
+        key = self._cache_key(messages, ConversationTurn)
+        cached = self._cache_get(key, "structured")
+        if cached is not None:
+            return ConversationTurn.model_validate_json(cached)
+
+        result = await self._adialogue_request(messages, stream=True)
+        self._cache_result(key, result, result.value.model_dump_json())
+        return result.value
+
+    async def aexecute_character_dialogue_candidates(
+        self, messages: List[Dict[str, str]], n: int
+    ) -> List[ConversationTurn]:
+        """
+        Sample `n` alternative turns for one prompt.
+
+        Structured output cannot be combined with the `n` parameter, so the
+        candidates are requested concurrently. Raises LLMCallError only if all fail.
+        """
+        if n <= 1:
+            return [await self.aexecute_character_dialogue(messages)]
+
+        key = self._cache_key(messages, ConversationTurn, n=n)
+        cached = self._cache_get(key, "structured")
+        if cached is not None:
+            return [ConversationTurn.model_validate(t) for t in json.loads(cached)]
+
+        results = await asyncio.gather(
+            *(self._adialogue_request(messages) for _ in range(n)), return_exceptions=True
+        )
+        results = [r for r in results if isinstance(r, BackendResult)]
+        if not results:
+            raise LLMCallError(f"All {n} candidate requests failed")
+        turns = [r.value for r in results]
+        if len(turns) == n and all(r.model == self.config.model for r in results):
+            self._cache_put(key, json.dumps([t.model_dump() for t in turns]))
+        return turns
+
+    async def aexecute_round_dialogue(self, messages: List[Dict[str, str]]) -> RoundTurns:
+        """One structured call for a whole round of turns (see ConversationBuffer.round_prompt)."""
+        key = self._cache_key(messages, RoundTurns)
+        cached = self._cache_get(key, "structured")
+        if cached is not None:
+            return RoundTurns.model_validate_json(cached)
+
+        result = await self._adialogue_request(messages, response_model=RoundTurns)
+        self._cache_result(key, result, result.value.model_dump_json())
+        return result.value
+
+    async def _adialogue_request(
+        self, messages: List[Dict[str, str]], stream: bool = False, response_model=ConversationTurn
+    ) -> BackendResult:
+        """
+        One uncached structured request for a ConversationTurn (or `response_model`); raises
+        LLMCallError. With `stream`, the partial fields are emitted as they arrive when
+        someone is listening.
+        """
+        kind = stream_kind() if stream else None
+        async with self._async_limiter():
+            with probe_call() as probe, span("llm structured", model=self.config.model):
+                if kind:
+                    make_request = lambda config: self._astream(
+                        self.backend.astream_structured(messages, config, response_model),
+                        f"{kind}_partial",
+                        "fields",
+                    )
+                else:
+                    make_request = lambda config: self.backend.astructured(messages, config, response_model)
+                try:
+                    result = await self._asend(make_request, messages, response_model.__name__, hedge=not kind)
+                except LLMCallError:
+                    self._observe("structured", probe)
+                    raise
+                self._observe("structured", probe, result)
+                return result
+
+    @staticmethod
+    async def _astream(chunks, event: str, field: str) -> BackendResult:
+        """Emit every chunk of a backend stream as `event` and return its final result."""
+        async for chunk in chunks:
+            if isinstance(chunk, BackendResult):
+                return chunk
+            emit(event, **{field: chunk})
+        raise RuntimeError("Backend stream ended without a result")
@@ -0,0 +1,99 @@
+import logging
+from typing import Any, Dict, List
+
+from models.story import ConversationTurn
+from prompts.characters import CharacterDialogueManager
+from prompts.templates import MEMORY_FOLD_TEMPLATE
+from services.llm_client import LLMCallError
+from services.tokens import estimate_tokens
+from services.tracing import span
+
+logger = logging.getLogger("memory")
+
+
+class ConversationMemory:
+    """
+    Bounded conversation memory for character prompts.
+
+    The last `window` turns are sent verbatim; older turns are folded into a rolling
+    summary. Folding happens in batches of `fold_batch` turns so the summary costs one
+    extra call per batch rather than one per turn, which means between `window` and
+    `window + fold_batch - 1` turns are verbatim at any time.
+    """
+
+    def __init__(self, llm_client, window: int = 6, fold_batch: int = None):
+        self.llm_client = llm_client
+        self.window = max(1, window)
+        self.fold_batch = max(1, fold_batch or self.window)
+        self.summary = ""
+        self.folded = 0  # turns already folded into the summary
+        self.dialogueManager = CharacterDialogueManager()
+
+        self.summary_calls = 0
+        self.summary_prompt_tokens = 0
+        self.full_history_tokens = 0
+        self.sent_history_tokens = 0
+        # Running token totals of the history seen so far: _cumulative[i] covers its first i turns
+        self._counted: List[ConversationTurn] = []
+        self._cumulative: List[int] = [0]
+
+    async def aupdate(self, history: List[ConversationTurn]):
+        """Fold turns that have left the window into the summary."""
+        overflow = len(history) - self.folded - self.window
+        if overflow < self.fold_batch:
+            return
+
+        evicted = history[self.folded : self.folded + overflow]
+        prompt = self.build_summary_prompt(evicted)
+        self.summary_calls += 1
+        self.summary_prompt_tokens += estimate_tokens(prompt)
+        with span("memory fold", turns=len(evicted)):
+            try:
+                summary = await self.llm_client.acall_llm(prompt)
+            except LLMCallError as e:
+                # Keep the turns verbatim and try again on the next update
+                logger.warning(f"Memory fold failed, keeping {len(evicted)} turns verbatim: {e}")
+                return
+        self.summary = summary
+        self.folded += len(evicted)
+        logger.info(f"Folded {len(evicted)} turns into the conversation summary")
+
+    def build_summary_prompt(self, turns: List[ConversationTurn]) -> str:
+        new_turns = "\n".join(self.dialogueManager.to_rich_format(t) for t in turns)
+        return MEMORY_FOLD_TEMPLATE.format(
+            summary=self.summary or "Nothing yet", new_turns=new_turns
+        )
+
+    def visible_turns(self, history: List[ConversationTurn]) -> List[ConversationTurn]:
+        """The turns still sent verbatim, recording the tokens this saves."""
+        self._count(history)
+        total = self._cumulative[len(history)]
+        self.full_history_tokens += total
+        self.sent_history_tokens += estimate_tokens(self.summary) + total - self._cumulative[min(self.folded, len(history))]
+        return history[self.folded :]
+
+    def _count(self, history: List[ConversationTurn]):
+        """Extend the running token totals to `history`, rendering only turns not seen before."""
+        known = len(self._counted)
+        if len(history) < known or (known and history[known - 1] is not self._counted[-1]):
+            # Not an extension of what we have counted; start over
+            self._counted = []
+            self._cumulative = [0]
+            known = 0
+        for turn in history[known:]:
+            self._counted.append(turn)
+            self._cumulative.append(self._cumulative[-1] + estimate_tokens(self.dialogueManager.to_rich_format(turn)))
+
+    def report(self) -> Dict[str, Any]:
+        """Token accounting for the scene, including what the summaries cost."""
+        return {
+            "window": self.window,
+            "turns_folded": self.folded,
+            "summary_calls": self.summary_calls,
+            "history_tokens_full": self.full_history_tokens,
+            "history_tokens_sent": self.sent_history_tokens,
+            "summary_prompt_tokens": self.summary_prompt_tokens,
+            "tokens_saved": self.full_history_tokens
+            - self.sent_history_tokens
+            - self.summary_prompt_tokens,
+        }
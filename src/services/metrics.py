@@ -0,0 +1,314 @@
+"""
+Per-call LLM metrics.
+
+LLMClient records one CallRecord per provider request or cache hit: wall latency, time
+to first byte, token usage, retries, cost and the story/scene/round/character tags in
+effect when the call was made. MetricsRegistry keeps running aggregates (no per-call
+history, and long-lived processes drop a finished story's groups with forget_story) and
+exports them as Prometheus text, over HTTP or to a file, and as a JSON run summary.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("metrics")
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Tags that break down the JSON summary; Prometheus series are labelled by kind and model only
+SUMMARY_TAGS = ("story", "scene", "character")
+
+_call_tags: ContextVar[Dict[str, Any]] = ContextVar("llm_call_tags", default={})
+_call_probe: ContextVar[Optional["CallProbe"]] = ContextVar("llm_call_probe", default=None)
+
+
+@contextmanager
+def call_tags(**tags):
+    """Tag every LLM call made inside the block (and tasks started from it)."""
+    merged = dict(_call_tags.get())
+    merged.update({k: v for k, v in tags.items() if v is not None})
+    token = _call_tags.set(merged)
+    try:
+        yield
+    finally:
+        _call_tags.reset(token)
+
+
+def current_tags() -> Dict[str, Any]:
+    return _call_tags.get()
+
+
+class CallProbe:
+    """Scratch space for one in-flight call, filled in by backend transport and retry hooks."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sent = False
+        self.first_byte: Optional[float] = None
+        self.attempt_starts: List[float] = []
+
+    @property
+    def ttfb(self) -> Optional[float]:
+        return None if self.first_byte is None else self.first_byte - self.started
+
+    @property
+    def retries(self) -> int:
+        return max(0, len(self.attempt_starts) - 1)
+
+
+@contextmanager
+def probe_call():
+    probe = CallProbe()
+    token = _call_probe.set(probe)
+    try:
+        yield probe
+    finally:
+        _call_probe.reset(token)
+
+
+def mark_first_byte():
+    """Called by backends when the first response bytes of the current call arrive."""
+    probe = _call_probe.get()
+    if probe is not None and probe.first_byte is None:
+        probe.first_byte = time.perf_counter()
+
+
+def mark_sent():
+    """Called when the current call first leaves the client, so queueing is not counted as latency."""
+    probe = _call_probe.get()
+    if probe is not None and not probe.sent:
+        probe.sent = True
+        probe.started = time.perf_counter()
+
+
+def mark_attempt():
+    """Called by backends for every attempt of the current call, including retries."""
+    probe = _call_probe.get()
+    if probe is not None:
+        probe.attempt_starts.append(time.perf_counter())
+
+
+class CallRecord:
+    """Measurements for one LLM call."""
+
+    def __init__(
+        self,
+        kind: str,
+        model: str,
+        latency: float,
+        ttfb: Optional[float] = None,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        retries: int = 0,
+        cost: float = 0.0,
+        cache_hit: bool = False,
+        error: bool = False,
+        tags: Optional[Dict[str, Any]] = None,
+    ):
+        self.kind = kind  # "completion" or "structured"
+        self.model = model
+        self.latency = latency
+        self.ttfb = ttfb
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.retries = retries
+        self.cost = cost
+        self.cache_hit = cache_hit
+        self.error = error
+        self.tags = tags or {}
+
+
+class _Aggregate:
+    """Running totals for one group of calls."""
+
+    def __init__(self):
+        self.calls = 0
+        self.cache_hits = 0
+        self.errors = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self.latency_sum = 0.0
+        self.ttfb_sum = 0.0
+        self.ttfb_count = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.recent: Deque[float] = deque(maxlen=4096)  # latency window for percentiles
+
+    def add(self, record: CallRecord):
+        if record.cache_hit:
+            self.cache_hits += 1
+            return
+        self.calls += 1
+        self.errors += int(record.error)
+        self.retries += record.retries
+        self.prompt_tokens += record.prompt_tokens
+        self.completion_tokens += record.completion_tokens
+        self.cost += record.cost
+        self.latency_sum += record.latency
+        self.recent.append(record.latency)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if record.latency <= bound:
+                self.buckets[i] += 1
+        if record.ttfb is not None:
+            self.ttfb_sum += record.ttfb
+            self.ttfb_count += 1
+
+    def percentile(self, q: float) -> float:
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "errors": self.errors,
+            "retries": self.retries,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost_usd": round(self.cost, 6),
+            "latency_mean": round(self.latency_sum / self.calls, 4) if self.calls else 0.0,
+            "latency_p50": round(self.percentile(0.5), 4),
+            "latency_p95": round(self.percentile(0.95), 4),
+            "ttfb_mean": round(self.ttfb_sum / self.ttfb_count, 4) if self.ttfb_count else None,
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe aggregation and export of CallRecords."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.total = _Aggregate()
+        self.series: Dict[Tuple[str, str], _Aggregate] = {}
+        self.by_tag: Dict[str, Dict[str, _Aggregate]] = {tag: {} for tag in SUMMARY_TAGS}
+
+    def record(self, record: CallRecord):
+        with self._lock:
+            self.total.add(record)
+            self.series.setdefault((record.kind, record.model), _Aggregate()).add(record)
+            for tag, groups in self.by_tag.items():
+                value = record.tags.get(tag)
+                if value is not None:
+                    if tag == "scene" and "story" in record.tags:
+                        value = f"{record.tags['story']}/{value}"
+                    groups.setdefault(str(value), _Aggregate()).add(record)
+        if record.error:
+            logger.debug(f"{record.kind} call failed after {record.latency:.2f}s {record.tags}")
+
+    def forget_story(self, story: str):
+        """Drop the story's group and its scenes' groups; the totals and series keep its calls."""
+        with self._lock:
+            self.by_tag["story"].pop(story, None)
+            scenes = self.by_tag["scene"]
+            for name in [name for name in scenes if name.startswith(f"{story}/")]:
+                del scenes[name]
+
+    def summary(self) -> Dict[str, Any]:
+        """JSON-serialisable aggregates for the run so far."""
+        with self._lock:
+            elapsed = time.time() - self.started_at
+            summary = {
+                "elapsed_seconds": round(elapsed, 3),
+                "total": self.total.to_dict(),
+                "by_kind": {
+                    f"{kind}:{model}": agg.to_dict() for (kind, model), agg in self.series.items()
+                },
+            }
+            for tag, groups in self.by_tag.items():
+                summary[f"by_{tag}"] = {name: agg.to_dict() for name, agg in groups.items()}
+        minutes = elapsed / 60
+        summary["total"]["calls_per_minute"] = round(summary["total"]["calls"] / minutes, 2) if minutes else 0.0
+        return summary
+
+    def prometheus(self) -> str:
+        """Aggregates in the Prometheus text exposition format."""
+        lines: List[str] = []
+
+        def family(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            series = sorted(self.series.items())
+
+            family("llm_calls_total", "counter", "LLM calls by outcome.")
+            for (kind, model), agg in series:
+                labels = f'kind="{kind}",model="{model}"'
+                lines.append(f'llm_calls_total{{{labels},outcome="ok"}} {agg.calls - agg.errors}')
+                lines.append(f'llm_calls_total{{{labels},outcome="error"}} {agg.errors}')
+                lines.append(f'llm_calls_total{{{labels},outcome="cache_hit"}} {agg.cache_hits}')
+
+            counters = (
+                ("llm_retries_total", "Provider retries hidden inside calls.", "retries"),
+                ("llm_prompt_tokens_total", "Prompt tokens sent.", "prompt_tokens"),
+                ("llm_completion_tokens_total", "Completion tokens received.", "completion_tokens"),
+                ("llm_cost_usd_total", "Estimated provider cost in USD.", "cost"),
+            )
+            for name, help_text, attr in counters:
+                family(name, "counter", help_text)
+                for (kind, model), agg in series:
+                    lines.append(f'{name}{{kind="{kind}",model="{model}"}} {getattr(agg, attr)}')
+
+            family("llm_call_latency_seconds", "histogram", "Wall latency of uncached LLM calls.")
+            for (kind, model), agg in series:
+                labels = f'kind="{kind}",model="{model}"'
+                for bound, count in zip(LATENCY_BUCKETS, agg.buckets):
+                    lines.append(f'llm_call_latency_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'llm_call_latency_seconds_bucket{{{labels},le="+Inf"}} {agg.calls}')
+                lines.append(f"llm_call_latency_seconds_sum{{{labels}}} {agg.latency_sum}")
+                lines.append(f"llm_call_latency_seconds_count{{{labels}}} {agg.calls}")
+
+            family("llm_time_to_first_byte_seconds", "summary", "Time until response headers arrived.")
+            for (kind, model), agg in series:
+                labels = f'kind="{kind}",model="{model}"'
+                lines.append(f"llm_time_to_first_byte_seconds_sum{{{labels}}} {agg.ttfb_sum}")
+                lines.append(f"llm_time_to_first_byte_seconds_count{{{labels}}} {agg.ttfb_count}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """Write the Prometheus text atomically, e.g. for node_exporter's textfile collector."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write(self.prometheus())
+        os.replace(tmp_path, path)
+
+    def write_summary(self, path: str):
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.summary(), file, indent=2)
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Serve /metrics from a daemon thread; returns the server so callers can shut it down."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        logger.info(f"Serving LLM metrics on http://{host}:{server.server_port}/metrics")
+        return server
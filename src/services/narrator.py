@@ -1,9 +1,14 @@
-from typing import TYPE_CHECKING, List
+from typing import TYPE_CHECKING, List, Optional
 import logging
-import textwrap
 
 from models.story import ConversationTurn
 from prompts.characters import CharacterDialogueManager
+from prompts.templates import NARRATOR_TEMPLATE
+from services.prefix_cache import PrefixCacheReport
+from services.director import BranchSelector
+from services.metrics import call_tags
+from services.tracing import span
+from services.streaming import streamed
 
 if TYPE_CHECKING:
     from models.story import Scene  # Forward reference for type checking
@@ -17,14 +22,15 @@ class Narrator:
         self.llm_client = llm_client
         self.dialogueManager = CharacterDialogueManager()
 
-    def narrate_scene(
+    def build_narration_prompt(
         self,
         context: str,
         scene: "Scene",
         previous_narration: str = None,
         previous_conversation: List[ConversationTurn] = None,
+        recalled: Optional[str] = None,
     ) -> str:
-        """Generate narration for a given scene."""
+        """Build the narrator prompt for a given scene, with passages recalled from earlier scenes if any."""
 
         previous_conversation_str = ""
         if previous_conversation:
@@ -37,39 +43,59 @@ class Narrator:
         else:
             previous_conversation_str = "Nothing as far"
 
-        narrator_prompt = f"""
-            You are a skilled narrator tasked with bringing scenes to life in an engaging and immersive manner, you are the director of th show.
-
-            Objective:
-            - Given the story context, the current scene, and past developments, narrate the scene in a captivating way.
-            - Ensure narration flows naturally from prior events and conversations.
-            - Use vivid descriptions, sensory details, and emotional cues to enhance the storytelling.
-            - Keep narration concise yet evocative, ideally 3-4 sentences.
-
-            Story Context:
-            {context}
-
-            ------------------------------------------------------------------
-            Current Scene:
-            {scene.context}
-
-            Scene Details:
-            - Location: {scene.location}
-            - Atmosphere: {scene.atmosphere}
-            - Conflict: {scene.conflict}
-            - Possible Outcomes: {scene.possible_outcomes}
-
-            Previous Narration (if any):
-            {previous_narration if previous_narration else "Nothing as far"}
+        return NARRATOR_TEMPLATE.format(
+            context=context,
+            scene_context=scene.context,
+            location=scene.location,
+            atmosphere=scene.atmosphere,
+            conflict=scene.conflict,
+            possible_outcomes=scene.possible_outcomes,
+            previous_narration=previous_narration if previous_narration else "Nothing as far",
+            previous_conversation=previous_conversation_str,
+            recalled=f"{recalled}\n\n" if recalled else "",
+        )
 
-            Previous Conversation (if any):
-            {previous_conversation_str}
-
-            Narrator's Response:
-            """
-
-        prompt = textwrap.dedent(narrator_prompt).strip()
+    def narrate_scene(
+        self,
+        context: str,
+        scene: "Scene",
+        previous_narration: str = None,
+        previous_conversation: List[ConversationTurn] = None,
+    ) -> str:
+        """Generate narration for a given scene."""
+        prompt = self.build_narration_prompt(
+            context, scene, previous_narration, previous_conversation
+        )
         response = self.llm_client.call_llm(prompt)
 
         # print(response)
         return response
+
+    async def anarrate_scene(
+        self,
+        context: str,
+        scene: "Scene",
+        previous_narration: str = None,
+        previous_conversation: List[ConversationTurn] = None,
+        prefix_report: Optional[PrefixCacheReport] = None,
+        branches: Optional[BranchSelector] = None,
+        recalled: Optional[str] = None,
+    ) -> str:
+        """
+        Async variant of narrate_scene.
+
+        With a branch selector, several narrations are sampled in one batch and the
+        best-scoring one is returned.
+        """
+        prompt = self.build_narration_prompt(
+            context, scene, previous_narration, previous_conversation, recalled
+        )
+        if prefix_report is not None:
+            prefix_report.observe_text(prompt, key=scene.scene_no)
+        with call_tags(scene=scene.scene_no, character="narrator"), span("narration", scene=scene.scene_no):
+            if branches is not None and branches.n > 1:
+                candidates = await self.llm_client.acall_llm_candidates(prompt, branches.n)
+                return branches.pick_narration(candidates, scene)
+            with streamed("narration"):
+                return await self.llm_client.acall_llm(prompt)
+
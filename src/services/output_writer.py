@@ -0,0 +1,56 @@
+import json
+import logging
+import os
+from typing import Any, Dict
+
+from services.serialization import dump_yaml
+from services.tracing import span
+
+logger = logging.getLogger("output_writer")
+
+STREAM_FORMATS = ("yaml", "jsonl")
+
+
+class StreamingOutputWriter:
+    """
+    Writes a story scene by scene instead of in one dump at the end.
+
+    The first record is the story_info header and every following record is one
+    scene. In "yaml" format records are documents of a multi-document stream
+    (readable with yaml.safe_load_all); in "jsonl" format they are one JSON
+    object per line. Each record is flushed and fsynced as it is written, so
+    readers can tail the file while the story is generated.
+    """
+
+    def __init__(self, path: str, fmt: str = "yaml"):
+        if fmt not in STREAM_FORMATS:
+            raise ValueError(f"Unknown stream format {fmt!r}, expected one of {STREAM_FORMATS}")
+        self.path = path
+        self.fmt = fmt
+        self.scenes_written = 0
+        self._file = None
+
+    def open(self, story_info: Dict[str, Any]):
+        """Truncate the output and write the story header."""
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._append({"story_info": story_info})
+
+    def write_scene(self, scene_output: Dict[str, Any]):
+        with span(f"{self.fmt} dump", scene=scene_output.get("scene_no")):
+            self._append(scene_output)
+        self.scenes_written += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            logger.info(f"Streamed {self.scenes_written} scenes to {self.path}")
+
+    def _append(self, record: Dict[str, Any]):
+        if self.fmt == "jsonl":
+            text = json.dumps(record, ensure_ascii=False) + "\n"
+        else:
+            text = "---\n" + dump_yaml(record)
+        self._file.write(text)
+        self._file.flush()
+        os.fsync(self._file.fileno())
@@ -0,0 +1,147 @@
+"""
+Dry-run planning.
+
+Estimates the LLM requests a story will make and the tokens they will carry from the
+validated input alone, without a backend or any provider imports. Prompt overheads
+come from the real prompt templates; text the run has not produced yet (narrations,
+turns, memory summaries) is counted at the typical sizes below, so token totals are
+estimates while request counts are exact for the configured modes.
+"""
+
+from typing import Any, Dict, List
+
+from models.story import Config, StoryInput
+from prompts.characters import CharacterDialogueManager, ConversationBuffer
+from prompts.templates import MEMORY_FOLD_TEMPLATE, RECALL_TEMPLATE
+from services.narrator import Narrator
+from services.scheduler import SceneScheduler
+from services.tokens import estimate_message_tokens, estimate_tokens
+
+TYPICAL_NARRATION_TOKENS = 300
+TYPICAL_TURN_TOKENS = 90
+TYPICAL_SUMMARY_TOKENS = 150
+MESSAGE_FRAMING_TOKENS = 4
+
+
+class _SceneMemory:
+    """Replays ConversationMemory's folding on token counts instead of turns."""
+
+    def __init__(self, window: int):
+        self.window = max(1, window)
+        self.folded = 0
+        self.summary_tokens = 0
+        self.calls = 0
+        self.prompt_tokens = 0
+
+    def update(self, history: List[int]):
+        overflow = len(history) - self.folded - self.window
+        if overflow < self.window:
+            return
+        overhead = estimate_tokens(MEMORY_FOLD_TEMPLATE.format(summary="", new_turns=""))
+        self.calls += 1
+        self.prompt_tokens += overhead + self.summary_tokens + sum(history[self.folded : self.folded + overflow])
+        self.summary_tokens = TYPICAL_SUMMARY_TOKENS
+        self.folded += overflow
+
+
+def plan_story(story: StoryInput) -> Dict[str, Any]:
+    """Planned requests and estimated tokens, per scene and in total."""
+    config = story.config or Config()
+    branching = config.branching_factor or 1
+    round_mode = config.round_mode or "sequential"
+    # Batched rounds make one call per round; with branching every turn is sampled on its own
+    batched = round_mode == "batched" and branching == 1
+    window = (config.memory_window or 6) if config.memory_tracking else None
+    # Recalled passages are counted at their full budget, an upper bound
+    recall_budget = (config.retrieval_token_budget or 400) if config.retrieval else 0
+    recall_tokens = recall_budget + estimate_tokens(RECALL_TEMPLATE.format(passages="")) if recall_budget else 0
+
+    narrator = Narrator(None)
+    dialogue = CharacterDialogueManager()
+    # System prompt, empty narration and character block: the fixed part of each turn prompt
+    turn_overhead = {
+        name: estimate_message_tokens(ConversationBuffer(dialogue, "").prompt(name, character))
+        for name, character in story.characters.items()
+    }
+    round_overhead = estimate_message_tokens(ConversationBuffer(dialogue, "").round_prompt(dict(story.characters)))
+    scheduler = SceneScheduler(story.scenes)
+    initial = [estimate_tokens(dialogue.to_rich_format(t)) for t in story.initial_conversation or []]
+
+    scenes = []
+    for index, scene in enumerate(story.scenes):
+        rounds = scene.max_conversations or config.conversation_rounds
+        narration_prompt = estimate_tokens(narrator.build_narration_prompt(story.context, scene))
+        parents = scheduler.dependencies[index]
+        if parents:
+            narration_prompt += TYPICAL_NARRATION_TOKENS * len(parents)  # the narrations it follows
+            narration_prompt += recall_tokens
+        history = list(initial) if index == 0 else []
+        memory = _SceneMemory(window) if window else None
+        turn_prompts = 0
+
+        def turn_prompt(overhead: int, seen: int) -> int:
+            visible = history[memory.folded : seen] if memory else history[:seen]
+            tokens = overhead + TYPICAL_NARRATION_TOKENS
+            if recall_tokens and parents:
+                tokens += recall_tokens + MESSAGE_FRAMING_TOKENS
+            tokens += sum(visible) + MESSAGE_FRAMING_TOKENS * len(visible)
+            if memory and memory.folded:
+                tokens += memory.summary_tokens + MESSAGE_FRAMING_TOKENS
+            return tokens
+
+        for _ in range(rounds):
+            if batched:
+                if memory:
+                    memory.update(history)
+                turn_prompts += turn_prompt(round_overhead, len(history))
+                history.extend([TYPICAL_TURN_TOKENS] * len(story.characters))
+                continue
+            if round_mode == "simultaneous":
+                if memory:
+                    memory.update(history)
+                seen = len(history)
+                turn_prompts += sum(turn_prompt(turn_overhead[name], seen) for name in story.characters)
+                history.extend([TYPICAL_TURN_TOKENS] * len(story.characters))
+                continue
+            for name in story.characters:
+                if memory:
+                    memory.update(history)
+                turn_prompts += turn_prompt(turn_overhead[name], len(history))
+                history.append(TYPICAL_TURN_TOKENS)
+
+        turns = rounds * len(story.characters)
+        summary_calls = memory.calls if memory else 0
+        scenes.append(
+            {
+                "scene_no": scene.scene_no,
+                "rounds": rounds,
+                "narration_calls": 1,
+                "turn_calls": rounds if batched else turns * branching,
+                "summary_calls": summary_calls,
+                "prompt_tokens": narration_prompt + turn_prompts * branching + (memory.prompt_tokens if memory else 0),
+                "completion_tokens": TYPICAL_NARRATION_TOKENS * branching
+                + TYPICAL_TURN_TOKENS * turns * branching
+                + TYPICAL_SUMMARY_TOKENS * summary_calls,
+            }
+        )
+
+    keys = ("narration_calls", "turn_calls", "summary_calls", "prompt_tokens", "completion_tokens")
+    total = {key: sum(s[key] for s in scenes) for key in keys}
+    total["llm_calls"] = total["narration_calls"] + total["turn_calls"] + total["summary_calls"]
+    # Independent chains run concurrently, so wall time follows the longest one
+    total["longest_chain_scenes"] = scheduler.longest_chain()
+    return {
+        "scenes": scenes,
+        "total": total,
+        "assumptions": {
+            "round_mode": round_mode,
+            "branching_factor": branching,
+            "memory_window": window,
+            # With early stopping the turn and summary counts are an upper bound
+            "early_stopping": bool(config.early_stopping),
+            "retrieval_token_budget": recall_budget or None,
+            "typical_narration_tokens": TYPICAL_NARRATION_TOKENS,
+            "typical_turn_tokens": TYPICAL_TURN_TOKENS,
+            "typical_summary_tokens": TYPICAL_SUMMARY_TOKENS,
+        },
+    }
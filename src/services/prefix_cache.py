@@ -0,0 +1,63 @@
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from services.tokens import estimate_tokens
+
+logger = logging.getLogger("prefix_cache")
+
+
+def flatten_messages(messages: List[Dict[str, str]]) -> str:
+    """Serialise a message list the way it is laid out for the provider's prefix match."""
+    return "".join(f"<{m['role']}>{m.get('content', '')}\n" for m in messages)
+
+
+class PrefixCacheReport:
+    """
+    Measures how much of each prompt repeats the start of the previous one.
+
+    Provider prompt caches reuse the longest prefix a request shares with recent
+    requests, so the prefix shared with the previous call of the same stream is a
+    good proxy for the tokens that can be served from cache.
+    """
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cacheable_tokens = 0
+        self.cacheable_by_key: Dict[Any, int] = {}
+        self._previous: Optional[str] = None
+
+    def observe(self, messages: List[Dict[str, str]]) -> int:
+        """Record one call and return the length of its cacheable prefix in tokens."""
+        return self.observe_text(flatten_messages(messages))
+
+    def observe_text(self, prompt: str, key: Any = None) -> int:
+        """Like observe; `key` (e.g. a scene_no) also totals the cacheable tokens per key."""
+        shared = 0
+        if self._previous is not None:
+            shared = len(os.path.commonprefix([self._previous, prompt]))
+        self._previous = prompt
+
+        prompt_tokens = estimate_tokens(prompt)
+        cacheable = estimate_tokens(prompt[:shared])
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.cacheable_tokens += cacheable
+        if key is not None:
+            self.cacheable_by_key[key] = self.cacheable_by_key.get(key, 0) + cacheable
+        logger.debug(
+            f"{self.label} call {self.calls}: {cacheable}/{prompt_tokens} prompt tokens cacheable"
+        )
+        return cacheable
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "cacheable_prefix_tokens": self.cacheable_tokens,
+            "cacheable_ratio": round(self.cacheable_tokens / self.prompt_tokens, 3)
+            if self.prompt_tokens
+            else 0.0,
+        }
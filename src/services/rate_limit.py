@@ -0,0 +1,216 @@
+"""
+Client-side rate governing.
+
+RateGovernor sits between LLMClient and the backend and paces every request through:
+- a requests-per-minute and a tokens-per-minute token bucket (prompt tokens), refilled
+  continuously and holding about one second of budget, so requests are spread evenly
+  instead of being sent in bursts that the provider then rejects. They start empty:
+  a full bucket would add a burst on top of the steady rate, and the client cannot
+  know what the account has spent recently;
+- an AIMD concurrency limit: +1/limit per successful call, halved on a 429 (at most
+  once per latency window, so one burst of rejections counts once) and trimmed by 10%
+  while latency stays above an optional target;
+- a shared pause: a 429's Retry-After (or exponential backoff without one) holds
+  every request, not just the one that was rejected.
+
+Limits are applied with a little headroom below the configured account limits.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("rate_limit")
+
+# Fraction of the configured RPM/TPM the buckets allow
+RATE_HEADROOM = 0.95
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+
+class TokenBucket:
+    """
+    Bucket refilled at `per_minute` / 60 per second, holding `burst_seconds` of budget.
+    It starts full, or empty with `full=False`.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = 1.0, full: bool = True):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity if full else 0.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken; oversized amounts wait for a full bucket."""
+        self._refill(now)
+        needed = min(amount, self.capacity)
+        return 0.0 if self.level >= needed else (needed - self.level) / self.rate
+
+    def take(self, amount: float):
+        # May go negative for oversized amounts; later requests then wait off the debt
+        self.level -= amount
+
+
+class RateGovernor:
+    """Shared pacing and adaptive concurrency for all requests of one or more LLMClients."""
+
+    def __init__(
+        self,
+        rpm: Optional[int] = None,
+        tpm: Optional[int] = None,
+        max_concurrency: int = 16,
+        min_concurrency: int = 1,
+        latency_target: Optional[float] = None,
+    ):
+        self.requests = TokenBucket(rpm * RATE_HEADROOM, full=False) if rpm else None
+        self.tokens = TokenBucket(tpm * RATE_HEADROOM, full=False) if tpm else None
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.latency_target = latency_target
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.latency_ema: Optional[float] = None
+        self._hold_until = 0.0  # no further decreases before this
+        self._consecutive_throttles = 0
+        self._lock = threading.Lock()
+        self._changed: Optional[asyncio.Condition] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Counters for stats()
+        self.throttles = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    @classmethod
+    def from_config(cls, config) -> "RateGovernor":
+        return cls(
+            rpm=config.rpm_limit,
+            tpm=config.tpm_limit,
+            max_concurrency=config.max_concurrency,
+            latency_target=config.latency_target,
+        )
+
+    def _delay(self, tokens: int, now: float) -> float:
+        delay = self.paused_until - now
+        if self.requests is not None:
+            delay = max(delay, self.requests.wait_time(1, now))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.wait_time(tokens, now))
+        return delay
+
+    def _try_take(self, tokens: int, check_concurrency: bool) -> float:
+        """Take budget for one request, or return how long to wait (0 = wait for a free slot)."""
+        with self._lock:
+            now = time.monotonic()
+            delay = self._delay(tokens, now)
+            if delay > 0:
+                return delay
+            if check_concurrency and self.in_flight >= max(self.min_concurrency, int(self.limit)):
+                return 0.0
+            if self.requests is not None:
+                self.requests.take(1)
+            if self.tokens is not None:
+                self.tokens.take(tokens)
+            self.in_flight += 1
+            return -1.0
+
+    def _condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._changed = asyncio.Condition()
+        return self._changed
+
+    async def acquire(self, tokens: int):
+        """Wait until a request carrying `tokens` prompt tokens may be sent."""
+        changed = self._condition()
+        started = time.monotonic()
+        async with changed:
+            while True:
+                delay = self._try_take(tokens, check_concurrency=True)
+                if delay < 0:
+                    break
+                try:
+                    await asyncio.wait_for(changed.wait(), delay if delay > 0 else None)
+                except asyncio.TimeoutError:
+                    pass
+        self._count_wait(time.monotonic() - started)
+
+    async def release(self):
+        changed = self._condition()
+        with self._lock:
+            self.in_flight -= 1
+        async with changed:
+            changed.notify_all()
+
+    def acquire_sync(self, tokens: int):
+        """Blocking acquire for the synchronous client methods (pacing and pauses only)."""
+        started = time.monotonic()
+        while True:
+            delay = self._try_take(tokens, check_concurrency=False)
+            if delay < 0:
+                break
+            time.sleep(delay)
+        self._count_wait(time.monotonic() - started)
+
+    def release_sync(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _count_wait(self, seconds: float):
+        if seconds > 0.001:
+            with self._lock:
+                self.waits += 1
+                self.wait_seconds += seconds
+
+    def completed(self, latency: float):
+        """Additive increase after a successful call; trim while latency is over target."""
+        with self._lock:
+            self._consecutive_throttles = 0
+            self.latency_ema = latency if self.latency_ema is None else 0.8 * self.latency_ema + 0.2 * latency
+            now = time.monotonic()
+            if self.latency_target and self.latency_ema > self.latency_target:
+                if now >= self._hold_until:
+                    self.limit = max(self.min_concurrency, self.limit * 0.9)
+                    self._hold_until = now + self.latency_ema
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+
+    def throttled(self, retry_after: Optional[float] = None) -> float:
+        """
+        Multiplicative decrease after a 429 and a pause for every request: `retry_after`
+        when the provider sent one, exponential backoff with jitter otherwise.
+        Returns the pause in seconds.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.throttles += 1
+            self._consecutive_throttles += 1
+            if now >= self._hold_until:
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                self._hold_until = now + max(1.0, self.latency_ema or 0.0)
+            if retry_after is None:
+                backoff = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (self._consecutive_throttles - 1))
+                retry_after = backoff * random.uniform(0.5, 1.0)
+            self.paused_until = max(self.paused_until, now + retry_after)
+            limit = self.limit
+        logger.warning(f"Rate limited; pausing {retry_after:.2f}s, concurrency limit now {limit:.1f}")
+        return retry_after
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "concurrency_limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "throttles": self.throttles,
+                "waits": self.waits,
+                "wait_seconds": round(self.wait_seconds, 3),
+                "latency_ema": round(self.latency_ema, 4) if self.latency_ema is not None else None,
+            }
@@ -0,0 +1,204 @@
+"""
+Tail latency and failure handling for LLM calls.
+
+- Hedging: LatencyTracker learns the recent latency of each endpoint and request kind.
+  A call still running past the learned percentile gets a duplicate request, the first
+  to finish wins and the other is cancelled. Hedges are capped at a fraction of calls,
+  so a provider that is slow across the board is not sent twice the load.
+- Circuit breaking: after `failure_threshold` consecutive failures an endpoint's
+  circuit opens and calls to it fail fast (LLMClient moves them to the fallback model)
+  for `cooldown` seconds. Then a single trial call is let through; its outcome closes
+  the circuit or opens it for another cooldown. A trial that ends without a verdict
+  (rate limited or cancelled) re-opens it, and one that hangs past the cooldown lets
+  another trial through, so a circuit never stays half-open.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, TypeVar
+
+logger = logging.getLogger("resilience")
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """The endpoint's circuit is open; the call was not sent."""
+
+
+class LatencyTracker:
+    """Recent call latencies per key, and the percentile a call has to exceed to be hedged."""
+
+    def __init__(self, percentile: float = 0.95, window: int = 200, min_samples: int = 10):
+        self.percentile = percentile
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[Hashable, Deque[float]] = {}
+
+    def observe(self, key: Hashable, seconds: float):
+        self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def threshold(self, key: Hashable) -> Optional[float]:
+        """The learned percentile for `key`, or None until enough calls have been seen."""
+        samples = self._samples.get(key)
+        if samples is None or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+
+
+class Hedger:
+    """Sends a duplicate of a call that outlives its learned latency percentile."""
+
+    def __init__(self, percentile: float = 0.95, budget: float = 0.1, window: int = 200, min_samples: int = 10):
+        self.latency = LatencyTracker(percentile, window, min_samples)
+        self.budget = budget  # hedges allowed per call
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @classmethod
+    def from_config(cls, config) -> Optional["Hedger"]:
+        if not config.hedge_percentile:
+            return None
+        return cls(config.hedge_percentile, config.hedge_budget)
+
+    async def arun(self, key: Hashable, request: Callable[[Callable[[], None]], Awaitable[T]]) -> T:
+        """
+        Run `request(on_sent)`, and once more if the first has not finished within the
+        learned percentile for `key`. The request calls `on_sent` when it actually leaves
+        the client, and the clock starts there: time spent waiting for the rate governor
+        is not latency, and a call that is only queued is not hedged. Returns the first
+        success; raises the last error if both fail.
+        """
+        self.calls += 1
+        sent = asyncio.Event()
+        sent_at: Optional[float] = None
+
+        def on_sent():
+            nonlocal sent_at
+            if sent_at is None:
+                sent_at = time.perf_counter()
+                sent.set()
+
+        tasks = [asyncio.ensure_future(request(on_sent))]
+        try:
+            delay = self.latency.threshold(key)
+            if delay is not None:
+                waiter = asyncio.ensure_future(sent.wait())
+                try:
+                    await asyncio.wait([tasks[0], waiter], return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    waiter.cancel()
+                if sent_at is not None:
+                    done, _ = await asyncio.wait(tasks, timeout=max(0.0, sent_at + delay - time.perf_counter()))
+                    if not done and self.hedges < self.budget * self.calls:
+                        self.hedges += 1
+                        logger.debug(f"Hedging a call to {key} still running after {delay:.2f}s")
+                        tasks.append(asyncio.ensure_future(request(lambda: None)))
+
+            error: Optional[BaseException] = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self.hedge_wins += 1
+                        if sent_at is not None:
+                            self.latency.observe(key, time.perf_counter() - sent_at)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "hedges": self.hedges, "hedge_wins": self.hedge_wins}
+
+
+class CircuitBreaker:
+    """Per-endpoint circuits; shared by the sync and async paths, so guarded by a lock."""
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._state: Dict[str, str] = {}
+        self._failures: Dict[str, int] = {}
+        self._opened_at: Dict[str, float] = {}
+        self._trial_at: Dict[str, float] = {}
+        self.opened = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config) -> "CircuitBreaker":
+        return cls(config.breaker_failures, config.breaker_cooldown)
+
+    def state(self, endpoint: str) -> str:
+        return self._state.get(endpoint, CLOSED)
+
+    def allow(self, endpoint: str) -> bool:
+        """Whether a call may go to `endpoint`; the first call after the cooldown is the trial."""
+        with self._lock:
+            state = self.state(endpoint)
+            if state == CLOSED:
+                return True
+            now = time.monotonic()
+            if state == OPEN and now - self._opened_at[endpoint] >= self.cooldown:
+                self._state[endpoint] = HALF_OPEN
+                self._trial_at[endpoint] = now
+                logger.info(f"Circuit for {endpoint} half-open: sending a trial call")
+                return True
+            if state == HALF_OPEN and now - self._trial_at[endpoint] >= self.cooldown:
+                # The trial never reported back; try another
+                self._trial_at[endpoint] = now
+                return True
+            self.rejected += 1
+            return False
+
+    def success(self, endpoint: str):
+        with self._lock:
+            if self.state(endpoint) != CLOSED:
+                logger.info(f"Circuit for {endpoint} closed")
+            self._state[endpoint] = CLOSED
+            self._failures[endpoint] = 0
+
+    def failure(self, endpoint: str):
+        with self._lock:
+            failures = self._failures.get(endpoint, 0) + 1
+            self._failures[endpoint] = failures
+            if self.state(endpoint) == HALF_OPEN or (
+                self.state(endpoint) == CLOSED and failures >= self.failure_threshold
+            ):
+                self._state[endpoint] = OPEN
+                self._opened_at[endpoint] = time.monotonic()
+                self.opened += 1
+                logger.warning(
+                    f"Circuit for {endpoint} open after {failures} consecutive failures; "
+                    f"failing fast for {self.cooldown:.0f}s"
+                )
+
+    def abandon(self, endpoint: str):
+        """A call ended without saying anything about the endpoint; a pending trial re-opens the circuit."""
+        with self._lock:
+            if self.state(endpoint) == HALF_OPEN:
+                self._state[endpoint] = OPEN
+                self._opened_at[endpoint] = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "circuits": {endpoint: state for endpoint, state in self._state.items() if state != CLOSED},
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,166 @@
+"""
+Retrieval over a story's past scenes.
+
+StoryIndex is a local BM25 index over the narrations and turns of finished scenes,
+updated as each scene completes. Prompts recall the top-k passages relevant to the
+scene at hand, capped by a token budget, instead of carrying the whole story so far,
+so prompt size stays flat however long the story grows.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Any, Container, Dict, Iterable, List, Optional
+
+from models.story import ConversationTurn, Scene
+from prompts.templates import RECALL_TEMPLATE
+from services.tokens import estimate_tokens
+
+# BM25 term-frequency saturation and length normalisation
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_WORD = re.compile(r"[a-z0-9']+")
+# Words that match everything and say nothing about relevance
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from had has have he her his i in is it its me my no not of on or "
+    "our she so that the their them they this to was we were what with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [word for word in _WORD.findall(text.lower()) if word not in STOPWORDS and len(word) > 1]
+
+
+class Passage:
+    """One indexed piece of an earlier scene: its narration or a single turn."""
+
+    def __init__(self, passage_id: int, scene_no: int, kind: str, text: str):
+        self.id = passage_id
+        self.scene_no = scene_no
+        self.kind = kind  # "narration" or "turn"
+        self.text = text
+        self.tokens = estimate_tokens(text)
+
+
+class StoryIndex:
+    """
+    Incremental BM25 index for one story.
+
+    Postings map each term to the passages containing it and their term frequency, so
+    a search only touches the passages sharing a word with the query.
+    """
+
+    def __init__(self, top_k: int = 6, token_budget: int = 400):
+        self.top_k = top_k
+        self.token_budget = token_budget
+        self.passages: List[Passage] = []
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._lengths: List[int] = []
+        self._total_length = 0
+        self._narrations: Dict[int, int] = {}  # scene_no -> passage id of its narration
+
+    def __len__(self) -> int:
+        return len(self.passages)
+
+    def add(self, scene_no: int, kind: str, text: str) -> Passage:
+        passage = Passage(len(self.passages), scene_no, kind, text)
+        terms = Counter(tokenize(text))
+        for term, count in terms.items():
+            self._postings.setdefault(term, {})[passage.id] = count
+        length = sum(terms.values())
+        self._lengths.append(length)
+        self._total_length += length
+        self.passages.append(passage)
+        return passage
+
+    def add_scene(self, scene_no: int, narration: str, turns: Iterable[ConversationTurn]):
+        """Index a finished scene: its narration, then each turn."""
+        if narration:
+            self._narrations[scene_no] = self.add(scene_no, "narration", narration).id
+        for turn in turns:
+            self.add(scene_no, "turn", f'{turn.character}: "{turn.dialogue}"')
+
+    def narration_id(self, scene_no: int) -> Optional[int]:
+        return self._narrations.get(scene_no)
+
+    def scores(self, query: str) -> Dict[int, float]:
+        """BM25 score of every passage sharing a term with `query`."""
+        count = len(self.passages)
+        if not count:
+            return {}
+        average = self._total_length / count or 1.0
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log((count - len(postings) + 0.5) / (len(postings) + 0.5) + 1.0)
+            for passage_id, tf in postings.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[passage_id] / average)
+                scores[passage_id] = scores.get(passage_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def search(
+        self,
+        query: str,
+        top_k: Optional[int] = None,
+        token_budget: Optional[int] = None,
+        exclude: Iterable[int] = (),
+        scenes: Optional[Container[int]] = None,
+    ) -> List[Passage]:
+        """
+        The best-scoring passages, at most `top_k` and `token_budget` tokens in total
+        (passages that do not fit are skipped for smaller ones), returned in story order.
+        With `scenes`, only passages of those scene_nos are considered.
+        """
+        top_k = self.top_k if top_k is None else top_k
+        budget = self.token_budget if token_budget is None else token_budget
+        excluded = set(exclude)
+        scores = self.scores(query)
+        # Concurrent scenes are indexed in completion order, so order by scene before passage id
+        ranked = sorted(scores, key=lambda i: (-scores[i], self.passages[i].scene_no, i))
+
+        chosen: List[Passage] = []
+        for passage_id in ranked:
+            if len(chosen) >= top_k:
+                break
+            passage = self.passages[passage_id]
+            if passage_id in excluded or passage.tokens > budget:
+                continue
+            if scenes is not None and passage.scene_no not in scenes:
+                continue
+            chosen.append(passage)
+            budget -= passage.tokens
+        return sorted(chosen, key=lambda passage: (passage.scene_no, passage.id))
+
+    @staticmethod
+    def render(passages: List[Passage]) -> Optional[str]:
+        """The recalled passages as a prompt section, or None when there are none."""
+        if not passages:
+            return None
+        lines = "\n".join(f"- Scene {p.scene_no}: {p.text}" for p in passages)
+        return RECALL_TEMPLATE.format(passages=lines)
+
+    def recall_for_scene(
+        self,
+        scene: Scene,
+        narration: Optional[str] = None,
+        exclude: Iterable[int] = (),
+        scenes: Optional[Container[int]] = None,
+    ) -> List[Passage]:
+        """Passages relevant to `scene`, queried with its details and (for dialogue) its narration."""
+        parts = [scene.context, scene.location, scene.atmosphere, scene.conflict, scene.description, narration]
+        parts.extend(scene.possible_outcomes or [])
+        parts.extend(scene.themes or [])
+        return self.search(" ".join(part for part in parts if part), exclude=exclude, scenes=scenes)
+
+    def report(self, narration: List[Passage], dialogue: List[Passage]) -> Dict[str, Any]:
+        """What a scene recalled, for its output entry."""
+        return {
+            "indexed_passages": len(self.passages),
+            "narration_recalled": len(narration),
+            "narration_recalled_tokens": sum(p.tokens for p in narration),
+            "dialogue_recalled": len(dialogue),
+            "dialogue_recalled_tokens": sum(p.tokens for p in dialogue),
+        }
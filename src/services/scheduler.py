@@ -0,0 +1,126 @@
+"""
+Scene scheduling.
+
+Scenes form a DAG. A scene waits for the scenes listed in its `depends_on` and for the
+previous scene of its `thread`; scenes with neither form one default thread, so a story
+that declares nothing runs as the strict chain it always did. Independent chains run
+concurrently, and finished scenes are handed back in input order, so the output does not
+depend on which chain finishes first.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set
+
+from models.story import Scene
+
+logger = logging.getLogger("scheduler")
+
+
+def scene_dependencies(scenes: Sequence[Scene]) -> List[List[int]]:
+    """
+    For each scene, the input positions of the scenes it waits for, ascending.
+    StoryInput has checked that depends_on only names scenes listed earlier.
+    """
+    position = {scene.scene_no: i for i, scene in enumerate(scenes)}
+    last_in_thread: Dict[Optional[str], int] = {}
+    dependencies: List[List[int]] = []
+    for i, scene in enumerate(scenes):
+        parents = {position[scene_no] for scene_no in scene.depends_on or []}
+        # An explicit depends_on without a thread replaces the implicit chaining
+        if scene.thread is not None or scene.depends_on is None:
+            previous = last_in_thread.get(scene.thread)
+            if previous is not None:
+                parents.add(previous)
+            last_in_thread[scene.thread] = i
+        dependencies.append(sorted(parents))
+    return dependencies
+
+
+class SceneScheduler:
+    """Runs each scene as soon as its dependencies have finished."""
+
+    def __init__(self, scenes: Sequence[Scene]):
+        self.scenes = list(scenes)
+        self.dependencies = scene_dependencies(self.scenes)
+        self._positions = {id(scene): i for i, scene in enumerate(self.scenes)}
+        # Dependencies always come earlier in the input, so one pass resolves them
+        self._depth: List[int] = []
+        for parents in self.dependencies:
+            self._depth.append(1 + max((self._depth[p] for p in parents), default=0))
+        self._chain = all(parents == ([i - 1] if i else []) for i, parents in enumerate(self.dependencies))
+
+    def ancestors(self, scene: Scene) -> Optional[Set[int]]:
+        """
+        The scene_nos of every scene `scene` transitively depends on, found by walking
+        its dependencies. None when the scenes form a single chain: every earlier scene
+        is an ancestor then, and no later one has run.
+        """
+        if self._chain:
+            return None
+        found: Set[int] = set()
+        pending = list(self.dependencies[self._positions[id(scene)]])
+        while pending:
+            i = pending.pop()
+            if i not in found:
+                found.add(i)
+                pending.extend(self.dependencies[i])
+        return {self.scenes[i].scene_no for i in found}
+
+    def longest_chain(self) -> int:
+        """Scenes on the critical path: the number of sequential scene steps the story needs."""
+        return max(self._depth, default=0)
+
+    def roots(self) -> int:
+        return sum(1 for parents in self.dependencies if not parents)
+
+    async def arun(
+        self,
+        run_scene: Callable[[Scene, List[Any]], Awaitable[Any]],
+        finish: Callable[[Scene, Any], None],
+    ):
+        """
+        Call `run_scene(scene, parent_results)` for every scene once its parents are done,
+        and `finish(scene, result)` for each result in input order. A result is let go
+        once it has been finished and every scene depending on it has started, so a
+        long story does not keep them all. The first failure cancels every scene still
+        running or waiting.
+        """
+        loop = asyncio.get_running_loop()
+        results: List[Optional[asyncio.Future]] = [loop.create_future() for _ in self.scenes]
+        # Dependents of each scene that have not yet been handed its result
+        waiting = [0] * len(self.scenes)
+        for parents in self.dependencies:
+            for parent in parents:
+                waiting[parent] += 1
+        emitted = 0
+
+        def release(i: int):
+            if i < emitted and not waiting[i]:
+                results[i] = None
+
+        async def one(i: int):
+            nonlocal emitted
+            parents = [await results[parent] for parent in self.dependencies[i]]
+            for parent in self.dependencies[i]:
+                waiting[parent] -= 1
+                release(parent)
+            results[i].set_result(await run_scene(self.scenes[i], parents))
+            while emitted < len(self.scenes) and results[emitted].done():
+                emitted += 1
+                finish(self.scenes[emitted - 1], results[emitted - 1].result())
+                release(emitted - 1)
+
+        if self.longest_chain() < len(self.scenes):
+            logger.info(
+                f"Scheduling {len(self.scenes)} scenes as a DAG: {self.roots()} independent start(s), "
+                f"longest chain {self.longest_chain()} scenes"
+            )
+        tasks = [asyncio.ensure_future(one(i)) for i in range(len(self.scenes))]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
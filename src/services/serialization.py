@@ -0,0 +1,105 @@
+"""
+Story input/output serialization.
+
+The format is picked from the file extension: .yaml/.yml, .json, or .msgpack/.mpk
+(the latter needs the optional msgpack package). YAML goes through libyaml's
+CSafeLoader/CSafeDumper when PyYAML was built with it. Without libyaml, a pure-Python
+dumper is used that writes the same bytes: line folding is disabled, because libyaml
+folds long quoted strings differently, and the characters libyaml always escapes
+(NEL and anything outside the BMP, e.g. emoji) force double quotes.
+"""
+
+import json
+import re
+from pathlib import Path
+from typing import Any, Optional
+
+import yaml
+
+FORMATS = ("yaml", "json", "msgpack")
+SUFFIX_FORMATS = {
+    ".yaml": "yaml",
+    ".yml": "yaml",
+    ".json": "json",
+    ".msgpack": "msgpack",
+    ".mpk": "msgpack",
+}
+FORMAT_SUFFIXES = {"yaml": ".yaml", "json": ".json", "msgpack": ".msgpack"}
+
+LIBYAML = bool(getattr(yaml, "__with_libyaml__", False))
+
+_LIBYAML_ESCAPED = re.compile("[\x85\U00010000-\U0010FFFF]")
+
+
+class LibyamlCompatibleDumper(yaml.SafeDumper):
+    """SafeDumper that quotes scalars the way libyaml's emitter does."""
+
+    def analyze_scalar(self, scalar):
+        analysis = super().analyze_scalar(scalar)
+        if _LIBYAML_ESCAPED.search(scalar):
+            analysis.allow_flow_plain = False
+            analysis.allow_block_plain = False
+            analysis.allow_single_quoted = False
+            analysis.allow_block = False
+        return analysis
+
+
+YAML_LOADER = yaml.CSafeLoader if LIBYAML else yaml.SafeLoader
+YAML_DUMPER = yaml.CSafeDumper if LIBYAML else LibyamlCompatibleDumper
+YAML_DUMP_OPTIONS = dict(
+    default_flow_style=False,
+    allow_unicode=True,
+    sort_keys=False,
+    indent=2,
+    width=2**31 - 1,  # never fold lines; the two emitters fold differently
+)
+
+
+def format_for(path: str, default: str = "yaml") -> str:
+    """Serialization format for a path, from its extension."""
+    return SUFFIX_FORMATS.get(Path(path).suffix.lower(), default)
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        raise ImportError("msgpack files need the msgpack package: pip install msgpack")
+    return msgpack
+
+
+def load_yaml(stream) -> Any:
+    return yaml.load(stream, Loader=YAML_LOADER)
+
+
+def dump_yaml(data: Any, stream=None) -> Optional[str]:
+    """yaml.dump with the output options shared by every YAML writer."""
+    return yaml.dump(data, stream, Dumper=YAML_DUMPER, **YAML_DUMP_OPTIONS)
+
+
+def load_document(path: str) -> Any:
+    """Read a story document in the format given by its extension."""
+    fmt = format_for(path)
+    if fmt == "msgpack":
+        with open(path, "rb") as file:
+            return _msgpack().unpack(file, raw=False, strict_map_key=False)
+    with open(path, "r", encoding="utf-8") as file:
+        if fmt == "json":
+            return json.load(file)
+        return load_yaml(file)
+
+
+def dump_document(data: Any, path: str):
+    """Write a story document in the format given by its extension."""
+    fmt = format_for(path)
+    if fmt == "msgpack":
+        packed = _msgpack().packb(data, use_bin_type=True)
+        with open(path, "wb") as file:
+            file.write(packed)
+        return
+    with open(path, "w", encoding="utf-8") as file:
+        if fmt == "json":
+            json.dump(data, file, ensure_ascii=False, indent=2)
+            file.write("\n")
+        else:
+            dump_yaml(data, file)
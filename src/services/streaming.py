@@ -0,0 +1,145 @@
+"""
+Streaming story events.
+
+While an event sink is installed (see aiter_events / iter_events), the pipeline emits
+StoryEvents as it goes: narration text deltas and partial ConversationTurn fields as
+the provider streams them, then every finished narration, turn and scene. Like the
+metrics tags, the sink lives in a context variable, so it reaches the LLM calls of
+every task started under it without being passed through each layer.
+
+LLM calls only stream inside a streamed(kind) block, which names the events their
+deltas become ("narration_delta", "turn_partial"); other calls, such as memory
+summaries or branch candidates, run as before.
+"""
+
+import asyncio
+import queue
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional
+
+from pydantic import BaseModel
+
+from services.metrics import current_tags
+
+EVENT_KINDS = (
+    "scene_start",
+    "narration_delta",  # text: the next chunk of the narration
+    "narration",  # text: the finished narration
+    "turn_partial",  # fields: the turn's fields received so far
+    "turn",  # turn: the finished ConversationTurn
+    "scene",  # output: the scene as written to the story output
+    "story_end",
+)
+
+_event_sink: ContextVar[Optional[Callable[["StoryEvent"], None]]] = ContextVar("story_event_sink", default=None)
+_stream_kind: ContextVar[Optional[str]] = ContextVar("llm_stream_kind", default=None)
+
+_DONE = object()
+
+
+class StoryEvent:
+    """One streamed event, tagged with the story/scene/round/character it belongs to."""
+
+    def __init__(self, kind: str, tags: Optional[Dict[str, Any]] = None, **data):
+        self.kind = kind
+        self.tags = tags or {}
+        self.data = data
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serialisable form, e.g. for an NDJSON event stream."""
+        event = {"event": self.kind, **self.tags}
+        for key, value in self.data.items():
+            event[key] = value.model_dump() if isinstance(value, BaseModel) else value
+        return event
+
+    def __repr__(self) -> str:
+        return f"StoryEvent({self.kind!r}, {self.tags}, {list(self.data)})"
+
+
+def emit(kind: str, **data):
+    """Send an event to the current sink, if any."""
+    sink = _event_sink.get()
+    if sink is not None:
+        sink(StoryEvent(kind, dict(current_tags()), **data))
+
+
+def streaming() -> bool:
+    return _event_sink.get() is not None
+
+
+@contextmanager
+def streamed(kind: str):
+    """Let LLM calls in the block stream, emitting `<kind>_delta` / `<kind>_partial` events."""
+    token = _stream_kind.set(kind)
+    try:
+        yield
+    finally:
+        _stream_kind.reset(token)
+
+
+def stream_kind() -> Optional[str]:
+    """The event kind LLM calls should stream as, or None when nobody is listening."""
+    return _stream_kind.get() if streaming() else None
+
+
+async def aiter_events(run: Callable[[], Awaitable[Any]]) -> AsyncIterator[StoryEvent]:
+    """
+    Run the coroutine made by `run` as a task and yield its events as they happen.
+
+    Exceptions from the task are re-raised after the last event; if the consumer
+    stops early, the task is cancelled.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+    token = _event_sink.set(events.put_nowait)
+    try:
+        task = asyncio.ensure_future(run())
+    finally:
+        _event_sink.reset(token)
+    task.add_done_callback(lambda _: events.put_nowait(_DONE))
+
+    try:
+        while True:
+            event = await events.get()
+            if event is _DONE:
+                break
+            yield event
+        await task
+    finally:
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+def iter_events(run: Callable[[], Any]) -> Iterator[StoryEvent]:
+    """
+    Blocking counterpart of aiter_events for synchronous callers: `run` (which
+    typically calls asyncio.run) executes on a worker thread. A consumer that stops
+    early leaves the run to finish in the background.
+    """
+    events: queue.Queue = queue.Queue()
+    failure = []
+
+    def worker():
+        _event_sink.set(events.put)
+        try:
+            run()
+        except BaseException as e:
+            failure.append(e)
+        finally:
+            events.put(_DONE)
+
+    thread = threading.Thread(target=worker, name="story-stream", daemon=True)
+    thread.start()
+    while True:
+        event = events.get()
+        if event is _DONE:
+            break
+        yield event
+    thread.join()
+    if failure:
+        raise failure[0]
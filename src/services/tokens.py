@@ -0,0 +1,17 @@
+from typing import Dict, List
+
+# Rough provider-agnostic estimate; good enough for budgeting and reporting
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a piece of text."""
+    if not text:
+        return 0
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def estimate_message_tokens(messages: List[Dict[str, str]]) -> int:
+    """Estimate the prompt tokens of a chat message list."""
+    # ~4 tokens of framing per message in chat formats
+    return sum(estimate_tokens(m.get("content", "")) + 4 for m in messages)
@@ -0,0 +1,171 @@
+"""
+Optional timeline tracing.
+
+Spans are recorded as Chrome trace-event "complete" events, so a run can be opened in
+Perfetto (ui.perfetto.dev) or chrome://tracing. Each asyncio task (or thread) that opens
+spans gets its own lane, which keeps concurrent character turns and stories side by
+side instead of overlapping. Lanes are reused once a task closes its outermost span.
+
+Tracing is off unless start_tracing() is called; span() is then a shared no-op.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("tracing")
+
+_NO_SPAN = nullcontext()
+
+
+class _LaneState:
+    """Lane held by one task: released when its outermost span closes."""
+
+    def __init__(self, owner: int):
+        self.owner = owner
+        self.lane: Optional[int] = None
+        self.depth = 0
+
+
+_lane_state: ContextVar[Optional[_LaneState]] = ContextVar("trace_lane", default=None)
+
+
+def _owner() -> int:
+    # Tasks inherit their parent's context, so the owner tells a child task apart from its parent
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return id(task) if task is not None else threading.get_ident()
+
+
+class Tracer:
+    """Collects spans in memory and writes them as one trace-event JSON file."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._events: List[Dict[str, Any]] = []
+        self._free_lanes: List[int] = []
+        self._lane_names: Dict[int, str] = {}
+        self._next_lane = 1
+        self.pid = os.getpid()
+
+    def _us(self, t: float) -> float:
+        return round((t - self._origin) * 1e6, 1)
+
+    def _enter_lane(self, name: str) -> _LaneState:
+        owner = _owner()
+        state = _lane_state.get()
+        if state is None or state.owner != owner:
+            state = _LaneState(owner)
+            _lane_state.set(state)
+        if state.lane is None:
+            with self._lock:
+                if self._free_lanes:
+                    state.lane = self._free_lanes.pop()
+                else:
+                    state.lane = self._next_lane
+                    self._next_lane += 1
+                    self._lane_names[state.lane] = name
+        state.depth += 1
+        return state
+
+    def _exit_lane(self, state: _LaneState):
+        state.depth -= 1
+        if state.depth == 0:
+            with self._lock:
+                self._free_lanes.append(state.lane)
+            state.lane = None
+
+    def current_lane(self) -> int:
+        state = _lane_state.get()
+        if state is None or state.owner != _owner() or state.lane is None:
+            return 0
+        return state.lane
+
+    def record(self, name: str, start: float, end: float, lane: Optional[int] = None, **args):
+        """Add a finished span given perf_counter() start and end times."""
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": self._us(start),
+            "dur": round((end - start) * 1e6, 1),
+            "pid": self.pid,
+            "tid": self.current_lane() if lane is None else lane,
+        }
+        if args:
+            event["args"] = {k: v if isinstance(v, (int, float, bool)) else str(v) for k, v in args.items()}
+        with self._lock:
+            self._events.append(event)
+
+    def write(self, path: str):
+        with self._lock:
+            events = list(self._events)
+            lanes = dict(self._lane_names)
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": lane, "args": {"name": f"lane {lane}: {name}"}}
+            for lane, name in sorted(lanes.items())
+        ]
+        metadata.append({"name": "process_name", "ph": "M", "pid": self.pid, "args": {"name": "story narrator"}})
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, file)
+        logger.info(f"Wrote {len(events)} trace spans to {path}")
+
+
+class Span:
+    """Context manager that records one span on the current task's lane."""
+
+    def __init__(self, tracer: Tracer, name: str, args: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self._state = self.tracer._enter_lane(self.name)
+        self._lane = self._state.lane
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.record(self.name, self._start, time.perf_counter(), lane=self._lane, **self.args)
+        self.tracer._exit_lane(self._state)
+        return False
+
+
+_tracer: Optional[Tracer] = None
+
+
+def start_tracing() -> Tracer:
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def stop_tracing(path: Optional[str] = None):
+    """Disable tracing, writing the collected spans to `path` if given."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None and path:
+        tracer.write(path)
+
+
+def span(name: str, **args):
+    """Trace the enclosed block as `name`; a no-op while tracing is off."""
+    if _tracer is None:
+        return _NO_SPAN
+    return Span(_tracer, name, args)
+
+
+def record_span(name: str, start: float, end: float, **args):
+    """Record an already finished span (perf_counter() times) on the current lane."""
+    if _tracer is not None:
+        _tracer.record(name, start, end, **args)
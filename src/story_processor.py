@@ -7,268 +7,577 @@ results in a structured yaml format.
 """
 
 import sys
+import json
+import asyncio
+import argparse
 import yaml
 import logging
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import AsyncIterator, Dict, Iterator, List, Any, Optional, Union
+from pydantic import ValidationError
 
 # Import our story components
-from models.story import ConversationTurn, StoryInput
-from prompts.characters import CharacterDialogueManager
-from services.llm_client import LLMClient
+from models.story import Config, ConversationTurn, StoryInput
+from prompts.characters import CharacterDialogueManager, ConversationBuffer
+from services.llm_client import LLMCallError, LLMClient, get_llm_config, seeded
 from services.narrator import Narrator
 from services.conversation import ConversationManager
+from services.memory import ConversationMemory
+from services.prefix_cache import PrefixCacheReport
+from services.director import BranchSelector, RoundController
+from services.checkpoint import SceneCheckpoint, SceneRecord, story_fingerprint
+from services.output_writer import STREAM_FORMATS, StreamingOutputWriter
+from services.metrics import call_tags
+from services.tracing import span, start_tracing, stop_tracing
+from services.streaming import StoryEvent, aiter_events, emit, iter_events
+from services.serialization import dump_document, format_for, load_document
+from services.planning import plan_story
+from services.retrieval import StoryIndex
+from services.scheduler import SceneScheduler
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 logger = logging.getLogger("story_processor")
 
 
 class StoryProcessor:
-    def __init__(self):
-        self.llm_client = LLMClient()
+    def __init__(self, llm_client: LLMClient = None):
+        self.llm_client = llm_client or LLMClient()
         self.narrator = Narrator(self.llm_client)
         self.conversation_manager = ConversationManager(self.llm_client)
         self.dialogueManager = CharacterDialogueManager()
 
-    def load_story_config(self, yaml_file: str) -> Dict[str, Any]:
-        """Load story configuration from YAML file."""
+    def _run_sync(self, coro):
+        """Run a coroutine on a fresh event loop and release the pooled session after."""
+
+        async def runner():
+            try:
+                return await coro
+            finally:
+                await self.llm_client.aclose()
+
+        return asyncio.run(runner())
+
+    @staticmethod
+    def load_story_config(yaml_file: str) -> Dict[str, Any]:
+        """Load story configuration from a YAML, JSON or msgpack file."""
         try:
-            with open(yaml_file, "r", encoding="utf-8") as file:
-                config = yaml.safe_load(file)
+            with span(f"{format_for(yaml_file)} load", file=yaml_file):
+                config = load_document(yaml_file)
             logger.info(f"Loaded story configuration from {yaml_file}")
             return config
         except FileNotFoundError:
             logger.error(f"Input file {yaml_file} not found")
             sys.exit(1)
-        except yaml.YAMLError as e:
-            logger.error(f"Error parsing YAML file: {e}")
+        except (yaml.YAMLError, ValueError, ImportError) as e:
+            logger.error(f"Error parsing input file: {e}")
             sys.exit(1)
 
-    def validate_config(self, config: Dict[str, Any]) -> bool:
-        """Validate the story configuration."""
-        required_keys = ["context", "characters", "scenes"]
-
-        # Check required keys
-        for key in required_keys:
-            if key not in config:
-                logger.error(f"Missing required key: {key}")
-                return False
-
-        # Validate characters
-        if not isinstance(config["characters"], dict):
-            logger.error("Characters must be a dictionary")
-            return False
-
-        # Validate scenes
-        if not isinstance(config["scenes"], list):
-            logger.error("Scenes must be a list")
-            return False
-
-        # Validate character structure
-        for char_name, char_data in config["characters"].items():
-            if (
-                not isinstance(char_data, dict)
-                or "goal" not in char_data
-                or "backstory" not in char_data
-            ):
-                logger.error(f"Character {char_name} missing goal or backstory")
-                return False
-
-        # Validate scene structure
-        for i, scene in enumerate(config["scenes"]):
-            if (
-                not isinstance(scene, dict)
-                or "scene_no" not in scene
-                or "context" not in scene
-            ):
-                logger.error(f"Scene {i} missing 'scene_no' or 'context'")
-                return False
+    @staticmethod
+    def validate_config(config: Dict[str, Any]) -> Optional[StoryInput]:
+        """Validate the story configuration once into the typed, read-only StoryInput."""
+        try:
+            story = StoryInput.model_validate(config)
+        except ValidationError as e:
+            logger.error(f"Invalid story configuration: {e}")
+            return None
 
         logger.info("Configuration validation passed")
-        return True
+        return story
 
     def save_output(self, data: Dict[str, Any], output_file: str):
-        """Save the processed story to YAML file."""
+        """Save the processed story as YAML, JSON or msgpack, by file extension."""
         try:
-            with open(output_file, "w", encoding="utf-8") as file:
-                yaml.dump(
-                    data,
-                    file,
-                    default_flow_style=False,
-                    allow_unicode=True,
-                    sort_keys=False,
-                    indent=2,
-                )
+            with span(f"{format_for(output_file)} dump", file=output_file):
+                dump_document(data, output_file)
             logger.info(f"Output saved to {output_file}")
         except Exception as e:
             logger.error(f"Error saving output file: {e}")
             sys.exit(1)
 
     def run(
-        self, input_file: str = "story_input.yaml", output_file: str = "output.yaml"
+        self,
+        input_file: str = "story_input.yaml",
+        output_file: str = "output.yaml",
+        resume: bool = False,
+        stream_format: Optional[str] = None,
     ):
         """Main processing function."""
+        self._run_sync(self.arun(input_file, output_file, resume, stream_format))
+
+    async def arun(
+        self,
+        input_file: str = "story_input.yaml",
+        output_file: str = "output.yaml",
+        resume: bool = False,
+        stream_format: Optional[str] = None,
+    ):
+        """
+        Async variant of run.
+
+        With `stream_format` ("yaml" or "jsonl") scenes are appended to the output
+        as they finish instead of being saved in one dump at the end.
+        """
         logger.info("Starting Story Narrator YAML Processor")
 
         # Load configuration
         config = self.load_story_config(input_file)
 
         # Validate configuration
-        if not self.validate_config(config):
+        story = self.validate_config(config)
+        if story is None:
             sys.exit(1)
 
         # Use output file from config if specified
-        if "config" in config and "output_file" in config["config"]:
-            output_file = config["config"]["output_file"]
+        if story.config is not None and story.config.output_file:
+            output_file = story.config.output_file
 
-        # Process the story
-        output_data = self.process_story(config)
+        # Process the story, checkpointing each finished scene next to the output
+        checkpoint = SceneCheckpoint.for_output(output_file)
+        writer = StreamingOutputWriter(output_file, stream_format) if stream_format else None
+        try:
+            with call_tags(story=Path(input_file).stem), span("story", file=input_file):
+                output_data = await self.aprocess_story(story, checkpoint, resume, writer)
+        except LLMCallError as e:
+            # Finished scenes are in the checkpoint; --resume picks up from there
+            logger.error(f"Story stopped, the LLM could not generate a scene: {e}")
+            sys.exit(1)
+        finally:
+            if writer is not None:
+                writer.close()
 
         # Save results
-        self.save_output(output_data, output_file)
+        if writer is None:
+            self.save_output(output_data, output_file)
+        checkpoint.remove()
 
         # Final log summary
         logger.info("Story processing completed successfully!")
+        if self.llm_client.cache is not None:
+            logger.info(f"LLM response cache: {self.llm_client.cache.stats()}")
+        logger.info(f"LLM calls: {self.llm_client.metrics.summary()['total']}")
+        logger.info(f"Rate governor: {self.llm_client.governor.stats()}")
+        logger.info(f"Hedging and fallback: {self.llm_client.resilience_stats()}")
         # logger.info(f"Generated narrations for {len(output_data['scenes'])} scenes")
         # logger.info(
         #     f"Created conversations between {len(config['characters'])} characters"
         # )
         # logger.info(f"Results saved to: {output_file}")
 
-    def process_story(self, config: Dict[str, Any]) -> Dict[str, Any]:
+    def process_story(
+        self,
+        config: Union[StoryInput, Dict[str, Any]],
+        checkpoint: Optional[SceneCheckpoint] = None,
+        resume: bool = False,
+        writer: Optional[StreamingOutputWriter] = None,
+    ) -> Dict[str, Any]:
         """Process the story and generate narration and conversations."""
+        return self._run_sync(self.aprocess_story(config, checkpoint, resume, writer))
+
+    def astream_story(self, config: Union[StoryInput, Dict[str, Any]], **kwargs) -> AsyncIterator[StoryEvent]:
+        """
+        Run aprocess_story (same arguments) and yield its events as they happen:
+        narration deltas, partial and finished turns, and every finished scene.
+        """
+        return aiter_events(lambda: self.aprocess_story(config, **kwargs))
+
+    def stream_story(self, config: Union[StoryInput, Dict[str, Any]], **kwargs) -> Iterator[StoryEvent]:
+        """Blocking generator over the events of process_story, for front ends without a loop."""
+        return iter_events(lambda: self.process_story(config, **kwargs))
+
+    async def aprocess_story(
+        self,
+        config: Union[StoryInput, Dict[str, Any]],
+        checkpoint: Optional[SceneCheckpoint] = None,
+        resume: bool = False,
+        writer: Optional[StreamingOutputWriter] = None,
+    ) -> Dict[str, Any]:
+        """
+        Async variant of process_story; many stories can share one event loop.
+
+        With a checkpoint, every finished scene is persisted as it completes, and
+        `resume` skips the scenes an earlier run already finished. With a writer,
+        scenes are streamed to it and not kept in the returned data. `config` is a
+        validated StoryInput (see validate_config) or a raw dict validated here.
+        """
+
+        story_input = config if isinstance(config, StoryInput) else StoryInput.model_validate(config)
 
-        # Create StoryInput object
-        story_input = StoryInput(
-            context=config["context"],
-            characters=config["characters"],
-            scenes=config["scenes"],
-            initial_conversation=config.get("initial_conversation", [])
+        # Get configuration options
+        story_config = story_input.config or Config()
+        conversation_rounds = story_config.conversation_rounds
+        memory_tracking = bool(story_config.memory_tracking)
+        memory_window = story_config.memory_window or 6
+        round_mode = story_config.round_mode or "sequential"
+        branching_factor = story_config.branching_factor or 1
+        # A batched round is one structured call; with branching its turns are sampled per character
+        if round_mode == "batched" and branching_factor <= 1:
+            calls_per_round = 1
+        else:
+            calls_per_round = len(story_input.characters) * branching_factor
+        save_alternatives = bool(story_config.save_alternatives)
+        formatted = story_config.conversations_formatted
+        early_stopping = bool(story_config.early_stopping)
+        calls_saved = 0
+        index = (
+            StoryIndex(story_config.retrieval_top_k or 6, story_config.retrieval_token_budget or 400)
+            if story_config.retrieval
+            else None
         )
 
-        # Get configuration options
-        story_config = config.get("config", {})
-        conversation_rounds = story_config.get("conversation_rounds", 2)
+        completed: Dict[int, SceneRecord] = {}
+        fingerprint = story_fingerprint(story_input.model_dump(mode="json"))
+        if checkpoint is not None and resume:
+            completed = checkpoint.load(fingerprint)
+        # A resumed run samples the rest of the story with the seed it started with
+        seed = story_config.seed
+        if seed is None and completed:
+            seed = checkpoint.seed
+        if seed is None:
+            seed = self.llm_client.config.seed
+        if checkpoint is not None:
+            checkpoint.start(fingerprint, seed, completed)
 
         # Prepare output structure
         output_data: Dict[str, Any] = {
             "story_info": {
-                "context": config["context"],
+                "context": story_input.context,
                 "generated_at": datetime.now().isoformat(),
-                "total_scenes": len(config["scenes"]),
-                "characters": list(config["characters"].keys()),
+                "total_scenes": len(story_input.scenes),
+                "characters": list(story_input.characters.keys()),
+                "seed": seed,
             },
             "scenes": [],
         }
 
         logger.info(f"Processing {len(story_input.scenes)} scenes...")
 
-        narration_str = None
-        previous_conversation: List[ConversationTurn] = None
-        init_conversation: List[ConversationTurn] = []
-
-        for init_conv in story_input.initial_conversation or []:
-            turn = ConversationTurn.model_validate(init_conv)
-            init_conversation.append(turn)
-
-        for scene in story_input.scenes:
-            logger.info(f"Processing scene {scene.scene_no}")
-
-            conversation_rounds = (
-                scene.max_conversations
-                if scene.max_conversations
-                else conversation_rounds
-            )
-
-            # if init_conversation and len(init_conversation) > 0:
-            #     previous_conversation = init_conversation
-
-            # Generate narration
-            narration_str = self.narrator.narrate_scene(
-                story_input.context, scene, narration_str, previous_conversation
-            )
-
-            # narration_str = "dummy narration"  # REMOVE AFTER TESTING
-            # Generate conversation
-            previous_conversation = (
-                self.conversation_manager.conduct_scene_conversation(
-                    characters=story_input.characters,
-                    narration=narration_str,
-                    scene=scene,
-                    conversation_rounds=conversation_rounds,
-                    init_conversation=init_conversation
+        if writer is not None:
+            writer.open(output_data["story_info"])
+
+        # Narrator prompts share their prefix across scenes, dialogue prompts within a scene
+        narration_prefix = PrefixCacheReport("narration")
+
+        init_conversation: List[ConversationTurn] = list(story_input.initial_conversation or [])
+        # Scenes run as soon as the scenes they depend on have finished; see services/scheduler.py
+        scheduler = SceneScheduler(story_input.scenes)
+        buffers: Dict[int, ConversationBuffer] = {}
+
+        async def run_scene(scene, parents: List[SceneRecord]) -> SceneRecord:
+            """Narrate and play one scene, following the narration of the scenes it depends on."""
+            nonlocal calls_saved
+            if scene.scene_no in completed:
+                # Restore what the dependent scenes need and move on
+                record = completed.pop(scene.scene_no)
+                logger.info(f"Skipping scene {scene.scene_no} (restored from checkpoint)")
+                if index is not None:
+                    index.add_scene(scene.scene_no, record.narration, record.conversation)
+                return record
+
+            # A scene joining several threads follows all of their narrations
+            previous_narration = "\n\n".join(p.narration for p in parents if p.narration) or None
+            # The initial conversation opens the first scene of the story only
+            scene_init_conversation = init_conversation if scene is story_input.scenes[0] else []
+
+            with span("scene", scene=scene.scene_no):
+                logger.info(f"Processing scene {scene.scene_no}")
+                emit("scene_start", scene=scene.scene_no)
+
+                scene_rounds = (
+                    scene.max_conversations
+                    if scene.max_conversations
+                    else conversation_rounds
+                )
+
+                # if init_conversation and len(init_conversation) > 0:
+                #     previous_conversation = init_conversation
+
+                # Generate narration
+                branches = (
+                    BranchSelector(branching_factor, keep_alternatives=save_alternatives)
+                    if branching_factor > 1
+                    else None
+                )
+                # The parents' narrations are in the prompt verbatim; recall only from the
+                # scenes this one follows, so concurrent subplots do not leak into each other
+                ancestors = scheduler.ancestors(scene) if index is not None else None
+                narration_recalled = (
+                    index.recall_for_scene(
+                        scene,
+                        exclude=[index.narration_id(p.scene_no) for p in parents],
+                        scenes=ancestors,
+                    )
+                    if index is not None
+                    else []
+                )
+                narration_str = await self.narrator.anarrate_scene(
+                    story_input.context,
+                    scene,
+                    previous_narration,
+                    None,
+                    prefix_report=narration_prefix,
+                    branches=branches,
+                    recalled=StoryIndex.render(narration_recalled),
+                )
+                emit("narration", scene=scene.scene_no, text=narration_str)
+
+                # narration_str = "dummy narration"  # REMOVE AFTER TESTING
+                # Generate conversation
+                memory = (
+                    ConversationMemory(self.llm_client, window=memory_window)
+                    if memory_tracking
+                    else None
                 )
-            )
-
-            # Structure the scene output
-            scene_output = {
-                "scene_no": scene.scene_no,
-                "context": scene.context,
-                "narration": narration_str,
-                "conversations": [],
-                "conversations_formatted": [],
-            }
-
-            for entry in previous_conversation:
-                scene_output["conversations"].append(entry.model_dump())
-                scene_output["conversations_formatted"].append(
-                    self.dialogueManager.to_rich_format(entry)
+                controller = (
+                    RoundController(
+                        scene,
+                        scene_rounds,
+                        calls_per_round,
+                        threshold=story_config.early_stopping_threshold or 0.6,
+                        min_rounds=story_config.min_rounds or 1,
+                    )
+                    if early_stopping
+                    else None
+                )
+                dialogue_prefix = PrefixCacheReport(f"scene {scene.scene_no} dialogue")
+                dialogue_recalled = (
+                    index.recall_for_scene(scene, narration_str, scenes=ancestors) if index is not None else []
+                )
+                buffer = ConversationBuffer(
+                    self.conversation_manager.dialogueManager,
+                    narration_str,
+                    StoryIndex.render(dialogue_recalled),
+                )
+                conversation = (
+                    await self.conversation_manager.aconduct_scene_conversation(
+                        characters=story_input.characters,
+                        narration=narration_str,
+                        scene=scene,
+                        conversation_rounds=scene_rounds,
+                        init_conversation=scene_init_conversation,
+                        memory=memory,
+                        prefix_report=dialogue_prefix,
+                        round_mode=round_mode,
+                        branches=branches,
+                        buffer=buffer,
+                        controller=controller,
+                    )
                 )
 
-            # Group conversations by round
-            # current_round = 1
-            # round_conversations = []
-
-            # for entry in conversation:
-            #     if entry["round"] != current_round:
-            #         if round_conversations:
-            #             scene_output["conversations"].append({
-            #                 "round": current_round,
-            #                 "exchanges": round_conversations
-            #             })
-            #         current_round = entry["round"]
-            #         round_conversations = []
-
-            #     round_conversations.append({
-            #         "character": entry["character"],
-            #         "text": entry["response"]
-            #     })
-
-            #     if previous_conversation:
-            #         previous_conversation += f"\n{entry['character']}: {entry['response']}"
-            #     else:
-            #         previous_conversation = f"{entry['character']}: {entry['response']}"
-
-            # Add the last round
-            # if round_conversations:
-            #     scene_output["conversations"].append({
-            #         "round": current_round,
-            #         "exchanges": round_conversations
-            #     })
-
-            # Append this scene to output
-            output_data["scenes"].append(scene_output)
+                # Structure the scene output; turns are expanded for output in _emit_scene
+                scene_output = {
+                    "scene_no": scene.scene_no,
+                    "context": scene.context,
+                    "narration": narration_str,
+                    "conversations": conversation,
+                }
+
+                if branches is not None:
+                    scene_output["directors_rewarks"] = branches.directors_rewarks()
+                    if save_alternatives:
+                        scene_output["alternatives"] = branches.alternatives
+                elif controller is not None:
+                    scene_output["directors_rewarks"] = controller.directors_rewarks()
+
+                if controller is not None:
+                    scene_output["early_stopping"] = controller.report()
+                    calls_saved += controller.calls_saved
+
+                scene_output["prefix_cache"] = {
+                    "narration_cacheable_tokens": narration_prefix.cacheable_by_key.get(scene.scene_no, 0),
+                    **dialogue_prefix.report(),
+                }
+
+                if memory is not None:
+                    scene_output["memory"] = memory.report()
+                    logger.info(
+                        f"Scene {scene.scene_no} memory saved ~{scene_output['memory']['tokens_saved']} "
+                        f"history tokens (window {memory_window})"
+                    )
+
+                if index is not None:
+                    scene_output["retrieval"] = index.report(narration_recalled, dialogue_recalled)
+                    index.add_scene(scene.scene_no, narration_str, conversation)
+
+                # Group conversations by round
+                # current_round = 1
+                # round_conversations = []
+
+                # for entry in conversation:
+                #     if entry["round"] != current_round:
+                #         if round_conversations:
+                #             scene_output["conversations"].append({
+                #                 "round": current_round,
+                #                 "exchanges": round_conversations
+                #             })
+                #         current_round = entry["round"]
+                #         round_conversations = []
+
+                #     round_conversations.append({
+                #         "character": entry["character"],
+                #         "text": entry["response"]
+                #     })
+
+                #     if previous_conversation:
+                #         previous_conversation += f"\n{entry['character']}: {entry['response']}"
+                #     else:
+                #         previous_conversation = f"{entry['character']}: {entry['response']}"
+
+                # Add the last round
+                # if round_conversations:
+                #     scene_output["conversations"].append({
+                #         "round": current_round,
+                #         "exchanges": round_conversations
+                #     })
+
+                # Checkpoint as soon as the scene is done; it is emitted once every earlier scene is
+                record = SceneRecord(scene.scene_no, scene_output, narration_str, conversation)
+                if checkpoint is not None:
+                    checkpoint.record(record)
+                buffers[scene.scene_no] = buffer
 
-            # Reset conversation history for next scene
-            previous_conversation = []
-            init_conversation = []
             self.conversation_manager.reset_conversation_history()
+            return record
+
+        def finish_scene(scene, record: SceneRecord):
+            # Append this scene to output, in input order
+            self._emit_scene(output_data, record.scene_output, writer, formatted, buffers.pop(scene.scene_no, None))
+            # Scenes that follow this one only need its narration; the rest is written out
+            record.scene_output, record.conversation = {}, []
+
+        with seeded(seed):
+            await scheduler.arun(run_scene, finish_scene)
+
+
+        if writer is not None:
+            writer.close()
 
+        emit("story_end", scenes=len(story_input.scenes))
+        logger.info(f"Narration prompt prefix cache: {narration_prefix.report()}")
+        if early_stopping:
+            logger.info(f"Early stopping saved {calls_saved} turn calls")
         logger.info("Story processing completed")
         return output_data
 
+    def _emit_scene(
+        self,
+        output_data: Dict[str, Any],
+        scene_output: Dict[str, Any],
+        writer: Optional[StreamingOutputWriter],
+        formatted: bool = True,
+        buffer: Optional[ConversationBuffer] = None,
+    ):
+        """Hand a finished scene to the streaming writer, or keep it for save_output."""
+        scene_output = self._render_scene(scene_output, formatted, buffer)
+        emit("scene", scene=scene_output["scene_no"], output=scene_output)
+        if writer is not None:
+            writer.write_scene(scene_output)
+        else:
+            output_data["scenes"].append(scene_output)
+
+    def _render_scene(
+        self,
+        scene_output: Dict[str, Any],
+        formatted: bool,
+        buffer: Optional[ConversationBuffer] = None,
+    ) -> Dict[str, Any]:
+        """
+        Expand the scene's ConversationTurns into their output form: plain dicts and,
+        when `formatted`, the rich-text rendering next to them (reused from the scene's
+        buffer when there is one).
+        """
+        rich_text = buffer.rich_text if buffer is not None else self.dialogueManager.to_rich_format
+        rendered: Dict[str, Any] = {}
+        for key, value in scene_output.items():
+            if key == "conversations":
+                rendered[key] = [turn.model_dump() for turn in value]
+                if formatted:
+                    rendered["conversations_formatted"] = [
+                        rich_text(turn) for turn in value
+                    ]
+            elif key != "conversations_formatted":
+                rendered[key] = value
+        return rendered
+
 
 def main():
     """Command line entry point."""
     # Parse command line arguments
-    input_file = sys.argv[1] if len(sys.argv) > 1 else "story_input.yaml"
-    output_file = sys.argv[2] if len(sys.argv) > 2 else "output.yaml"
+    parser = argparse.ArgumentParser(description="Narrate a story from a YAML input file.")
+    parser.add_argument("input_file", nargs="?", default="story_input.yaml")
+    parser.add_argument("output_file", nargs="?", default="output.yaml")
+    parser.add_argument(
+        "--fresh",
+        action="store_true",
+        help="sample fresh responses instead of reading the LLM response cache",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue from the checkpoint of an interrupted run, skipping finished scenes",
+    )
+    parser.add_argument(
+        "--stream",
+        choices=STREAM_FORMATS,
+        help="append each scene to the output as it finishes (YAML documents or JSONL)",
+    )
+    parser.add_argument(
+        "--backend",
+        help='LLM backend: "litellm", "fake", "record:<cassette>" or "replay:<cassette>"',
+    )
+    parser.add_argument("--metrics-json", help="write the per-run LLM call summary as JSON")
+    parser.add_argument("--metrics-prom", help="write LLM call metrics as a Prometheus text file")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port during the run")
+    parser.add_argument("--trace", help="write a Chrome trace-event timeline of the run (open in Perfetto)")
+    parser.add_argument(
+        "--dry-run",
+        "--validate-only",
+        dest="dry_run",
+        action="store_true",
+        help="validate the input and print the planned LLM calls and token estimates, without calling a model",
+    )
+    args = parser.parse_args()
+
+    # Configure logging
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    if args.dry_run:
+        # Never touches LLMClient, so the provider stack is not even imported
+        story = StoryProcessor.validate_config(StoryProcessor.load_story_config(args.input_file))
+        if story is None:
+            sys.exit(1)
+        plan = plan_story(story)
+        print(json.dumps(plan, indent=2))
+        total = plan["total"]
+        logger.info(
+            f"Planned {total['llm_calls']} LLM calls ({total['narration_calls']} narration, "
+            f"{total['turn_calls']} turns, {total['summary_calls']} memory summaries), "
+            f"~{total['prompt_tokens']} prompt and ~{total['completion_tokens']} completion tokens; "
+            f"longest scene chain {total['longest_chain_scenes']} of {len(plan['scenes'])} scenes"
+        )
+        return
+
+    llm_config = get_llm_config()
+    llm_config.cache_bypass = llm_config.cache_bypass or args.fresh
+    if args.backend:
+        llm_config.backend = args.backend
 
     # Create and run processor
-    processor = StoryProcessor()
-    processor.run(input_file, output_file)
+    processor = StoryProcessor(LLMClient(llm_config))
+    metrics = processor.llm_client.metrics
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+    if args.trace:
+        start_tracing()
+    try:
+        processor.run(
+            args.input_file, args.output_file, resume=args.resume, stream_format=args.stream
+        )
+    finally:
+        stop_tracing(args.trace)
+        if args.metrics_json:
+            metrics.write_summary(args.metrics_json)
+        if args.metrics_prom:
+            metrics.write_prometheus(args.metrics_prom)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+# The application imports its modules from src/ as top-level packages
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from services.llm_client import LLMConfig  # noqa: E402
+
+
+@pytest.fixture
+def llm_config() -> LLMConfig:
+    """Offline settings: the fake backend, no response cache."""
+    return LLMConfig(model="test-model", temperature=1, max_tokens=512, api_key="", base_url="", backend="fake")
+
+
+@pytest.fixture
+def story():
+    """Builds a small two-character story input; keyword arguments go into its config."""
+
+    def build(scenes: int = 3, **config):
+        return {
+            "context": "A storm is closing on the harbor town of Vell.",
+            "characters": {
+                "Mira": {"goal": "Get the ship out before the storm.", "backstory": "A captain with debts."},
+                "Tobin": {"goal": "Keep the harbor closed.", "backstory": "The harbor master."},
+            },
+            "scenes": [
+                {"scene_no": i, "context": f"Scene {i} on the storm-lashed docks of Vell."}
+                for i in range(1, scenes + 1)
+            ],
+            "config": {"conversation_rounds": 2, **config},
+        }
+
+    return build
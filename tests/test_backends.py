@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from models.story import ConversationTurn
+from services.backends import CassetteMissError, FakeBackend, RecordingBackend, ReplayBackend
+from services.llm_client import LLMClient
+from story_processor import StoryProcessor
+
+MESSAGES = [{"role": "system", "content": "You are roleplaying as Mira."}, {"role": "user", "content": "Speak."}]
+
+
+def scenes(output):
+    return [(scene["narration"], scene["conversations"]) for scene in output["scenes"]]
+
+
+def test_replay_serves_a_recorded_story(tmp_path, llm_config, story):
+    cassette = str(tmp_path / "cassette.jsonl")
+    recorded = StoryProcessor(LLMClient(llm_config, backend=RecordingBackend(FakeBackend(), cassette)))
+    expected = recorded.process_story(story())
+
+    replayed = StoryProcessor(LLMClient(llm_config, backend=ReplayBackend(cassette)))
+    assert scenes(replayed.process_story(story())) == scenes(expected)
+
+
+def test_replay_rejects_an_unrecorded_request(tmp_path, llm_config):
+    cassette = tmp_path / "cassette.jsonl"
+    cassette.write_text("")
+    with pytest.raises(CassetteMissError):
+        ReplayBackend(str(cassette)).structured(MESSAGES, llm_config, ConversationTurn)
+
+
+def test_recording_bypasses_the_response_cache(tmp_path, llm_config):
+    cassette = tmp_path / "cassette.jsonl"
+    config = llm_config.model_copy(update={"cache_path": str(tmp_path / "cache.sqlite")})
+    client = LLMClient(config, backend=RecordingBackend(FakeBackend(), str(cassette)))
+    assert client.cache is None
+
+    async def run():
+        try:
+            for _ in range(2):
+                await client.aexecute_character_dialogue(MESSAGES)
+        finally:
+            await client.aclose()
+
+    asyncio.run(run())
+    # A repeated request is sent and recorded again, so a replay finds every call
+    assert len(cassette.read_text().splitlines()) == 2
+
+
+def test_fake_answers_follow_the_seed(llm_config):
+    backend = FakeBackend()
+
+    def answer(seed):
+        return backend.structured(MESSAGES, llm_config.model_copy(update={"seed": seed}), ConversationTurn).value
+
+    assert answer(1) == answer(1)
+    assert answer(1) != answer(2)
+    assert answer(None) == backend.structured(MESSAGES, llm_config, ConversationTurn).value
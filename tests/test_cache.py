@@ -0,0 +1,72 @@
+import time
+
+from services.backends import FakeBackend
+from services.cache import ResponseCache
+from services.llm_client import LLMClient
+
+MESSAGES = [{"role": "user", "content": "Describe the harbor."}]
+
+
+class CacheableBackend(FakeBackend):
+    """A fake provider whose answers may be cached, like a real one's."""
+
+    cacheable = True
+
+
+def key(**overrides):
+    fields = dict(model="test-model", temperature=1, max_tokens=512, messages=MESSAGES)
+    fields.update(overrides)
+    return ResponseCache.make_key(**fields)
+
+
+def test_keys_cover_every_field_that_shapes_a_response():
+    assert key() == key()
+    assert key(temperature=0.5) != key()
+    assert key(messages=[{"role": "user", "content": "Describe the ship."}]) != key()
+    assert key(schema={"type": "object"}) != key()
+    assert key(n=3) != key()
+    assert key(seed=7) != key()
+    assert key(seed=7) == key(seed=7)
+
+
+def test_entries_survive_reopening_and_count_hits(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(path)
+    assert cache.get("a") is None
+    cache.put("a", "the tide is turning")
+    cache.close()
+
+    reopened = ResponseCache(path)
+    assert reopened.get("a") == "the tide is turning"
+    assert reopened.stats()["hits"] == 1
+    assert reopened.stats()["entries"] == 1
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    for name in ("a", "b"):
+        cache.put(name, name)
+        time.sleep(0.01)
+    cache.get("a")  # b is now the least recently used
+    cache.put("c", "c")
+    cache.evict()
+    assert cache.get("b") is None
+    assert cache.get("a") == "a"
+    assert cache.get("c") == "c"
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_age_seconds=0)
+    cache.put("a", "a")
+    time.sleep(0.01)
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_a_repeated_request_is_served_from_the_cache(tmp_path, llm_config):
+    config = llm_config.model_copy(update={"cache_path": str(tmp_path / "cache.sqlite")})
+    client = LLMClient(config, backend=CacheableBackend())
+    first = client.call_llm("Describe the harbor.")
+    assert client.call_llm("Describe the harbor.") == first
+    assert client.call_count == 1
+    assert client.cache.stats()["hits"] == 1
@@ -0,0 +1,105 @@
+import asyncio
+
+from models.story import Character, ConversationTurn, RoundTurns
+from services.backends import FakeBackend
+from services.conversation import ConversationManager
+from services.llm_client import LLMClient
+
+CHARACTERS = {
+    "Mira": Character(goal="Get the ship out before the storm.", backstory="A captain with debts."),
+    "Tobin": Character(goal="Keep the harbor closed.", backstory="The harbor master."),
+}
+
+
+class ObservedBackend(FakeBackend):
+    """Records the history each character turn was asked about; Mira answers slowest."""
+
+    def __init__(self):
+        super().__init__()
+        self.turn_requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def astructured(self, messages, config, response_model):
+        mira = "roleplaying as Mira" in messages[-1]["content"]
+        if response_model is ConversationTurn:
+            history = sum(message["role"] == "assistant" for message in messages)
+            self.turn_requests.append(("Mira" if mira else "Tobin", history))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if mira:
+                await asyncio.sleep(0.05)
+            return await super().astructured(messages, config, response_model)
+        finally:
+            self.in_flight -= 1
+
+
+def converse(llm_config, backend, round_mode, rounds=2):
+    manager = ConversationManager(LLMClient(llm_config, backend=backend))
+    return asyncio.run(
+        manager.aconduct_scene_conversation(
+            CHARACTERS, "Rain lashes the docks.", conversation_rounds=rounds, round_mode=round_mode
+        )
+    )
+
+
+def test_sequential_turns_answer_the_turn_before(llm_config):
+    backend = ObservedBackend()
+    history = converse(llm_config, backend, "sequential")
+    assert [turn.character for turn in history] == ["Mira", "Tobin", "Mira", "Tobin"]
+    assert backend.turn_requests == [("Mira", 0), ("Tobin", 1), ("Mira", 2), ("Tobin", 3)]
+    assert backend.max_in_flight == 1
+
+
+def test_simultaneous_turns_share_the_round_start_and_keep_character_order(llm_config):
+    backend = ObservedBackend()
+    history = converse(llm_config, backend, "simultaneous")
+    # Mira answers last but still speaks first
+    assert [turn.character for turn in history] == ["Mira", "Tobin", "Mira", "Tobin"]
+    assert sorted(backend.turn_requests) == [("Mira", 0), ("Mira", 2), ("Tobin", 0), ("Tobin", 2)]
+    assert backend.max_in_flight == 2
+
+
+class RoundBackend(FakeBackend):
+    """Writes batched rounds that only cover (and lower-case) the first speaker, or fails them."""
+
+    def __init__(self, fail_rounds=False):
+        super().__init__()
+        self.fail_rounds = fail_rounds
+        self.calls = []
+
+    async def astructured(self, messages, config, response_model):
+        self.calls.append(response_model.__name__)
+        if response_model is RoundTurns and self.fail_rounds:
+            raise ConnectionError("provider unavailable (simulated)")
+        return await super().astructured(messages, config, response_model)
+
+    def _structured(self, messages, response_model, seed=None):
+        result = super()._structured(messages, response_model, seed)
+        if response_model is RoundTurns and result.value.turns:
+            first = result.value.turns[0]
+            result.value = RoundTurns(turns=[first.model_copy(update={"character": first.character.lower()})])
+        return result
+
+
+def test_a_batched_round_is_one_call_for_every_character(llm_config):
+    backend = ObservedBackend()
+    history = converse(llm_config, backend, "batched")
+    assert [turn.character for turn in history] == ["Mira", "Tobin", "Mira", "Tobin"]
+    assert backend.turn_requests == []  # no per-character calls
+
+
+def test_characters_a_batch_misses_get_their_own_calls(llm_config):
+    backend = RoundBackend()
+    history = converse(llm_config, backend, "batched")
+    # The lower-cased speaker is accepted under the character's own name
+    assert [turn.character for turn in history] == ["Mira", "Tobin", "Mira", "Tobin"]
+    assert backend.calls == ["RoundTurns", "ConversationTurn"] * 2
+
+
+def test_a_failed_batch_falls_back_to_one_call_per_character(llm_config):
+    backend = RoundBackend(fail_rounds=True)
+    history = converse(llm_config, backend, "batched", rounds=1)
+    assert [turn.character for turn in history] == ["Mira", "Tobin"]
+    assert backend.calls == ["RoundTurns", "ConversationTurn", "ConversationTurn"]
@@ -0,0 +1,72 @@
+from models.story import ConversationTurn, Scene
+from services.director import BranchSelector, RoundController
+
+
+def turn(dialogue: str, character: str = "Mira") -> ConversationTurn:
+    return ConversationTurn(
+        character=character,
+        dialogue=dialogue,
+        emotion="calm",
+        tone="even",
+        body_language="still",
+        inner_thoughts="",
+    )
+
+
+def test_scene_without_goals_runs_while_dialogue_is_novel():
+    controller = RoundController(Scene(scene_no=1, context="A quiet harbor at dusk."), planned_rounds=6, calls_per_round=2)
+    rounds = [
+        "lanterns flicker across harbor water",
+        "gulls circle above broken masts",
+        "merchants argue about silver prices",
+        "children chase kites along docks",
+        "thunder rolls beyond distant cliffs",
+    ]
+    assert not any(controller.observe_round([turn(dialogue)]) for dialogue in rounds)
+    assert controller.stop_reason is None
+    assert controller.rounds == 5
+
+
+def test_scene_without_goals_stops_on_repetition():
+    controller = RoundController(Scene(scene_no=1, context="A quiet harbor at dusk."), planned_rounds=6, calls_per_round=2)
+    stopped = [controller.observe_round([turn("lanterns flicker across harbor water")]) for _ in range(3)]
+    assert stopped == [False, False, True]
+    assert controller.stop_reason == "stalled"
+    assert controller.calls_saved == 6
+
+
+def test_novel_dialogue_is_not_a_stall_when_progress_plateaus():
+    scene = Scene(scene_no=1, context="Aboard the ship.", conflict="The crew distrusts the captain.")
+    controller = RoundController(scene, planned_rounds=6, calls_per_round=2, threshold=0.9)
+    controller.observe_round([turn("the crew grumbles")])  # a third of the conflict
+    # Progress no longer rises, but every round says something new
+    for dialogue in ("storm clouds gather", "rations running thin", "maps show hidden reef"):
+        assert not controller.observe_round([turn(dialogue)])
+    assert controller.stop_reason is None
+
+
+def test_resolved_scene_stops():
+    scene = Scene(scene_no=1, context="Aboard the ship.", conflict="The crew distrusts the captain.")
+    controller = RoundController(scene, planned_rounds=4, calls_per_round=2)
+    assert controller.observe_round([turn("the crew distrusts the captain")])
+    assert controller.stop_reason == "resolved"
+
+
+def test_the_best_turn_is_picked_and_the_rest_kept_as_alternatives():
+    scene = Scene(scene_no=1, context="The harbor gate, storm rising.", conflict="The gate must open.")
+    relevant = turn("The storm is rising, open the harbor gate now or we lose the ship tonight.")
+    off_topic = turn("Lovely weather.")
+    selector = BranchSelector(3, keep_alternatives=True)
+    # A failed candidate scores -1 and never wins
+    assert selector.pick_turn([off_topic, None, relevant], "Mira", "Rain.", scene, []) is relevant
+    assert [a["dialogue"] for a in selector.alternatives["turns"][0]["alternatives"]] == ["Lovely weather."]
+    assert 0 <= selector.directors_rewarks() <= 10
+
+
+def test_narration_candidates_are_scored_against_the_scene():
+    scene = Scene(scene_no=1, context="The harbor gate, storm rising.")
+    relevant = "The storm is rising over the harbor gate. " * 5
+    selector = BranchSelector(2)
+    assert selector.pick_narration(["", relevant], scene) == relevant
+    assert selector.alternatives == {"narration": [], "turns": []}  # not kept unless asked
+    assert selector.directors_rewarks() == -1
@@ -0,0 +1,85 @@
+import asyncio
+
+from models.story import ConversationTurn
+from services.llm_client import LLMCallError
+from services.memory import ConversationMemory
+
+
+class SummaryClient:
+    """Answers every fold with a numbered summary, or fails while `down`."""
+
+    def __init__(self):
+        self.prompts = []
+        self.down = False
+
+    async def acall_llm(self, prompt):
+        self.prompts.append(prompt)
+        if self.down:
+            raise LLMCallError("provider unavailable (simulated)")
+        return f"Summary {len(self.prompts)}"
+
+
+def turns(count):
+    return [
+        ConversationTurn(
+            character="Mira" if i % 2 == 0 else "Tobin",
+            dialogue=f"Line {i}.",
+            emotion="tense",
+            tone="serious",
+            body_language="still",
+            inner_thoughts="Hold on.",
+        )
+        for i in range(count)
+    ]
+
+
+def test_turns_are_folded_in_batches_once_they_leave_the_window():
+    client = SummaryClient()
+    memory = ConversationMemory(client, window=2, fold_batch=2)
+    history = turns(6)
+
+    asyncio.run(memory.aupdate(history[:3]))  # one turn over the window: not a batch yet
+    assert client.prompts == []
+    assert memory.visible_turns(history[:3]) == history[:3]
+
+    asyncio.run(memory.aupdate(history[:4]))
+    assert memory.folded == 2
+    assert memory.summary == "Summary 1"
+    assert "Line 0." in client.prompts[0] and "Line 2." not in client.prompts[0]
+    assert memory.visible_turns(history[:4]) == history[2:4]
+
+    asyncio.run(memory.aupdate(history))
+    # The next fold builds on the previous summary
+    assert "Summary 1" in client.prompts[1]
+    assert memory.visible_turns(history) == history[4:]
+    assert memory.report()["summary_calls"] == 2
+
+
+def test_a_failed_fold_keeps_the_turns_verbatim_and_retries():
+    client = SummaryClient()
+    memory = ConversationMemory(client, window=2, fold_batch=2)
+    history = turns(4)
+
+    client.down = True
+    asyncio.run(memory.aupdate(history))
+    assert memory.folded == 0
+    assert memory.visible_turns(history) == history
+
+    client.down = False
+    asyncio.run(memory.aupdate(history))
+    assert memory.folded == 2
+    assert memory.visible_turns(history) == history[2:]
+
+
+def test_the_report_counts_the_tokens_the_window_saves():
+    memory = ConversationMemory(SummaryClient(), window=2, fold_batch=2)
+    history = turns(12)
+    for end in range(1, len(history) + 1):
+        asyncio.run(memory.aupdate(history[:end]))
+        memory.visible_turns(history[:end])
+    report = memory.report()
+    assert report["turns_folded"] == 10
+    assert report["history_tokens_sent"] < report["history_tokens_full"]
+    assert report["tokens_saved"] == (
+        report["history_tokens_full"] - report["history_tokens_sent"] - report["summary_prompt_tokens"]
+    )
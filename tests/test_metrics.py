@@ -0,0 +1,77 @@
+import urllib.request
+
+from services.llm_client import LLMClient
+from services.metrics import CallRecord, MetricsRegistry, call_tags, current_tags
+from story_processor import StoryProcessor
+
+
+def test_call_tags_nest_and_unwind():
+    with call_tags(story="vell", scene=1):
+        with call_tags(scene=2, character="Mira", round=None):
+            assert current_tags() == {"story": "vell", "scene": 2, "character": "Mira"}
+        assert current_tags() == {"story": "vell", "scene": 1}
+    assert current_tags() == {}
+
+
+def test_calls_are_aggregated_by_series_and_tag():
+    registry = MetricsRegistry()
+    tags = {"story": "vell", "scene": 1, "character": "Mira"}
+    registry.record(CallRecord("structured", "m", 0.2, ttfb=0.1, prompt_tokens=100, completion_tokens=20, tags=tags))
+    registry.record(CallRecord("structured", "m", 3.0, retries=2, error=True, tags=tags))
+    registry.record(CallRecord("structured", "m", 0.0, cache_hit=True, tags=tags))
+
+    summary = registry.summary()
+    total = summary["total"]
+    assert (total["calls"], total["errors"], total["retries"], total["cache_hits"]) == (2, 1, 2, 1)
+    assert total["prompt_tokens"] == 100
+    assert total["ttfb_mean"] == 0.1
+    assert summary["by_kind"]["structured:m"]["calls"] == 2
+    # Scenes are grouped within their story
+    assert list(summary["by_scene"]) == ["vell/1"]
+    assert summary["by_character"]["Mira"]["calls"] == 2
+
+
+def test_forgetting_a_story_keeps_its_calls_in_the_totals():
+    registry = MetricsRegistry()
+    for story in ("a", "b"):
+        registry.record(CallRecord("completion", "m", 0.1, tags={"story": story, "scene": 1}))
+    registry.forget_story("a")
+    summary = registry.summary()
+    assert list(summary["by_story"]) == ["b"]
+    assert list(summary["by_scene"]) == ["b/1"]
+    assert summary["total"]["calls"] == 2
+
+
+def test_prometheus_text_has_cumulative_latency_buckets():
+    registry = MetricsRegistry()
+    for latency in (0.05, 0.3, 200.0):
+        registry.record(CallRecord("completion", "m", latency))
+    text = registry.prometheus()
+    labels = 'kind="completion",model="m"'
+    assert f'llm_calls_total{{{labels},outcome="ok"}} 3' in text
+    assert f'llm_call_latency_seconds_bucket{{{labels},le="0.1"}} 1' in text
+    assert f'llm_call_latency_seconds_bucket{{{labels},le="0.5"}} 2' in text
+    assert f'llm_call_latency_seconds_bucket{{{labels},le="120.0"}} 2' in text
+    assert f'llm_call_latency_seconds_bucket{{{labels},le="+Inf"}} 3' in text
+    assert "# TYPE llm_call_latency_seconds histogram" in text
+
+
+def test_metrics_are_served_over_http():
+    registry = MetricsRegistry()
+    registry.record(CallRecord("completion", "m", 0.1))
+    server = registry.serve(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            assert response.read().decode("utf-8") == registry.prometheus()
+    finally:
+        server.shutdown()
+
+
+def test_a_story_records_every_provider_call_by_scene(llm_config, story):
+    processor = StoryProcessor(LLMClient(llm_config))
+    processor.process_story(story())
+    summary = processor.llm_client.metrics.summary()
+    assert summary["total"]["calls"] == processor.llm_client.call_count
+    assert sorted(summary["by_scene"]) == ["1", "2", "3"]
+    assert sorted(summary["by_character"]) == ["Mira", "Tobin", "narrator"]
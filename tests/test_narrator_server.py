@@ -0,0 +1,128 @@
+import asyncio
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from models.story import StoryInput
+from narrator_server import NarratorService, QueueFull, ServerJob, TenantQueue, _handler
+from services.llm_client import LLMClient
+from story_processor import StoryProcessor
+
+
+@pytest.fixture
+def story_input(story):
+    return StoryInput.model_validate(story(scenes=1))
+
+
+@pytest.fixture
+def service(llm_config):
+    service = NarratorService(StoryProcessor(LLMClient(llm_config)), workers=2, keep_finished=2)
+    service.start()
+    yield service
+    service.stop()
+
+
+def test_tenants_take_turns_within_their_limits(story_input):
+    queue = TenantQueue(default_limit=1, limits={"b": 2}, max_pending=3)
+    jobs = [ServerJob(tenant, story_input) for tenant in ("a", "a", "a", "b", "b")]
+
+    async def run():
+        for job in jobs:
+            await queue.put(job)
+        with pytest.raises(QueueFull):
+            await queue.put(ServerJob("a", story_input))
+        taken = [await queue.get() for _ in range(3)]
+        # a is at its limit of one running job; nothing else is left for b
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(queue.get(), 0.05)
+        await queue.release(taken[0])
+        taken.append(await queue.get())
+        return taken, queue.stats()
+
+    taken, stats = asyncio.run(run())
+    assert [job.tenant for job in taken] == ["a", "b", "b", "a"]
+    assert taken == [jobs[0], jobs[3], jobs[4], jobs[1]]
+    assert stats["a"] == {"queued": 1, "running": 1, "limit": 1}
+
+
+def test_finishing_drops_partial_events_without_losing_a_followers_place(story_input):
+    job = ServerJob("a", story_input)
+    assert job.start()
+    job.publish({"event": "narration_delta", "text": "Rain"})
+    job.publish({"event": "narration", "text": "Rain."})
+
+    follower = job.follow(poll=0.01)
+    assert [next(follower)["event"] for _ in range(3)] == ["started", "narration_delta", "narration"]
+    job.publish({"event": "turn_partial", "fields": {}})
+    job.publish({"event": "turn", "turn": {}})
+    assert job.finish("done")
+    assert not job.finish("failed")  # the first final status stands
+    assert [event["event"] for event in follower] == ["turn", "done"]
+    assert [event["event"] for event in job.events] == ["started", "narration", "turn", "done"]
+
+
+def test_a_job_cancelled_while_queued_never_starts(story_input):
+    job = ServerJob("a", story_input)
+    assert job.finish("cancelled")
+    assert not job.start()
+    assert job.status == "cancelled"
+
+
+def test_the_service_runs_stories_and_keeps_only_recent_finished_jobs(service, story):
+    jobs = [service.submit("a", story(scenes=1)) for _ in range(4)]
+    for job in jobs:
+        assert [event for event in job.follow(poll=0.05) if event is not None][-1]["event"] == "done"
+    assert all(len(job.output["scenes"]) == 1 for job in jobs)
+    # Each job's one-off metrics groups are dropped once it finishes
+    assert service.processor.llm_client.metrics.summary()["by_story"] == {}
+
+    service.submit("a", story(scenes=1))
+    assert len([job for job in service.jobs.values() if job.finished]) <= 2
+
+
+def test_the_http_api_accepts_stories_and_streams_their_events(service, story):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(service))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    def request(path, body=None, method=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        req = urllib.request.Request(
+            base + path, data=data, method=method, headers={"Content-Type": "application/json", "X-Tenant": "t"}
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=10) as response:
+                return response.status, response.read().decode("utf-8")
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode("utf-8")
+
+    try:
+        assert request("/stories", {"context": 1})[0] == 400
+        status, body = request("/stories", story(scenes=1))
+        assert status == 202
+        job = json.loads(body)["job"]
+        for _ in service.get(job).follow(poll=0.05):
+            pass
+
+        status, body = request(f"/stories/{job}/events")
+        events = [json.loads(line)["event"] for line in body.splitlines() if line.strip()]
+        assert events[:2] == ["queued", "started"] and events[-1] == "done"
+        assert "narration_delta" not in events  # compacted once the story finished
+
+        status, body = request(f"/stories/{job}/output")
+        assert status == 200 and len(json.loads(body)["scenes"]) == 1
+        assert request("/stories/unknown")[0] == 404
+
+        status, body = request("/stories", story(scenes=50))
+        job = json.loads(body)["job"]
+        assert request(f"/stories/{job}", method="DELETE")[0] == 202
+        for _ in service.get(job).follow(poll=0.05):
+            pass
+        assert service.get(job).status == "cancelled"
+        assert request(f"/stories/{job}/output")[0] == 409
+    finally:
+        server.shutdown()
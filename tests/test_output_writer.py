@@ -0,0 +1,49 @@
+import json
+
+import pytest
+import yaml
+
+from services.llm_client import LLMClient
+from services.output_writer import StreamingOutputWriter
+from story_processor import StoryProcessor
+
+
+def read_records(path, fmt):
+    with open(path, encoding="utf-8") as file:
+        if fmt == "jsonl":
+            return [json.loads(line) for line in file]
+        return list(yaml.safe_load_all(file))
+
+
+@pytest.mark.parametrize("fmt", ["yaml", "jsonl"])
+def test_the_header_comes_first_then_one_record_per_scene(tmp_path, fmt):
+    path = str(tmp_path / f"out.{fmt}")
+    writer = StreamingOutputWriter(path, fmt)
+    writer.open({"title": "Vell"})
+    writer.write_scene({"scene_no": 1, "narration": "Rain."})
+    # Each record is on disk as soon as it is written
+    assert read_records(path, fmt) == [{"story_info": {"title": "Vell"}}, {"scene_no": 1, "narration": "Rain."}]
+    writer.write_scene({"scene_no": 2, "narration": "Wind."})
+    writer.close()
+    assert [record.get("scene_no") for record in read_records(path, fmt)] == [None, 1, 2]
+    assert writer.scenes_written == 2
+
+
+def test_unknown_formats_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        StreamingOutputWriter(str(tmp_path / "out.csv"), "csv")
+
+
+@pytest.mark.parametrize("fmt", ["yaml", "jsonl"])
+def test_a_streamed_story_matches_the_one_shot_output(tmp_path, llm_config, story, fmt):
+    expected = StoryProcessor(LLMClient(llm_config)).process_story(story())
+
+    path = str(tmp_path / f"out.{fmt}")
+    writer = StreamingOutputWriter(path, fmt)
+    streamed = StoryProcessor(LLMClient(llm_config)).process_story(story(), writer=writer)
+    assert streamed["scenes"] == []  # nothing is held back for save_output
+
+    header, *scenes = read_records(path, fmt)
+    assert header["story_info"]["total_scenes"] == len(scenes) == 3
+    assert [scene["narration"] for scene in scenes] == [scene["narration"] for scene in expected["scenes"]]
+    assert [scene["conversations"] for scene in scenes] == [scene["conversations"] for scene in expected["scenes"]]
@@ -0,0 +1,82 @@
+import os
+
+from models.story import Character, ConversationTurn, Scene
+from prompts.characters import CharacterDialogueManager, ConversationBuffer
+from services.narrator import Narrator
+from services.prefix_cache import PrefixCacheReport
+
+MIRA = Character(goal="Get the ship out before the storm.", backstory="A captain with debts.")
+TOBIN = Character(goal="Keep the harbor closed.", backstory="The harbor master.")
+
+
+def turn(character, dialogue):
+    return ConversationTurn(
+        character=character,
+        dialogue=dialogue,
+        emotion="tense",
+        tone="serious",
+        body_language="still",
+        inner_thoughts="Hold on.",
+    )
+
+
+def test_the_report_counts_the_prefix_shared_with_the_previous_call():
+    report = PrefixCacheReport("test")
+    assert report.observe_text("The storm breaks over Vell. Mira speaks.", key=1) == 0
+    assert report.observe_text("The storm breaks over Vell. Tobin speaks.", key=1) > 0
+    assert report.observe_text("Something else entirely.", key=2) == 0
+    assert report.calls == 3
+    assert report.cacheable_by_key[1] == report.cacheable_tokens
+    assert 0 < report.report()["cacheable_ratio"] < 1
+
+
+def test_character_prompts_differ_only_in_their_final_block():
+    manager = CharacterDialogueManager()
+    history = [turn("Mira", "Open the gate."), turn("Tobin", "Not tonight.")]
+    mira = manager.get_character_conversation_prompt("Mira", MIRA, "Rain lashes the docks.", conversation_history=history)
+    tobin = manager.get_character_conversation_prompt("Tobin", TOBIN, "Rain lashes the docks.", conversation_history=history)
+
+    assert mira[:-1] == tobin[:-1]
+    assert [m["role"] for m in mira] == ["system", "system", "assistant", "assistant", "user"]
+    assert "Mira" in mira[-1]["content"] and "Tobin" in tobin[-1]["content"]
+
+
+def test_the_history_is_append_only():
+    manager = CharacterDialogueManager()
+    history = [turn("Mira", "Open the gate.")]
+    before = manager.get_character_conversation_prompt("Mira", MIRA, "Rain.", conversation_history=history)
+    after = manager.get_character_conversation_prompt(
+        "Mira", MIRA, "Rain.", conversation_history=history + [turn("Tobin", "Not tonight.")]
+    )
+    assert after[: len(before) - 1] == before[:-1]
+
+
+def test_the_scene_buffer_builds_the_same_prompts_as_the_manager():
+    manager = CharacterDialogueManager()
+    buffer = ConversationBuffer(manager, "Rain lashes the docks.", recalled="Earlier: the ship ran aground.")
+    history = []
+    for name, character, line in (("Mira", MIRA, "Open the gate."), ("Tobin", TOBIN, "Not tonight.")):
+        expected = manager.get_character_conversation_prompt(
+            name, character, "Rain lashes the docks.", conversation_history=history, recalled="Earlier: the ship ran aground."
+        )
+        assert buffer.prompt(name, character, history) == expected
+        history.append(turn(name, line))
+    summarised = manager.get_character_conversation_prompt(
+        "Mira", MIRA, "Rain lashes the docks.", conversation_history=history[1:],
+        memory_summary="Mira asked.", recalled="Earlier: the ship ran aground.",
+    )
+    assert buffer.prompt("Mira", MIRA, history[1:], memory_summary="Mira asked.") == summarised
+
+
+def test_narration_prompts_open_with_what_every_scene_shares():
+    narrator = Narrator(llm_client=None)
+    first = narrator.build_narration_prompt("A storm is closing on Vell.", Scene(scene_no=1, context="The docks."))
+    second = narrator.build_narration_prompt(
+        "A storm is closing on Vell.", Scene(scene_no=2, context="The lighthouse."), "Rain fell.", [turn("Mira", "Go.")]
+    )
+    report = PrefixCacheReport("narration")
+    report.observe_text(first)
+    shared = report.observe_text(second)
+    # The instructions and story context come before anything scene-specific
+    assert "A storm is closing on Vell." in os.path.commonprefix([first, second])
+    assert shared > report.prompt_tokens / 4
@@ -0,0 +1,42 @@
+import asyncio
+import time
+
+from services.rate_limit import RATE_HEADROOM, RateGovernor, TokenBucket
+
+
+def test_bucket_refills_at_its_rate_up_to_capacity():
+    bucket = TokenBucket(per_minute=600, burst_seconds=1.0, full=False)  # 10 per second
+    start = bucket.updated
+    assert bucket.wait_time(1, start) == 0.1
+    assert bucket.wait_time(1, start + 0.1) == 0.0
+    bucket.take(1)
+    assert bucket.wait_time(100, start + 60) == 0.0  # capped at one second of budget
+    assert bucket.level == bucket.capacity == 10
+
+
+def test_paced_requests_stay_under_the_rpm_limit():
+    rpm = 1200
+
+    async def run():
+        governor = RateGovernor(rpm=rpm, max_concurrency=64)
+        started = time.monotonic()
+        for _ in range(10):
+            await governor.acquire(tokens=10)
+            await governor.release()
+        return time.monotonic() - started
+
+    # The bucket starts empty: no burst on top of the steady rate
+    elapsed = asyncio.run(run())
+    assert elapsed >= 10 / (rpm * RATE_HEADROOM / 60) * 0.95
+
+
+def test_a_throttle_halves_concurrency_and_pauses_every_request():
+    governor = RateGovernor(max_concurrency=16)
+    assert governor.throttled(retry_after=5.0) == 5.0
+    assert governor.limit == 8
+    assert governor._delay(0, time.monotonic()) > 4.0
+    governor.throttled(retry_after=0.1)  # the same burst of rejections counts once
+    assert governor.limit == 8
+    governor.completed(latency=0.2)
+    assert governor.limit == 8 + 1 / 8
+    assert governor.stats()["throttles"] == 2
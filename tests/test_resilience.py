@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+from services import resilience
+from services.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, Hedger
+
+
+class Clock:
+    """Stands in for the time module, so cooldowns pass without sleeping."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def perf_counter(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience, "time", clock)
+    return clock
+
+
+def open_circuit(breaker: CircuitBreaker, endpoint: str = "primary"):
+    for _ in range(breaker.failure_threshold):
+        assert breaker.allow(endpoint)
+        breaker.failure(endpoint)
+
+
+def test_breaker_opens_after_consecutive_failures_and_fails_fast(clock):
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=30)
+    breaker.failure("primary")
+    breaker.success("primary")  # a success resets the count
+    open_circuit(breaker)
+    assert breaker.state("primary") == OPEN
+    assert not breaker.allow("primary")
+    assert breaker.allow("fallback")
+    assert breaker.stats() == {"circuits": {"primary": OPEN}, "opened": 1, "rejected": 1}
+
+
+def test_breaker_trial_after_cooldown_closes_or_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=30)
+    open_circuit(breaker)
+    clock.now += 30
+    assert breaker.allow("primary")
+    assert breaker.state("primary") == HALF_OPEN
+    assert not breaker.allow("primary")  # one trial at a time
+    breaker.failure("primary")
+    assert breaker.state("primary") == OPEN
+
+    clock.now += 30
+    assert breaker.allow("primary")
+    breaker.success("primary")
+    assert breaker.state("primary") == CLOSED
+    assert breaker.allow("primary")
+
+
+def test_abandoned_trial_reopens_the_circuit(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=30)
+    open_circuit(breaker)
+    clock.now += 30
+    assert breaker.allow("primary")
+    breaker.abandon("primary")  # e.g. the trial was rate limited
+    assert breaker.state("primary") == OPEN
+    assert not breaker.allow("primary")
+    clock.now += 30
+    assert breaker.allow("primary")
+
+
+def test_hung_trial_lets_another_through_after_the_cooldown(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=30)
+    open_circuit(breaker)
+    clock.now += 30
+    assert breaker.allow("primary")
+    clock.now += 29
+    assert not breaker.allow("primary")
+    clock.now += 1
+    assert breaker.allow("primary")
+
+
+def request(answers, queued: float = 0.0):
+    """A request that waits `queued` seconds before it is sent, then takes the next delay from `answers`."""
+
+    async def send(on_sent):
+        await asyncio.sleep(queued)
+        delay, value = answers.pop(0)
+        on_sent()
+        await asyncio.sleep(delay)
+        return value
+
+    return send
+
+
+async def warm_up(hedger: Hedger, key, calls: int = 3):
+    for _ in range(calls):
+        assert await hedger.arun(key, request([(0.05, "warm")])) == "warm"
+
+
+def test_hedger_duplicates_a_call_slower_than_the_learned_percentile():
+    async def run():
+        hedger = Hedger(percentile=0.5, budget=1.0, min_samples=3)
+        await warm_up(hedger, "turn")
+        result = await hedger.arun("turn", request([(5.0, "slow"), (0.01, "hedge")]))
+        return result, hedger.stats()
+
+    result, stats = asyncio.run(asyncio.wait_for(run(), timeout=2))
+    assert result == "hedge"
+    assert stats == {"calls": 4, "hedges": 1, "hedge_wins": 1}
+
+
+def test_hedger_does_not_hedge_before_warm_up_or_while_queued():
+    async def run():
+        hedger = Hedger(percentile=0.5, budget=1.0, min_samples=3)
+        assert await hedger.arun("turn", request([(0.5, "cold")])) == "cold"
+        await warm_up(hedger, "turn", 2)
+        # Queued far longer than the threshold, then fast once sent
+        assert await hedger.arun("turn", request([(0.01, "queued")], queued=0.2)) == "queued"
+        return hedger.stats()
+
+    assert asyncio.run(run())["hedges"] == 0
+
+
+def test_hedges_stay_within_the_budget():
+    async def run():
+        hedger = Hedger(percentile=0.5, budget=0.2, min_samples=3)
+        await warm_up(hedger, "turn")
+        for _ in range(4):
+            await hedger.arun("turn", request([(0.2, "slow"), (0.2, "slow")]))
+        return hedger.stats()
+
+    stats = asyncio.run(run())
+    # Calls 4 and 6 are hedged: a hedge goes out only while hedges < 20% of calls
+    assert stats["calls"] == 7
+    assert stats["hedges"] == 2
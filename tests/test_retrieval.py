@@ -0,0 +1,72 @@
+from models.story import ConversationTurn, Scene
+from services.backends import FakeBackend
+from services.llm_client import LLMClient
+from services.retrieval import StoryIndex, tokenize
+from story_processor import StoryProcessor
+
+
+def turn(character, dialogue):
+    return ConversationTurn(
+        character=character, dialogue=dialogue, emotion="tense", tone="serious", body_language="still", inner_thoughts=""
+    )
+
+
+def index():
+    story = StoryIndex(top_k=3, token_budget=400)
+    story.add_scene(1, "The lighthouse keeper hid the brass key under the stairs.", [turn("Mira", "Where is the key?")])
+    story.add_scene(2, "Storm clouds rolled over the fishing fleet.", [turn("Tobin", "The fleet stays in port.")])
+    story.add_scene(3, "Mira found the brass key and climbed the lighthouse.", [])
+    return story
+
+
+def test_stopwords_and_single_letters_are_not_indexed():
+    assert tokenize("The key, a door and Mira's lamp") == ["key", "door", "mira's", "lamp"]
+
+
+def test_the_best_passages_are_returned_in_story_order():
+    passages = index().search("brass key lighthouse")
+    assert [(p.scene_no, p.kind) for p in passages] == [(1, "narration"), (1, "turn"), (3, "narration")]
+    assert index().search("nothing matches") == []
+    assert StoryIndex.render([]) is None
+
+
+def test_recall_respects_top_k_the_token_budget_exclusions_and_scenes():
+    story = index()
+    assert len(story.search("brass key lighthouse", top_k=1)) == 1
+    budget = story.passages[1].tokens  # only the short turn fits
+    assert [p.id for p in story.search("brass key lighthouse", token_budget=budget)] == [1]
+    narration = story.narration_id(1)
+    assert narration not in [p.id for p in story.search("brass key", exclude=[narration])]
+    assert {p.scene_no for p in story.search("brass key lighthouse fleet", scenes={1, 2})} <= {1, 2}
+
+
+def test_a_scene_is_queried_with_its_details():
+    scene = Scene(scene_no=4, context="Back at the lighthouse.", conflict="Who took the brass key?")
+    assert [p.scene_no for p in index().recall_for_scene(scene)] == [1, 1, 3]
+
+
+class PromptLog(FakeBackend):
+    """Keeps every completion prompt, i.e. the narrations'."""
+
+    def __init__(self):
+        super().__init__()
+        self.prompts = []
+
+    async def acomplete(self, messages, config, n=1):
+        self.prompts.append(messages[-1]["content"])
+        return await super().acomplete(messages, config, n)
+
+
+def test_scenes_recall_earlier_scenes_within_the_budget(llm_config, story):
+    backend = PromptLog()
+    config = story(scenes=4, retrieval=True, retrieval_token_budget=120)
+    output = StoryProcessor(LLMClient(llm_config, backend=backend)).process_story(config)
+
+    reports = [scene["retrieval"] for scene in output["scenes"]]
+    assert reports[0]["indexed_passages"] == 0 and reports[0]["narration_recalled"] == 0
+    assert [report["indexed_passages"] for report in reports] == [0, 5, 10, 15]
+    assert all(report["dialogue_recalled"] > 0 for report in reports[1:])
+    assert all(report["narration_recalled_tokens"] <= 120 and report["dialogue_recalled_tokens"] <= 120 for report in reports)
+    # The previous scene's narration is in the prompt verbatim, so it is never recalled as well
+    for previous, prompt in zip(output["scenes"], backend.prompts[1:]):
+        assert f"- Scene {previous['scene_no']}: {previous['narration']}" not in prompt
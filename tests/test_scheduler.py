@@ -0,0 +1,93 @@
+import asyncio
+import gc
+import weakref
+
+import pytest
+
+from models.story import Scene
+from services.scheduler import SceneScheduler, scene_dependencies
+
+
+def scenes(*specs):
+    return [Scene(scene_no=no, context=f"Scene {no}.", **spec) for no, spec in specs]
+
+
+def test_scenes_without_dependencies_form_one_chain():
+    assert scene_dependencies(scenes((1, {}), (2, {}), (3, {}))) == [[], [0], [1]]
+
+
+def test_a_single_chain_has_no_ancestor_sets():
+    story = scenes((1, {}), (2, {}), (3, {"depends_on": [2]}))
+    scheduler = SceneScheduler(story)
+    assert scheduler.ancestors(story[2]) is None
+    assert scheduler.longest_chain() == 3
+
+
+def test_threads_and_depends_on_build_a_dag():
+    story = scenes(
+        (1, {}),
+        (2, {"thread": "north", "depends_on": [1]}),
+        (3, {"thread": "south", "depends_on": [1]}),
+        (4, {"thread": "north"}),
+        (5, {"depends_on": [4, 3]}),
+    )
+    scheduler = SceneScheduler(story)
+    assert scheduler.dependencies == [[], [0], [0], [1], [2, 3]]
+    assert scheduler.ancestors(story[4]) == {1, 2, 3, 4}
+    assert scheduler.longest_chain() == 4
+    assert scheduler.roots() == 1
+
+
+def test_independent_chains_run_concurrently_and_finish_in_input_order():
+    story = scenes((1, {"depends_on": []}), (2, {"depends_on": []}), (3, {"depends_on": [1, 2]}))
+    delays = {1: 0.1, 2: 0.0, 3: 0.0}
+    started, finished = [], []
+
+    async def run_scene(scene, parents):
+        started.append((scene.scene_no, sorted(parents)))
+        await asyncio.sleep(delays[scene.scene_no])
+        return scene.scene_no
+
+    asyncio.run(SceneScheduler(story).arun(run_scene, lambda scene, result: finished.append(result)))
+    assert started[:2] == [(1, []), (2, [])]
+    assert started[2] == (3, [1, 2])
+    assert finished == [1, 2, 3]
+
+
+def test_a_failing_scene_cancels_the_rest():
+    story = scenes((1, {"depends_on": []}), (2, {"depends_on": []}), (3, {"depends_on": [2]}))
+    cancelled, ran = [], []
+
+    async def run_scene(scene, parents):
+        ran.append(scene.scene_no)
+        if scene.scene_no == 2:
+            raise RuntimeError("narration failed")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(scene.scene_no)
+            raise
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(asyncio.wait_for(SceneScheduler(story).arun(run_scene, lambda scene, result: None), 2))
+    assert ran == [1, 2]
+    assert cancelled == [1]
+
+
+def test_results_are_let_go_once_finished_and_their_dependents_started():
+    class Result:
+        pass
+
+    story = scenes((1, {}), (2, {}), (3, {}))
+    results, alive = [], []
+
+    async def run_scene(scene, parents):
+        gc.collect()
+        alive.append([ref() is not None for ref in results])
+        result = Result()
+        results.append(weakref.ref(result))
+        return result
+
+    asyncio.run(SceneScheduler(story).arun(run_scene, lambda scene, result: None))
+    # Each scene holds its parent's result; nothing older survives
+    assert alive == [[], [True], [False, True]]
@@ -0,0 +1,70 @@
+import importlib.util
+
+import pytest
+import yaml
+
+from services.llm_client import LLMClient
+from services.serialization import (
+    LIBYAML,
+    YAML_DUMP_OPTIONS,
+    LibyamlCompatibleDumper,
+    dump_document,
+    dump_yaml,
+    format_for,
+    load_document,
+)
+from story_processor import StoryProcessor
+
+MSGPACK = pytest.param(
+    "msgpack", marks=pytest.mark.skipif(importlib.util.find_spec("msgpack") is None, reason="msgpack is not installed")
+)
+
+DOCUMENT = {
+    "story_info": {"context": "A storm is closing on Vell.", "total_scenes": 1, "seed": None},
+    "scenes": [{"scene_no": 1, "narration": "Rain — and then the bell. 🔔", "conversations": [{"character": "Mira"}]}],
+}
+
+
+def test_the_format_follows_the_extension():
+    assert format_for("story.yml") == "yaml"
+    assert format_for("story.JSON") == "json"
+    assert format_for("story.mpk") == "msgpack"
+    assert format_for("story.txt") == "yaml"
+
+
+@pytest.mark.parametrize("fmt", ["yaml", "json", MSGPACK])
+def test_documents_round_trip(tmp_path, fmt):
+    path = str(tmp_path / f"story.{fmt}")
+    dump_document(DOCUMENT, path)
+    assert load_document(path) == DOCUMENT
+
+
+@pytest.mark.skipif(not LIBYAML, reason="PyYAML was built without libyaml")
+@pytest.mark.parametrize(
+    "text",
+    [
+        "A line far longer than eighty characters, which libyaml and PyYAML would otherwise fold at different places.",
+        "An emoji 🌊 outside the basic plane",
+        "A next-line\x85character",
+        "Plain text: with a colon",
+    ],
+)
+def test_the_pure_python_dumper_writes_the_same_bytes_as_libyaml(text):
+    data = {"narration": text, "turns": [{"dialogue": text}]}
+    expected = yaml.dump(data, Dumper=yaml.CSafeDumper, **YAML_DUMP_OPTIONS)
+    assert yaml.dump(data, Dumper=LibyamlCompatibleDumper, **YAML_DUMP_OPTIONS) == expected
+    assert dump_yaml(data) == expected
+
+
+@pytest.mark.parametrize("fmt", ["yaml", "json", MSGPACK])
+def test_a_story_reads_and_writes_the_same_in_every_format(tmp_path, llm_config, story, fmt):
+    source = str(tmp_path / f"story.{fmt}")
+    dump_document(story(), source)
+    processor = StoryProcessor(LLMClient(llm_config))
+    config = processor.load_story_config(source)
+    assert config == story()
+
+    output = processor.process_story(config)
+    path = str(tmp_path / f"out.{fmt}")
+    processor.save_output(output, path)
+    assert load_document(path) == output
@@ -0,0 +1,23 @@
+import pytest
+from pydantic import ValidationError
+
+from models.story import StoryInput
+
+
+def story(*scenes):
+    return {
+        "context": "A port town.",
+        "characters": {"Mira": {"goal": "Find the ship.", "backstory": "A sailor."}},
+        "scenes": [{"context": "The docks.", **scene} for scene in scenes],
+    }
+
+
+def test_duplicate_scene_numbers_are_rejected_without_dependencies():
+    with pytest.raises(ValidationError, match="scene_no 1 is not unique"):
+        StoryInput.model_validate(story({"scene_no": 1}, {"scene_no": 1}))
+
+
+def test_dependencies_must_name_earlier_scenes():
+    with pytest.raises(ValidationError, match="depends on scene 2"):
+        StoryInput.model_validate(story({"scene_no": 1, "depends_on": [2]}, {"scene_no": 2}))
+    StoryInput.model_validate(story({"scene_no": 1}, {"scene_no": 2, "depends_on": [1]}))
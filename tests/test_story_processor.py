@@ -0,0 +1,103 @@
+import re
+
+import pytest
+
+from models.story import RoundTurns, StoryInput
+from services.backends import FakeBackend
+from services.checkpoint import SceneCheckpoint, story_fingerprint
+from services.llm_client import LLMCallError, LLMClient
+from story_processor import StoryProcessor
+
+
+class RepetitiveBackend(FakeBackend):
+    """Answers every batched round with the same turns, so the dialogue stalls."""
+
+    def _structured(self, messages, response_model, seed=None):
+        if response_model is RoundTurns:
+            names = re.findall(r"^Character: (.+)$", messages[-1]["content"], re.MULTILINE)
+            messages = [{"role": "user", "content": "".join(f"Character: {name}\n" for name in names)}]
+        return super()._structured(messages, response_model, seed)
+
+
+class OutageBackend(FakeBackend):
+    """Answers the first `working` structured calls, then the provider goes down."""
+
+    def __init__(self, working: int):
+        super().__init__()
+        self.working = working
+
+    async def astructured(self, messages, config, response_model):
+        self.working -= 1
+        if self.working < 0:
+            raise ConnectionError("provider unavailable (simulated)")
+        return await super().astructured(messages, config, response_model)
+
+
+def processor(llm_config, backend=None) -> StoryProcessor:
+    return StoryProcessor(LLMClient(llm_config, backend=backend or FakeBackend()))
+
+
+def scenes(output):
+    return [(scene["narration"], scene["conversations"]) for scene in output["scenes"]]
+
+
+def test_resume_skips_the_checkpointed_scenes(tmp_path, llm_config, story):
+    checkpoint = SceneCheckpoint(str(tmp_path / "out.yaml.checkpoint.jsonl"))
+    full = processor(llm_config)
+    expected = full.process_story(story(), checkpoint)
+
+    # The run died during scene 3: its line never made it to the checkpoint
+    lines = open(checkpoint.path, encoding="utf-8").readlines()
+    assert len(lines) == 4
+    with open(checkpoint.path, "w", encoding="utf-8") as file:
+        file.writelines(lines[:3])
+
+    resumed = processor(llm_config)
+    output = resumed.process_story(story(), SceneCheckpoint(checkpoint.path), resume=True)
+    assert scenes(output) == scenes(expected)
+    assert resumed.llm_client.call_count == full.llm_client.call_count // 3
+    assert len(open(checkpoint.path, encoding="utf-8").readlines()) == 4
+
+
+def test_resume_ignores_a_checkpoint_of_another_story(tmp_path, llm_config, story):
+    checkpoint = SceneCheckpoint(str(tmp_path / "out.yaml.checkpoint.jsonl"))
+    processor(llm_config).process_story(story(scenes=2), checkpoint)
+
+    rerun = processor(llm_config)
+    rerun.process_story(story(), SceneCheckpoint(checkpoint.path), resume=True)
+    assert len(open(checkpoint.path, encoding="utf-8").readlines()) == 4
+    assert rerun.llm_client.call_count > 0
+    assert checkpoint.load("another fingerprint") == {}
+
+
+def test_early_stopping_counts_one_call_per_batched_round(llm_config, story):
+    config = dict(conversation_rounds=6, round_mode="batched", early_stopping=True)
+    output = processor(llm_config, RepetitiveBackend()).process_story(story(scenes=1, **config))
+    report = output["scenes"][0]["early_stopping"]
+    assert report["stopped"] == "stalled"
+    assert report["rounds_run"] < report["rounds_planned"]
+    assert report["calls_saved"] == report["rounds_planned"] - report["rounds_run"]
+
+
+@pytest.mark.parametrize("round_mode, calls_per_scene", [("sequential", 4), ("simultaneous", 4), ("batched", 2)])
+def test_a_failed_turn_fails_the_scene_instead_of_checkpointing_it(tmp_path, llm_config, story, round_mode, calls_per_scene):
+    checkpoint = SceneCheckpoint(str(tmp_path / "out.yaml.checkpoint.jsonl"))
+    # The provider goes down one structured call into scene 2
+    backend = OutageBackend(working=calls_per_scene + 1)
+    config = story(round_mode=round_mode)
+    with pytest.raises(LLMCallError):
+        processor(llm_config, backend).process_story(config, checkpoint)
+    resumed = SceneCheckpoint(checkpoint.path).load(story_fingerprint(StoryInput.model_validate(config).model_dump(mode="json")))
+    assert list(resumed) == [1]
+
+
+def test_branching_samples_candidates_and_keeps_the_alternatives(llm_config, story):
+    config = dict(branching_factor=3, save_alternatives=True)
+    branched = processor(llm_config)
+    output = branched.process_story(story(**config))
+    for scene in output["scenes"]:
+        assert 0 <= scene["directors_rewarks"] <= 10
+        assert len(scene["alternatives"]["narration"]) == 2
+        assert [len(t["alternatives"]) for t in scene["alternatives"]["turns"]] == [2] * 4
+    # One n=3 request per narration, three concurrent requests per turn
+    assert branched.llm_client.call_count == 3 * (1 + 4 * 3)
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from services.llm_client import LLMClient
+from services.metrics import call_tags
+from services.streaming import aiter_events, emit, stream_kind, streamed
+from story_processor import StoryProcessor
+
+
+def collect(events):
+    async def run():
+        return [event async for event in events]
+
+    return asyncio.run(run())
+
+
+def test_events_go_nowhere_without_a_listener():
+    with streamed("turn"):
+        emit("turn", text="unheard")
+        assert stream_kind() is None
+
+
+def test_events_carry_the_call_tags_and_failures_follow_them():
+    async def scene():
+        with call_tags(scene=1), streamed("narration"):
+            assert stream_kind() == "narration"
+            emit("narration", text="Rain.")
+        raise RuntimeError("narration failed")
+
+    async def run():
+        received = []
+        with pytest.raises(RuntimeError):
+            async for event in aiter_events(scene):
+                received.append(event)
+        return received
+
+    (event,) = asyncio.run(run())
+    assert event.to_dict() == {"event": "narration", "scene": 1, "text": "Rain."}
+
+
+def test_a_consumer_that_stops_early_cancels_the_run():
+    cancelled = []
+
+    async def scene():
+        emit("scene_start")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def run():
+        async for _ in aiter_events(scene):
+            break
+
+    asyncio.run(asyncio.wait_for(run(), 2))
+    assert cancelled == [True]
+
+
+def test_a_story_streams_deltas_partials_turns_and_scenes(llm_config, story):
+    expected = StoryProcessor(LLMClient(llm_config)).process_story(story(scenes=1))["scenes"][0]
+    events = list(StoryProcessor(LLMClient(llm_config)).stream_story(story(scenes=1)))
+    kinds = [event.kind for event in events]
+
+    assert kinds[0] == "scene_start" and kinds[-2:] == ["scene", "story_end"]
+    narration = next(event.data["text"] for event in events if event.kind == "narration")
+    deltas = [event.data["text"] for event in events if event.kind == "narration_delta"]
+    assert len(deltas) > 1 and "".join(deltas) == narration == expected["narration"]
+
+    turns = [event for event in events if event.kind == "turn"]
+    assert [turn.tags["character"] for turn in turns] == ["Mira", "Tobin", "Mira", "Tobin"]
+    # Each turn's partial fields lead up to the finished turn
+    first_partials = [event for event in events[: events.index(turns[0])] if event.kind == "turn_partial"]
+    assert first_partials and first_partials[-1].data["fields"] == turns[0].data["turn"].model_dump()
+    assert events[-2].data["output"]["conversations"] == expected["conversations"]
+
+
+def test_the_async_stream_yields_the_same_events(llm_config, story):
+    blocking = [event.kind for event in StoryProcessor(LLMClient(llm_config)).stream_story(story(scenes=1))]
+    streamed_kinds = [event.kind for event in collect(StoryProcessor(LLMClient(llm_config)).astream_story(story(scenes=1)))]
+    assert streamed_kinds == blocking
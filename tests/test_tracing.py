@@ -0,0 +1,68 @@
+import asyncio
+import json
+
+import pytest
+
+from services.llm_client import LLMClient
+from services.tracing import span, start_tracing, stop_tracing
+from story_processor import StoryProcessor
+
+
+@pytest.fixture
+def trace(tmp_path):
+    """Traces the test and returns a function that writes and loads the spans so far."""
+    path = tmp_path / "trace.json"
+    start_tracing()
+
+    def load():
+        stop_tracing(str(path))
+        return json.loads(path.read_text())["traceEvents"]
+
+    yield load
+    stop_tracing()
+
+
+def spans(events):
+    return {event["name"]: event for event in events if event["ph"] == "X"}
+
+
+def test_spans_are_no_ops_while_tracing_is_off():
+    with span("anything") as recorded:
+        assert recorded is None
+
+
+def test_nested_spans_share_a_lane_and_failures_are_marked(trace):
+    with span("story", file="vell.yaml"):
+        with pytest.raises(ValueError):
+            with span("scene", scene=1):
+                raise ValueError("narration failed")
+    events = spans(trace())
+    assert events["story"]["tid"] == events["scene"]["tid"]
+    assert events["story"]["args"] == {"file": "vell.yaml"}
+    assert events["scene"]["args"] == {"scene": 1, "error": "ValueError"}
+    assert events["story"]["ts"] <= events["scene"]["ts"]
+
+
+def test_concurrent_tasks_get_their_own_lanes(trace):
+    async def turn(name):
+        with span(name):
+            await asyncio.sleep(0.01)
+
+    async def run():
+        with span("round"):
+            await asyncio.gather(turn("Mira"), turn("Tobin"))
+        await turn("later")
+
+    asyncio.run(run())
+    events = trace()
+    lanes = {name: event["tid"] for name, event in spans(events).items()}
+    assert len({lanes["round"], lanes["Mira"], lanes["Tobin"]}) == 3
+    # A lane is reused once its task has closed its spans
+    assert lanes["later"] in (lanes["Mira"], lanes["Tobin"], lanes["round"])
+    assert sum(event["name"] == "thread_name" for event in events) == 3
+
+
+def test_a_traced_story_shows_its_scenes_rounds_and_turns(trace, llm_config, story):
+    StoryProcessor(LLMClient(llm_config)).process_story(story(scenes=1))
+    names = {event["name"] for event in trace()}
+    assert {"scene", "narration", "round 1", "round 2", "turn Mira", "turn Tobin", "llm structured"} <= names